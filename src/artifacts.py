@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import get_cached_settings
+import src.tools.base as base
+
+try:
+    import zstandard
+except ImportError:  # zlib is always there; zstd is just faster and smaller
+    zstandard = None
+
+# Lines of a spilled output kept in the message, from its start and its end
+PREVIEW_HEAD_LINES = 40
+PREVIEW_TAIL_LINES = 10
+# ... and at most this many characters of each
+PREVIEW_CHARS = 4000
+
+_READ_ERRORS = (OSError, zlib.error, ValueError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+# The tool that reads artifacts back; its own output is never spilled again
+FETCH_TOOL = "fetch_artifact"
+
+class ArtifactStore:
+    """
+    Content-addressed store for large tool outputs, under .sf/artifacts.
+
+    A blob is named by the SHA-256 of its text (so identical outputs are stored once) and
+    compressed with zstd when available, else zlib. Handles look like "art_<16 hex chars>".
+    """
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+        # A few recently fetched artifacts, since the model usually pages through one at a time
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def handle_for(text: str) -> str:
+        return "art_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _paths(self, handle: str) -> Tuple[Path, Path]:
+        digest = handle[4:]
+        directory = self.root / digest[:2]
+        return directory / f"{digest}.zst", directory / f"{digest}.zz"
+
+    def put(self, text: str) -> str:
+        handle = self.handle_for(text)
+        zst_path, zz_path = self._paths(handle)
+        for existing in (zst_path, zz_path):
+            if existing.exists():
+                # Stored already; refresh its age for garbage collection
+                os.utime(existing)
+                return handle
+
+        data = text.encode("utf-8")
+        if zstandard is not None:
+            path, blob = zst_path, zstandard.ZstdCompressor(level=3).compress(data)
+        else:
+            path, blob = zz_path, zlib.compress(data, 6)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        """The stored text, or None if the handle is unknown (or its blob was collected)."""
+        if not handle.startswith("art_") or len(handle) != 20 or not all(c in "0123456789abcdef" for c in handle[4:]):
+            return None
+        with self._lock:
+            if handle in self._recent:
+                self._recent.move_to_end(handle)
+                return self._recent[handle]
+
+        zst_path, zz_path = self._paths(handle)
+        try:
+            if zst_path.exists():
+                if zstandard is None:
+                    return None
+                text = zstandard.ZstdDecompressor().decompress(zst_path.read_bytes()).decode("utf-8")
+            else:
+                text = zlib.decompress(zz_path.read_bytes()).decode("utf-8")
+        except _READ_ERRORS:
+            return None
+
+        with self._lock:
+            self._recent[handle] = text
+            while len(self._recent) > 4:
+                self._recent.popitem(last=False)
+        return text
+
+    def collect_garbage(self, max_age_days: float) -> int:
+        """Delete blobs not written or re-used for `max_age_days`. Returns the number removed."""
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        if not self.root.is_dir():
+            return 0
+        for directory in self.root.iterdir():
+            if not directory.is_dir():
+                continue
+            for blob in directory.iterdir():
+                try:
+                    if blob.stat().st_mtime < cutoff:
+                        blob.unlink()
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+def preview(text: str, handle: str) -> str:
+    """What the model sees of a spilled output: its head and tail, and how to read the rest."""
+    lines = text.split("\n")
+    total = len(lines)
+    if total > PREVIEW_HEAD_LINES + PREVIEW_TAIL_LINES:
+        head = "\n".join(lines[:PREVIEW_HEAD_LINES])[:PREVIEW_CHARS]
+        tail = "\n".join(lines[-PREVIEW_TAIL_LINES:])[-PREVIEW_CHARS:]
+        omitted = f"\n... [lines {PREVIEW_HEAD_LINES + 1}-{total - PREVIEW_TAIL_LINES} omitted] ...\n"
+        body = head + omitted + tail
+    else:
+        body = text[:PREVIEW_CHARS] + (f"\n... [{len(text) - PREVIEW_CHARS} more characters] ..." if len(text) > PREVIEW_CHARS else "")
+    return (
+        f"{body}\n"
+        f"[Full output ({len(text)} characters, {total} lines) stored as artifact {handle}. "
+        f"Use {FETCH_TOOL}(handle=\"{handle}\", start_line=..., end_line=...) to read the rest "
+        f"(or offset=..., length=... for a range of characters).]"
+    )
+
+def spill(content: str, store: "ArtifactStore", threshold: int) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(message content, ToolMessage.artifact) for a tool output; large outputs go to the store."""
+    if threshold <= 0 or len(content) <= threshold:
+        return content, None
+    handle = store.put(content)
+    return preview(content, handle), {"handle": handle, "chars": len(content)}
+
+_store: Optional[ArtifactStore] = None
+
+def get_artifact_store() -> Optional[ArtifactStore]:
+    """The project's artifact store, or None if spilling is disabled (SF_ARTIFACT_THRESHOLD=0)."""
+    global _store
+    if get_cached_settings().artifact_threshold <= 0:
+        return None
+    if _store is None or _store.root != base.PROJECT_ROOT / ".sf" / "artifacts":
+        _store = ArtifactStore(base.PROJECT_ROOT / ".sf" / "artifacts")
+    return _store
@@ -0,0 +1,544 @@
+"""
+End-to-end benchmarks: drives create_graph() through scripted multi-turn scenarios on synthetic
+repositories, with the replay model (src/replay.py) standing in for the LLM.
+
+    python -m src.bench                                   # 1k, 10k and 100k files, all scenarios
+    python -m src.bench --sizes 1000 --scenarios explore,patch --output new.json
+    python -m src.bench --sizes 1000 --baseline base.json # run, then compare against a baseline
+    python -m src.bench --compare new.json --baseline base.json
+
+Every (size, scenario) case runs in a fresh process with cold caches (.sf of the synthetic repo
+is removed), so peak RSS and module-level state are per case. Reported per case: wall time and
+framework overhead per turn (turn time not spent in the model or in tools), tool latencies,
+peak RSS, checkpoint size, and prompt/completion tokens. Comparing exits with status 1 when a
+metric regressed by more than --threshold.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import shlex
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_WORKDIR = Path(".sf") / "cache" / "bench"
+RESULTS_VERSION = 1
+# Bump when the generated files change, so cached synthetic repos are rebuilt
+REPO_VERSION = 1
+# Written by make_synthetic_repo; nothing without it is ever deleted
+REPO_MARKER = ".bench_repo"
+FILES_PER_DIR = 100
+
+# Matches the coder's system prompt, so scripted main-agent responses are never served to sub-agents
+MAIN = "Senior Python Developer"
+
+# --- Synthetic repositories ---
+
+APP_SOURCE = '''\
+"""Order totals."""
+from core.orders import Order
+
+
+def compute_total(order: Order) -> float:
+    total = 0.0
+    for item in order.items:
+        total += item.price * item.quantity
+    return total * (1 - order.discount)
+
+
+def apply_tax(total: float, rate: float = 0.19) -> float:
+    return total * (1 + rate)
+'''
+
+ORDERS_SOURCE = '''\
+"""Order model."""
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class Item:
+    name: str
+    price: float
+    quantity: int = 1
+
+
+@dataclass
+class Order:
+    items: List[Item] = field(default_factory=list)
+    discount: float = 0.0
+
+    def validate(self) -> bool:
+        return all(item.quantity > 0 and item.price >= 0 for item in self.items)
+'''
+
+TEST_SOURCE = '''\
+from core.app import apply_tax, compute_total
+from core.orders import Item, Order
+
+
+def test_compute_total():
+    order = Order([Item("a", 2.0, 3), Item("b", 1.5)], discount=0.1)
+    assert abs(compute_total(order) - 6.75) < 1e-9
+
+
+def test_apply_tax():
+    assert abs(apply_tax(100.0) - 119.0) < 1e-9
+'''
+
+MODULE_TEMPLATE = '''\
+"""Generated module {index}."""
+{imports}
+
+class Handler{index}:
+    """Handles batch {index}."""
+
+    def __init__(self, limit: int = {limit}):
+        self.limit = limit
+        self.seen = []
+
+    def accept(self, value: int) -> bool:
+        if value > self.limit:
+            return False
+        self.seen.append(value)
+        return True
+
+    def summary(self) -> str:
+        return f"handler {index}: {{len(self.seen)}} values"
+
+
+def process_{index}(values):
+    handler = Handler{index}()
+    accepted = [v for v in values if handler.accept(v)]
+    return {body}
+
+
+def helper_{index}(text: str) -> str:
+    return text.strip().lower().replace(" ", "_")
+'''
+
+FIXED_FILES = {
+    "core/__init__.py": "",
+    "core/app.py": APP_SOURCE,
+    "core/orders.py": ORDERS_SOURCE,
+    "tests/__init__.py": "",
+    "tests/test_app.py": TEST_SOURCE,
+    "README.md": "# Synthetic benchmark repository\n\nOrders live in `core/`, generated handlers in `pkg*/`.\n",
+    ".gitignore": "__pycache__/\n.sf/\n",
+}
+
+def _module_source(index: int) -> str:
+    if index % 10 == 0:
+        imports = "from core.app import compute_total\nfrom core.orders import Order\n"
+        body = "compute_total(Order()) + sum(accepted)"
+    else:
+        imports = "import math\n"
+        body = "math.fsum(accepted)"
+    return MODULE_TEMPLATE.format(index=index, imports=imports, limit=index % 997 + 3, body=body)
+
+def write_fixed_files(root: Path):
+    """(Re)write the files the scenarios read and patch, so every case starts from the same tree."""
+    for rel, content in FIXED_FILES.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+def make_synthetic_repo(root: Path, files: int) -> Path:
+    """
+    A Python project of `files` files under `root` (reused if already generated).
+    Only an empty directory or an earlier synthetic repo (it has a REPO_MARKER file) is replaced.
+    """
+    marker = root / REPO_MARKER
+    stamp = f"{REPO_VERSION} {files}"
+    if marker.exists() and marker.read_text(encoding="utf-8") == stamp:
+        return root
+    if root.exists():
+        if not marker.is_file() and any(root.iterdir()):
+            raise ValueError(f"Refusing to replace {root}: it is not a synthetic benchmark repo")
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    write_fixed_files(root)
+    generated = max(0, files - len(FIXED_FILES))
+    for index in range(generated):
+        directory = root / f"pkg{index // FILES_PER_DIR:04d}"
+        if index % FILES_PER_DIR == 0:
+            directory.mkdir()
+            (directory / "__init__.py").write_text("", encoding="utf-8")
+            continue
+        (directory / f"mod{index:06d}.py").write_text(_module_source(index), encoding="utf-8")
+    marker.write_text(stamp, encoding="utf-8")
+    return root
+
+# --- Scenarios ---
+
+class Turn(NamedTuple):
+    prompt: str                     # what the user types
+    responses: List[Dict[str, Any]] # scripted model responses, in order
+
+def _call(tool: str, **args) -> Dict[str, Any]:
+    return {"name": tool, "args": args}
+
+def _main(content: str = "", *calls: Dict[str, Any]) -> Dict[str, Any]:
+    return {"when": MAIN, "content": content, "tool_calls": list(calls)}
+
+PATCHED_LINE = "    return round(total * (1 - order.discount), 2)\n"
+ORIGINAL_LINE = "    return total * (1 - order.discount)\n"
+
+SCENARIOS: Dict[str, List[Turn]] = {
+    "explore": [
+        Turn("Give me an overview of this repository.", [
+            _main("Let me look around.", _call("list_directory", path=".")),
+            _main("", _call("search_code", pattern="compute_total", max_results=50),
+                  _call("retrieve_code", query="compute the total of an order")),
+            _main("", _call("read_file", path="core/app.py")),
+            _main("The repository computes order totals in `core/app.py`; `pkg*/` hold generated handlers."),
+        ]),
+        Turn("Where is compute_total defined, and what else is in that module?", [
+            _main("", _call("find_definition", name="compute_total"),
+                  _call("analyze_code_structure", path="core/app.py")),
+            _main("", _call("read_file", path="core/app.py")),
+            _main("`compute_total` is defined in core/app.py next to `apply_tax`."),
+        ]),
+    ],
+    "patch": [
+        Turn("Make compute_total round its result to two decimals.", [
+            _main("", _call("read_file", path="core/app.py")),
+            _main("", _call("apply_diff_patch", path="core/app.py", search_block=ORIGINAL_LINE, replace_block=PATCHED_LINE)),
+            _main("", _call("read_file", path="core/app.py")),
+            _main("compute_total now rounds to two decimals."),
+        ]),
+        Turn("Undo that change.", [
+            _main("", _call("apply_edits", hunks=[
+                {"path": "core/app.py", "search_block": PATCHED_LINE, "replace_block": ORIGINAL_LINE}])),
+            _main("Reverted."),
+        ]),
+    ],
+    "run_tests": [
+        Turn("Run the test suite.", [
+            _main("", _call("search_code", pattern="def test_", glob="tests/*.py")),
+            _main("", _call("run_shell_command", command=f"{shlex.quote(sys.executable)} -m pytest -q -p no:cacheprovider tests")),
+            _main("All tests pass."),
+        ]),
+        Turn("Which tests cover apply_tax?", [
+            _main("", _call("find_references", name="apply_tax")),
+            _main("tests/test_app.py::test_apply_tax."),
+        ]),
+    ],
+    "delegate": [
+        Turn("Research how orders flow through this codebase.", [
+            _main("Splitting the research.",
+                  _call("delegate_research", task_description="Find the callers of compute_total."),
+                  _call("delegate_research", task_description="Find where orders are validated.")),
+            # Each sub-agent searches and reads, then answers once it has seen the source
+            {"when": r"^Find ", "repeat": True, "tool_calls": [
+                _call("search_code", pattern="compute_total|validate", regex=True, max_results=30),
+                _call("read_file", path="core/orders.py")]},
+            {"when": r"def validate", "repeat": True, "content": "Orders are validated by Order.validate in core/orders.py."},
+            _main("Orders are built in core/orders.py, validated there, and totalled by core/app.py."),
+        ]),
+    ],
+}
+
+def scenario_script(name: str) -> Dict[str, Any]:
+    """The replay script of a scenario: all its turns' responses, in order."""
+    responses = [response for turn in SCENARIOS[name] for response in turn.responses]
+    return {"responses": responses, "default": {"content": "Done."}}
+
+# --- Measurement ---
+
+class _Span(NamedTuple):
+    kind: str          # "llm" or "tool"
+    name: str
+    nested: bool       # started inside another measured run (e.g. a sub-agent's tool call)
+    start: float
+
+class Recorder(BaseCallbackHandler):
+    """Times model and tool runs (including sub-agents') and sums token usage."""
+    run_inline = True
+
+    def __init__(self):
+        self.open: Dict[UUID, _Span] = {}
+        self.closed: List[Tuple[_Span, float]] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tool_errors = 0
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: Optional[UUID]):
+        self.open[run_id] = _Span(kind, name, parent_run_id in self.open, time.perf_counter())
+
+    def _end(self, run_id: UUID):
+        span = self.open.pop(run_id, None)
+        if span is not None:
+            self.closed.append((span, time.perf_counter()))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", "model", run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start("tool", (serialized or {}).get("name") or kwargs.get("name") or "tool", run_id, parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        # A scripted scenario should never hit tool errors; counting them catches a broken script
+        if str(getattr(output, "content", output)).startswith("Error"):
+            self.tool_errors += 1
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.tool_errors += 1
+        self._end(run_id)
+
+def _busy(intervals: List[Tuple[float, float]]) -> float:
+    """Total length of the union of intervals (concurrent calls count once)."""
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _tool_stats(durations: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {"count": len(values), "total_ms": _ms(sum(values)), "p50_ms": _ms(statistics.median(values)),
+               "max_ms": _ms(max(values))}
+        for name, values in sorted(durations.items())
+    }
+
+def run_case(repo: str, scenario: str, latency: str = "none") -> Dict[str, Any]:
+    """
+    Run one scenario against a synthetic repo, in THIS process (it changes the working directory
+    and settings, so call it through a fresh process: see run_cases).
+    """
+    root = Path(repo).resolve()
+    if not (root / REPO_MARKER).is_file():
+        # Each case starts by deleting .sf (sessions, caches): never do that to a real project
+        raise ValueError(f"Refusing to run in {root}: not a synthetic repo made by make_synthetic_repo")
+    shutil.rmtree(root / ".sf", ignore_errors=True)
+    write_fixed_files(root)
+    script_path = Path(tempfile.mkdtemp(prefix="sf-bench-")) / f"{scenario}.json"
+    script_path.write_text(json.dumps(scenario_script(scenario)), encoding="utf-8")
+
+    # Settings and PROJECT_ROOT are read on first import, so set them up before importing the graph
+    os.chdir(root)
+    os.environ.update({
+        "LLM_PROVIDER": "replay",
+        "SF_LLM_REPLAY_SCRIPT": str(script_path),
+        "SF_LLM_REPLAY_LATENCY": latency,
+        "SF_CHECKPOINT_BACKEND": "sqlite",
+    })
+    from langchain_core.messages import HumanMessage
+    from src.graph import create_graph
+
+    rss_before = _peak_rss_mb()
+    recorder = Recorder()
+    turns: List[Dict[str, Any]] = []
+    graph = create_graph()
+    config = {"configurable": {"thread_id": f"bench-{scenario}"}, "callbacks": [recorder]}
+
+    async def drive():
+        for turn in SCENARIOS[scenario]:
+            first_span = len(recorder.closed)
+            tokens_before, errors_before = recorder.prompt_tokens, recorder.tool_errors
+            start = time.perf_counter()
+            await graph.ainvoke({"messages": [HumanMessage(content=turn.prompt)]}, config)
+            # Approve every tool call, as a user answering "always" would
+            while graph.get_state(config).next:
+                await graph.ainvoke(None, config)
+            wall = time.perf_counter() - start
+
+            spans = [(span, end) for span, end in recorder.closed[first_span:] if not span.nested]
+            llm = _busy([(s.start, end) for s, end in spans if s.kind == "llm"])
+            tools = _busy([(s.start, end) for s, end in spans if s.kind == "tool"])
+            busy = _busy([(s.start, end) for s, end in spans])
+            turns.append({
+                "wall_ms": _ms(wall),
+                "llm_ms": _ms(llm),
+                "tool_ms": _ms(tools),
+                "overhead_ms": _ms(max(0.0, wall - busy)),
+                "llm_calls": sum(1 for s, _ in spans if s.kind == "llm"),
+                "tool_calls": sum(1 for s, _ in spans if s.kind == "tool"),
+                "prompt_tokens": recorder.prompt_tokens - tokens_before,
+                "tool_errors": recorder.tool_errors - errors_before,
+            })
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(drive())
+
+    checkpointer = graph.checkpointer
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
+    checkpoint_bytes = sum(p.stat().st_size for p in (root / ".sf").glob("checkpoints.sqlite*"))
+
+    durations: Dict[str, List[float]] = {}
+    for span, end in recorder.closed:
+        if span.kind == "tool":
+            durations.setdefault(span.name, []).append(end - span.start)
+
+    shutil.rmtree(script_path.parent, ignore_errors=True)
+    return {
+        "turns": turns,
+        "wall_ms": round(sum(t["wall_ms"] for t in turns), 3),
+        "overhead_ms": round(sum(t["overhead_ms"] for t in turns), 3),
+        "overhead_ms_per_turn": round(statistics.mean(t["overhead_ms"] for t in turns), 3),
+        "prompt_tokens": recorder.prompt_tokens,
+        "completion_tokens": recorder.completion_tokens,
+        "tool_errors": recorder.tool_errors,
+        "tools": _tool_stats(durations),
+        "peak_rss_mb": _peak_rss_mb(),
+        "startup_rss_mb": rss_before,
+        "checkpoint_bytes": checkpoint_bytes,
+    }
+
+def run_cases(sizes: List[int], scenarios: List[str], workdir: Path, latency: str = "none",
+              log=print) -> Dict[str, Any]:
+    """Run every (size, scenario) case, each in a fresh process."""
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        started = time.perf_counter()
+        repo = make_synthetic_repo(workdir / f"repo-{size}", size)
+        log(f"repo {size} files ready in {time.perf_counter() - started:.1f}s")
+        for scenario in scenarios:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_case, str(repo), scenario, latency).result()
+            cases.append({"size": size, "scenario": scenario, **result})
+            log(f"  {scenario:<10} {len(result['turns'])} turns  wall {result['wall_ms']:9.1f} ms  "
+                f"overhead/turn {result['overhead_ms_per_turn']:8.1f} ms  prompt {result['prompt_tokens']:7d} tok  "
+                f"rss {result['peak_rss_mb']} MB  checkpoint {result['checkpoint_bytes']} B")
+    return {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "latency": latency,
+        "cases": cases,
+    }
+
+# --- Comparison ---
+
+# Metrics compared against a baseline (all lower-is-better), with the absolute change below which
+# a difference is noise regardless of the relative threshold
+COMPARED_METRICS = {
+    "wall_ms": 20.0,
+    "overhead_ms_per_turn": 5.0,
+    "prompt_tokens": 0,
+    "peak_rss_mb": 5.0,
+    "checkpoint_bytes": 4096,
+}
+
+class Change(NamedTuple):
+    size: int
+    scenario: str
+    metric: str
+    baseline: float
+    current: float
+    regression: bool
+
+    @property
+    def ratio(self) -> float:
+        return (self.current - self.baseline) / self.baseline if self.baseline else 0.0
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> List[Change]:
+    """Per-case metric changes between two result files (cases present in both)."""
+    base_cases = {(c["size"], c["scenario"]): c for c in baseline.get("cases", [])}
+    changes = []
+    for case in current.get("cases", []):
+        old = base_cases.get((case["size"], case["scenario"]))
+        if old is None:
+            continue
+        for metric, noise in COMPARED_METRICS.items():
+            before, after = old.get(metric), case.get(metric)
+            if before is None or after is None:
+                continue
+            regression = after - before > noise and after > before * (1 + threshold)
+            changes.append(Change(case["size"], case["scenario"], metric, before, after, regression))
+    return changes
+
+def format_changes(changes: List[Change]) -> str:
+    lines = []
+    for change in changes:
+        flag = "  REGRESSION" if change.regression else ""
+        lines.append(f"{change.size:>7} {change.scenario:<10} {change.metric:<22} "
+                     f"{change.baseline:>12.1f} -> {change.current:>12.1f}  ({change.ratio:+.1%}){flag}")
+    regressions = sum(c.regression for c in changes)
+    lines.append(f"{regressions} regression(s) in {len(changes)} compared metrics.")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the agent graph on synthetic repositories with a replayed LLM.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated repository sizes (files).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}.")
+    parser.add_argument("--latency", default="none", help="Replay latency profile (none measures the framework alone).")
+    parser.add_argument("--workdir", default=str(DEFAULT_WORKDIR), help="Where synthetic repositories are generated and kept.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results (JSON).")
+    parser.add_argument("--baseline", help="Results file to compare against.")
+    parser.add_argument("--compare", metavar="RESULTS", help="Compare this results file against --baseline without running.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative increase that counts as a regression.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        current = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    else:
+        scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+        unknown = [s for s in scenarios if s not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+        current = run_cases(sizes, scenarios, Path(args.workdir).resolve(), args.latency)
+        Path(args.output).write_text(json.dumps(current, indent=2), encoding="utf-8")
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        changes = compare(baseline, current, args.threshold)
+        print(format_changes(changes))
+        return 1 if any(c.regression for c in changes) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+# Channel stored as an append-only log instead of full snapshots
+MESSAGES_CHANNEL = "messages"
+# Blob type marking "the first N entries of the thread's message log"
+MESSAGE_LOG_REF = "sf_msglog"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    seq INTEGER NOT NULL,
+    msg_key TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, seq)
+);
+"""
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Disk-backed LangGraph checkpointer (SQLite, WAL mode).
+
+    Storage is incremental:
+    - Channel values are stored once per version (unchanged channels are not rewritten).
+    - The `messages` channel is kept as an append-only log per thread. A checkpoint only
+      stores "first N log entries", so each step writes just the new messages instead of
+      re-serializing the whole conversation.
+    The database is opened lazily on first use.
+    """
+    def __init__(self, path: Path, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # (thread_id, ns) -> keys of the logged messages, to detect "list extends the log" cheaply
+        self._log_keys: Dict[Tuple[str, str], List[str]] = {}
+
+    # --- Connection ---
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._log_keys = {}
+
+    # --- Message log (delta storage for the messages channel) ---
+
+    def _message_key(self, msg: Any) -> str:
+        msg_id = getattr(msg, "id", None)
+        if msg_id:
+            return str(msg_id)
+        _, data = self.serde.dumps_typed(msg)
+        return "sha1:" + hashlib.sha1(data).hexdigest()
+
+    def _get_log_keys(self, thread_id: str, ns: str) -> List[str]:
+        keys = self._log_keys.get((thread_id, ns))
+        if keys is None:
+            rows = self.conn.execute(
+                "SELECT msg_key FROM messages WHERE thread_id=? AND checkpoint_ns=? ORDER BY seq",
+                (thread_id, ns)
+            ).fetchall()
+            keys = [r[0] for r in rows]
+            self._log_keys[(thread_id, ns)] = keys
+        return keys
+
+    def _dump_messages(self, thread_id: str, ns: str, messages: list) -> Optional[Tuple[str, bytes]]:
+        """
+        Append the new tail of `messages` to the log and return a log reference,
+        or None if `messages` is not a continuation of the log (then a full snapshot is stored).
+        """
+        keys = self._get_log_keys(thread_id, ns)
+        n = len(keys)
+        count = len(messages)
+
+        if count <= n:
+            # A prefix of the log (e.g. resuming from an earlier checkpoint)
+            if count == 0 or (self._message_key(messages[0]) == keys[0] and self._message_key(messages[count - 1]) == keys[count - 1]):
+                return (MESSAGE_LOG_REF, str(count).encode())
+            return None
+
+        if n and (self._message_key(messages[0]) != keys[0] or self._message_key(messages[n - 1]) != keys[n - 1]):
+            return None
+
+        rows = []
+        for seq in range(n, count):
+            msg = messages[seq]
+            msg_type, data = self.serde.dumps_typed(msg)
+            key = self._message_key(msg)
+            rows.append((thread_id, ns, seq, key, msg_type, data))
+            keys.append(key)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO messages (thread_id, checkpoint_ns, seq, msg_key, type, value) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return (MESSAGE_LOG_REF, str(count).encode())
+
+    def _load_messages(self, thread_id: str, ns: str, count: int) -> list:
+        rows = self.conn.execute(
+            "SELECT type, value FROM messages WHERE thread_id=? AND checkpoint_ns=? AND seq < ? ORDER BY seq",
+            (thread_id, ns, count)
+        ).fetchall()
+        return [self.serde.loads_typed((t, v)) for t, v in rows]
+
+    # --- Helpers ---
+
+    def _load_blobs(self, thread_id: str, ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self.conn.execute(
+                "SELECT type, value FROM blobs WHERE thread_id=? AND checkpoint_ns=? AND channel=? AND version=?",
+                (thread_id, ns, channel, str(version))
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == MESSAGE_LOG_REF:
+                values[channel] = self._load_messages(thread_id, ns, int(row[1]))
+            else:
+                values[channel] = self.serde.loads_typed((row[0], row[1]))
+        return values
+
+    def _load_writes(self, thread_id: str, ns: str, checkpoint_id: str) -> list:
+        rows = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=? ORDER BY task_path, task_id, idx",
+            (thread_id, ns, checkpoint_id)
+        ).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in rows]
+
+    def _make_tuple(self, thread_id: str, ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, c_type, c_blob, m_type, m_blob = row
+        checkpoint = self.serde.loads_typed((c_type, c_blob))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((m_type, m_blob)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=self._load_writes(thread_id, ns, checkpoint_id),
+        )
+
+    # --- BaseCheckpointSaver API ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+                    (thread_id, ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, ns)
+                ).fetchone()
+            if row is None:
+                return None
+            return self._make_tuple(thread_id, ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id=?")
+            params.append(config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns=?")
+                params.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id=?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id<?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        for thread_id, ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                item = self._make_tuple(thread_id, ns, tuple(row))
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")
+
+        with self._lock, self.conn:
+            for channel, version in new_versions.items():
+                if channel not in values:
+                    typed = ("empty", b"")
+                elif channel == MESSAGES_CHANNEL and isinstance(values[channel], list):
+                    typed = self._dump_messages(thread_id, ns, values[channel]) or self.serde.dumps_typed(values[channel])
+                else:
+                    typed = self.serde.dumps_typed(values[channel])
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, channel, str(version), typed[0], typed[1])
+                )
+
+            c_type, c_blob = self.serde.dumps_typed(c)
+            m_type, m_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 c_type, c_blob, m_type, m_blob, time.time())
+            )
+
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        with self._lock, self.conn:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                # Special writes (errors, interrupts) overwrite; regular ones are written once
+                verb = "INSERT OR REPLACE" if write_idx < 0 else "INSERT OR IGNORE"
+                w_type, w_blob = self.serde.dumps_typed(value)
+                self.conn.execute(
+                    f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, checkpoint_id, task_id, write_idx, channel, w_type, w_blob, task_path)
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self.conn:
+            for table in ("checkpoints", "blobs", "writes", "messages"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id=?", (thread_id,))
+            for key in [k for k in self._log_keys if k[0] == thread_id]:
+                del self._log_keys[key]
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- Sessions & retention ---
+
+    def list_threads(self, limit: int = 20) -> List[Tuple[str, float, int]]:
+        """Most recently active sessions as (thread_id, last_active, checkpoint_count)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT thread_id, MAX(created_at), COUNT(*) FROM checkpoints "
+                "GROUP BY thread_id ORDER BY MAX(created_at) DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def collect_garbage(self, keep_last: int = 20, max_age_days: float = 30, thread_ids: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        """
+        Apply retention:
+        - Delete whole sessions inactive for more than `max_age_days`.
+        - Keep only the `keep_last` newest checkpoints of every other session,
+          plus the channel versions they reference (the message log is kept).
+        `thread_ids` limits the second step to those sessions.
+        Returns counts of deleted sessions / checkpoints / blobs.
+        """
+        stats = {"threads": 0, "checkpoints": 0, "blobs": 0}
+        cutoff = time.time() - max_age_days * 86400
+
+        with self._lock, self.conn:
+            expired = [r[0] for r in self.conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?", (cutoff,)
+            ).fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        stats["threads"] = len(expired)
+
+        with self._lock, self.conn:
+            groups = self.conn.execute("SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints").fetchall()
+            for thread_id, ns in groups:
+                if thread_ids is not None and thread_id not in thread_ids:
+                    continue
+                old_ids = [r[0] for r in self.conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? "
+                    "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                    (thread_id, ns, keep_last)
+                ).fetchall()]
+                if not old_ids:
+                    continue
+
+                self.conn.executemany(
+                    "DELETE FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+                    [(thread_id, ns, cid) for cid in old_ids]
+                )
+                self.conn.executemany(
+                    "DELETE FROM writes WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+                    [(thread_id, ns, cid) for cid in old_ids]
+                )
+                stats["checkpoints"] += len(old_ids)
+
+                # Keep only blob versions still referenced by a remaining checkpoint
+                referenced = set()
+                for c_type, c_blob in self.conn.execute(
+                    "SELECT type, checkpoint FROM checkpoints WHERE thread_id=? AND checkpoint_ns=?", (thread_id, ns)
+                ).fetchall():
+                    versions = self.serde.loads_typed((c_type, c_blob))["channel_versions"]
+                    referenced.update((channel, str(v)) for channel, v in versions.items())
+
+                for channel, version in self.conn.execute(
+                    "SELECT channel, version FROM blobs WHERE thread_id=? AND checkpoint_ns=?", (thread_id, ns)
+                ).fetchall():
+                    if (channel, version) not in referenced:
+                        self.conn.execute(
+                            "DELETE FROM blobs WHERE thread_id=? AND checkpoint_ns=? AND channel=? AND version=?",
+                            (thread_id, ns, channel, version)
+                        )
+                        stats["blobs"] += 1
+
+        return stats
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        if strategy == "delete":
+            for thread_id in thread_ids:
+                self.delete_thread(thread_id)
+        else:
+            self.collect_garbage(keep_last=1, max_age_days=float("inf"), thread_ids=thread_ids)
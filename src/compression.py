@@ -1,21 +1,394 @@
-from typing import List
+import asyncio
+import base64
+import contextvars
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
 from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, AIMessage, HumanMessage
+from langgraph.config import get_config
+from src.config import get_cached_settings
+from src.llm import ModelRegistry
 
-def compress_history(messages: List[BaseMessage], max_token_estimate: int = 20000) -> List[BaseMessage]:
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# Per-message framing overhead in chat-completion prompts (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Encodings are only ever read from a local tiktoken cache (TIKTOKEN_CACHE_DIR, else this
+# directory), never downloaded; without the file the counter falls back to the character estimate
+DEFAULT_TIKTOKEN_CACHE = Path.home() / ".sf" / "cache" / "tiktoken"
+TIKTOKEN_BLOB_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+class EncodingSpec(NamedTuple):
+    """What tiktoken.Encoding needs besides the vocabulary (copied from tiktoken_ext.openai_public)."""
+    sha256: str
+    pat_str: str
+    special_tokens: Dict[str, int]
+
+_O200K_PAT = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+
+# The encodings the token counter can build offline
+ENCODINGS: Dict[str, EncodingSpec] = {
+    "o200k_base": EncodingSpec(
+        "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d", _O200K_PAT,
+        {"<|endoftext|>": 199999, "<|endofprompt|>": 200018},
+    ),
+    "cl100k_base": EncodingSpec(
+        "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+        r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        {"<|endoftext|>": 100257, "<|fim_prefix|>": 100258, "<|fim_middle|>": 100259,
+         "<|fim_suffix|>": 100260, "<|endofprompt|>": 100276},
+    ),
+}
+
+def cached_encoding_file(encoding_name: str, cache_dir: Path) -> Path:
+    """Where tiktoken keeps an encoding's vocabulary in `cache_dir` (named by the SHA-1 of its URL)."""
+    url = TIKTOKEN_BLOB_URL.format(encoding_name)
+    return cache_dir / hashlib.sha1(url.encode()).hexdigest()
+
+def load_local_encoding(encoding_name: str, cache_dir: Path):
+    """
+    Build the tiktoken encoding from the vocabulary file in `cache_dir`, without going through
+    tiktoken's loader (which deletes a file failing its hash check and downloads it again).
+    Raises ValueError if the encoding is unknown, missing or corrupt.
+    """
+    spec = ENCODINGS.get(encoding_name)
+    if spec is None:
+        raise ValueError(f"unknown encoding (supported offline: {', '.join(ENCODINGS)})")
+    path = cached_encoding_file(encoding_name, cache_dir)
+    try:
+        data = path.read_bytes()
+    except OSError:
+        raise ValueError(f"not found in {cache_dir}")
+    if hashlib.sha256(data).hexdigest() != spec.sha256:
+        raise ValueError(f"{path} does not match the expected checksum")
+
+    ranks = {}
+    for line in data.splitlines():
+        if line:
+            token, rank = line.split()
+            ranks[base64.b64decode(token)] = int(rank)
+    return tiktoken.Encoding(encoding_name, pat_str=spec.pat_str, mergeable_ranks=ranks, special_tokens=spec.special_tokens)
+
+def _message_key(msg: BaseMessage) -> Hashable:
+    """
+    Stable identity of a message across turns.
+    Provider messages carry an id; for the rest fall back to type + content hash
+    (Python caches str hashes, so this is cheap compared to re-tokenizing).
     """
-    Compress the message history to avoid hitting token limits.
+    if msg.id:
+        return msg.id
+    return (msg.type, hash(str(msg.content)), len(str(msg.content)))
+
+def _message_text(msg: BaseMessage) -> str:
+    """Everything in a message that is sent to the model as text."""
+    if isinstance(msg.content, list):
+        text = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in msg.content)
+    else:
+        text = str(msg.content)
+
+    if isinstance(msg, AIMessage) and msg.tool_calls:
+        text += json.dumps([{"name": tc["name"], "args": tc["args"]} for tc in msg.tool_calls])
+    return text
+
+class TokenCounter:
+    """
+    Counts tokens with a real tokenizer (tiktoken) and memoizes per-message counts,
+    so each message is tokenized once per session instead of once per turn.
+    Falls back to the 4-chars-per-token estimate if tiktoken / the encoding is unavailable.
+    """
+    def __init__(self, encoding_name: str = "o200k_base", max_entries: int = 50000):
+        self.encoding_name = encoding_name
+        self.max_entries = max_entries
+        self._encoding = None
+        self._encoding_loaded = False
+        self._cache: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def _get_encoding(self):
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            if HAS_TIKTOKEN:
+                # No external calls: a missing or corrupt vocabulary means estimating instead
+                cache_dir = Path(os.environ.get("TIKTOKEN_CACHE_DIR") or DEFAULT_TIKTOKEN_CACHE)
+                try:
+                    self._encoding = load_local_encoding(self.encoding_name, cache_dir)
+                except Exception as e:
+                    print(f"[Compressor] Warning: tokenizer '{self.encoding_name}' unavailable ({e}). Using character estimate.")
+        return self._encoding
+
+    def count_text(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return (len(text) + 3) // 4
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, msg: BaseMessage, key: Optional[Hashable] = None) -> int:
+        if key is None:
+            key = _message_key(msg)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        count = self.count_text(_message_text(msg)) + MESSAGE_OVERHEAD_TOKENS
+        self._cache[key] = count
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return count
+
+class HistoryLedger:
+    """
+    Running token total of one conversation.
+    History only grows by appending (AgentState uses operator.add), so when a call
+    extends the previously seen list only the new tail is counted.
+    """
+    def __init__(self):
+        self.keys: List[Hashable] = []
+        self.counts: List[int] = []
+        self.total = 0
+
+    def update(self, messages: List[BaseMessage], counter: TokenCounter) -> List[int]:
+        n = len(self.keys)
+        is_extension = (
+            n <= len(messages)
+            and n > 0
+            and _message_key(messages[n - 1]) == self.keys[-1]
+        )
+        if not is_extension:
+            self.keys, self.counts, self.total = [], [], 0
+            n = 0
+
+        for msg in messages[n:]:
+            key = _message_key(msg)
+            count = counter.count_message(msg, key)
+            self.keys.append(key)
+            self.counts.append(count)
+            self.total += count
+        return self.counts
+
+_counter: Optional[TokenCounter] = None
+# One ledger per conversation (see _thread_key); a handful is plenty for a CLI
+_ledgers: "OrderedDict[Hashable, HistoryLedger]" = OrderedDict()
+_MAX_LEDGERS = 8
+# Truncated stand-ins for old ToolMessages, so they are built (and counted) only once
+_truncated: "OrderedDict[Hashable, Tuple[ToolMessage, int]]" = OrderedDict()
+_MAX_TRUNCATED = 5000
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter(get_cached_settings().tokenizer_encoding)
+    return _counter
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a plain string with the configured tokenizer."""
+    return get_token_counter().count_text(text)
+
+def get_context_budget() -> int:
+    """Tokens available for the prompt: the deployment's context window minus the reply reserve."""
+    settings = get_cached_settings()
+    return max(1000, settings.context_window_tokens - settings.context_reserve_tokens)
+
+def _thread_key(messages: List[BaseMessage]) -> Hashable:
+    """
+    Identity of a conversation: the LangGraph thread it runs in plus its first message
+    (sub-agents run inside the coder's thread but start with their own, id-tagged message).
+    Id-less first messages alone (e.g. "hi") are not unique across threads.
+    """
+    try:
+        thread_id = get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        # Not inside a graph run
+        thread_id = None
+    return (thread_id, _message_key(messages[0]))
+
+def _get_ledger(thread_key: Hashable) -> HistoryLedger:
+    ledger = _ledgers.get(thread_key)
+    if ledger is None:
+        ledger = HistoryLedger()
+        _ledgers[thread_key] = ledger
+        if len(_ledgers) > _MAX_LEDGERS:
+            _ledgers.popitem(last=False)
+    else:
+        _ledgers.move_to_end(thread_key)
+    return ledger
+
+def history_fits(messages: List[BaseMessage], max_tokens: Optional[int] = None) -> bool:
+    """Whether compress_history would send these messages unchanged (uses the memoized counts)."""
+    if not messages:
+        return True
+    return sum(_get_ledger(_thread_key(messages)).update(messages, get_token_counter())) <= (max_tokens or get_context_budget())
+
+def _truncate_tool_message(msg: ToolMessage, key: Hashable, counter: TokenCounter) -> Tuple[ToolMessage, int]:
+    cached = _truncated.get(key)
+    if cached is not None:
+        return cached
+
+    content_str = str(msg.content)
+    truncated = ToolMessage(
+        tool_call_id=msg.tool_call_id,
+        content=content_str[:200] + f"\n... [Output truncated by History Compressor. Original length: {len(content_str)} chars] ...\n" + content_str[-100:],
+        name=msg.name,
+        artifact=msg.artifact
+    )
+    result = (truncated, counter.count_message(truncated, ("truncated", key)))
+    _truncated[key] = result
+    if len(_truncated) > _MAX_TRUNCATED:
+        _truncated.popitem(last=False)
+    return result
+
+class RollingSummary(NamedTuple):
+    """LLM summary of the history range [start_key .. end_key] of one conversation."""
+    start_key: Hashable
+    end_key: Hashable
+    message_count: int
+    text: str
+    tokens: int
+
+def _render_for_summary(msg: BaseMessage, max_chars: int = 2000) -> str:
+    text = _message_text(msg)
+    if len(text) > max_chars:
+        text = text[:max_chars] + " ...[truncated]"
+    name = f" ({msg.name})" if isinstance(msg, ToolMessage) and msg.name else ""
+    return f"[{msg.type}{name}] {text}"
+
+class RollingSummarizer:
+    """
+    Condenses pruned history into a running summary, off the critical path.
+
+    compress_history() reports every evicted span via `request()` and uses the cached
+    summary via `lookup()` when it covers the evicted range. The actual LLM call runs in
+    a background task started by `schedule()` after the coder's turn, and extends the
+    previous summary hierarchically (old summary + newly evicted messages -> new summary).
+    """
+    def __init__(self, llm_factory: Optional[Callable[[], Any]] = None):
+        self._llm_factory = llm_factory
+        self._summaries: Dict[Hashable, RollingSummary] = {}
+        self._pending: Dict[Hashable, List[Tuple[Hashable, BaseMessage]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # For comparing against the prune-only strategy
+        self.stats = {"summaries": 0, "input_tokens": 0, "output_tokens": 0, "errors": 0}
+
+    def lookup(self, thread_key: Hashable, dropped_keys: List[Hashable]) -> Optional[Tuple[RollingSummary, int]]:
+        """
+        Return the cached summary and how many of the dropped messages it covers,
+        if it covers a prefix of the dropped range.
+        """
+        summary = self._summaries.get(thread_key)
+        if summary is None or not dropped_keys or dropped_keys[0] != summary.start_key:
+            return None
+        try:
+            covered = dropped_keys.index(summary.end_key) + 1
+        except ValueError:
+            return None
+        return summary, covered
+
+    def request(self, thread_key: Hashable, dropped: List[Tuple[Hashable, BaseMessage]]):
+        """Remember an evicted span; it is summarized on the next `schedule()`."""
+        summary = self._summaries.get(thread_key)
+        if summary and summary.end_key == dropped[-1][0]:
+            return
+        self._pending[thread_key] = dropped
+
+    def schedule(self):
+        """Start the background summarization if there is work and no run in progress."""
+        if not self._pending or (self._task and not self._task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            # Run in a fresh context so the graph's callbacks (token streaming, tracing)
+            # don't attribute the summary call to the coder node
+            self._task = contextvars.Context().run(loop.create_task, self.run_pending())
+        except RuntimeError:
+            # No event loop (sync caller): summaries will be built on a later async turn
+            pass
+
+    async def run_pending(self):
+        while self._pending:
+            thread_key, dropped = self._pending.popitem()
+            try:
+                await self._summarize(thread_key, dropped)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[Compressor] Background summary failed: {e}")
+
+    async def _summarize(self, thread_key: Hashable, dropped: List[Tuple[Hashable, BaseMessage]]):
+        keys = [k for k, _ in dropped]
+        previous = self.lookup(thread_key, keys)
+        if previous:
+            summary, covered = previous
+            new_messages = [m for _, m in dropped[covered:]]
+            prior_text = summary.text
+        else:
+            new_messages = [m for _, m in dropped]
+            prior_text = ""
+
+        if not new_messages:
+            return
+
+        max_tokens = get_cached_settings().summary_max_tokens
+        prompt = (
+            "You maintain the working memory of a coding agent. Older conversation messages are being "
+            "removed from its context window. Write a concise summary that preserves everything the agent "
+            "still needs: the user's goals and constraints, decisions made, files inspected and the key facts "
+            "learned from them (paths, symbols, line numbers), changes applied, commands run and their "
+            f"outcome, and open issues. Use terse bullet points, at most {max_tokens} tokens.\n\n"
+        )
+        if prior_text:
+            prompt += f"Existing summary of even earlier messages:\n{prior_text}\n\n"
+        prompt += "Messages to fold into the summary:\n" + "\n".join(_render_for_summary(m) for m in new_messages)
+
+        llm = self._llm_factory() if self._llm_factory else ModelRegistry.get_client()
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+        text = _message_text(response).strip()
+        if not text:
+            return
+
+        counter = get_token_counter()
+        tokens = counter.count_text(text)
+        self.stats["summaries"] += 1
+        self.stats["input_tokens"] += counter.count_text(prompt)
+        self.stats["output_tokens"] += tokens
+        self._summaries[thread_key] = RollingSummary(keys[0], keys[-1], len(keys), text, tokens)
+
+summarizer = RollingSummarizer()
+
+def compress_history(messages: List[BaseMessage], max_tokens: Optional[int] = None,
+                     keep_first: int = 1, strategy: Optional[str] = None) -> List[BaseMessage]:
+    """
+    Compress the message history to fit the model's context window.
 
     Strategy:
-    1. Always keep the System Message (first message).
-    2. Always keep the last N messages (e.g., last 5) to maintain immediate context.
+    1. If the history fits the budget, send it unchanged.
+    2. Always keep the first message(s) and the last N messages (e.g., last 5) to maintain immediate context.
     3. For older messages:
         a. Truncate 'ToolMessage' content if it's too long (e.g., file reads).
-        b. If total length is still too high, summarize or remove oldest turns.
+        b. If still over budget, drop the oldest turns until it fits. With the "summarize" strategy the
+           dropped span is replaced by the cached rolling summary once the background summarizer has built it.
+
+    Token counts come from a real tokenizer, are memoized per message and kept as a
+    running total, so a turn only tokenizes the messages appended since the last one.
 
     Args:
         messages: The list of messages in the state.
-        max_token_estimate: Rough character count threshold (1 token ~= 4 chars, so 20k tokens ~= 80k chars).
-                            Let's use character count for simplicity and speed.
+        max_tokens: Prompt token budget. Defaults to the configured context window minus the reply reserve.
+        keep_first: Number of leading messages that are never pruned (e.g. system prompt + task).
+        strategy: "summarize" or "prune"; defaults to SF_HISTORY_STRATEGY.
 
     Returns:
         A new list of messages.
@@ -23,65 +396,76 @@ def compress_history(messages: List[BaseMessage], max_token_estimate: int = 2000
     if not messages:
         return []
 
+    if max_tokens is None:
+        max_tokens = get_context_budget()
+
+    counter = get_token_counter()
+    thread_key = _thread_key(messages)
+    ledger = _get_ledger(thread_key)
+    counts = list(ledger.update(messages, counter))
+    total = sum(counts)
+
+    if total <= max_tokens:
+        return list(messages)
+
     # Make a shallow copy to modify
     compressed = list(messages)
 
     # 1. Truncate old ToolMessages
     # We define "old" as anything before the last 5 messages.
-    # We want to preserve the SystemPrompt (index 0).
-
+    # We want to preserve the first message(s) (index < keep_first).
     keep_last_n = 5
-    if len(compressed) > keep_last_n + 1:
-        # Range to process: from index 1 (after system) to len - keep_last_n
-        for i in range(1, len(compressed) - keep_last_n):
+    keep_start = len(compressed) - keep_last_n
+    # Keep tool results together with the AIMessage that requested them
+    while keep_start > keep_first and isinstance(compressed[keep_start], ToolMessage):
+        keep_start -= 1
+
+    if keep_start > keep_first:
+        # Range to process: from index keep_first to the start of the recent window
+        for i in range(keep_first, keep_start):
             msg = compressed[i]
-            if isinstance(msg, ToolMessage):
-                # If content is very long, truncate it
-                content_str = str(msg.content)
-                if len(content_str) > 500:
-                    compressed[i] = ToolMessage(
-                        tool_call_id=msg.tool_call_id,
-                        content=content_str[:200] + f"\n... [Output truncated by History Compressor. Original length: {len(content_str)} chars] ...\n" + content_str[-100:],
-                        name=msg.name,
-                        artifact=msg.artifact
-                    )
-
-    # 2. Check total size and prune if needed
-    total_chars = sum(len(str(m.content)) for m in compressed)
-
-    # Threshold: 80,000 chars (approx 20k tokens)
-    char_limit = max_token_estimate * 4
-
-    if total_chars > char_limit:
-        print(f"[Compressor] History size ({total_chars} chars) exceeds limit ({char_limit}). Pruning...")
-
-        # Pruning Strategy: Remove oldest messages between System and Last-N
-        # We replace removed messages with a single SystemMessage summary placeholder
-        # In a real "Infinite Memory" system, we would use an LLM to summarize them.
-        # For this implementation (Step 2), we will simply drop them and add a marker.
-
-        # Calculate how many to drop
-        # We need to drop enough to get under the limit.
-        # Let's drop chunks of 5 messages until we are safe.
-
-        # Always keep index 0
-        system_msg = compressed[0]
-        recent_msgs = compressed[-keep_last_n:]
-
-        # The middle part is candidates for removal
-        middle_msgs = compressed[1:-keep_last_n]
-
-        # If we have middle messages, remove the first half of them
-        if middle_msgs:
-            # Drop older half of the middle
-            drop_count = max(1, len(middle_msgs) // 2)
-            kept_middle = middle_msgs[drop_count:]
-
-            summary_msg = SystemMessage(content=f"[System: Pruned {drop_count} oldest messages to save context window.]")
-
-            compressed = [system_msg, summary_msg] + kept_middle + recent_msgs
-
-            new_chars = sum(len(str(m.content)) for m in compressed)
-            print(f"[Compressor] Pruned to {new_chars} chars.")
+            if isinstance(msg, ToolMessage) and len(str(msg.content)) > 500:
+                compressed[i], new_count = _truncate_tool_message(msg, _message_key(msg), counter)
+                total += new_count - counts[i]
+                counts[i] = new_count
+
+    # 2. Drop the oldest middle messages until we fit
+    if total > max_tokens and keep_start > keep_first:
+        print(f"[Compressor] History size ({total} tokens) exceeds limit ({max_tokens}). Pruning...")
+
+        use_summary = (strategy or get_cached_settings().history_strategy) == "summarize"
+        cached = summarizer._summaries.get(thread_key) if use_summary else None
+        marker_cost = cached.tokens + MESSAGE_OVERHEAD_TOKENS * 4 if cached else MESSAGE_OVERHEAD_TOKENS * 4
+
+        end_of_middle = keep_start
+        drop_until = keep_first
+        remaining = total + marker_cost
+        while drop_until < end_of_middle and remaining > max_tokens:
+            remaining -= counts[drop_until]
+            drop_until += 1
+
+        # Never start the kept part with orphaned tool results (their AIMessage was dropped)
+        while drop_until < end_of_middle and isinstance(compressed[drop_until], ToolMessage):
+            remaining -= counts[drop_until]
+            drop_until += 1
+
+        drop_count = drop_until - keep_first
+        if drop_count:
+            dropped_keys = ledger.keys[keep_first:drop_until]
+            found = summarizer.lookup(thread_key, dropped_keys) if use_summary else None
+            if found:
+                summary, covered = found
+                content = f"[System: Summary of the {covered} oldest messages, pruned to save context window:]\n{summary.text}"
+                if drop_count > covered:
+                    content += f"\n[System: Pruned {drop_count - covered} further messages (summary pending).]"
+            else:
+                content = f"[System: Pruned {drop_count} oldest messages to save context window.]"
+
+            if use_summary:
+                # Summarized in the background after this turn; used from the next turn on
+                summarizer.request(thread_key, list(zip(dropped_keys, messages[keep_first:drop_until])))
+
+            compressed = compressed[:keep_first] + [SystemMessage(content=content)] + compressed[drop_until:]
+            print(f"[Compressor] Pruned to {remaining} tokens.")
 
     return compressed
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, SecretStr
 from typing import Optional
@@ -10,6 +11,59 @@ class Settings(BaseSettings):
 
     google_api_key: Optional[SecretStr] = Field(None, validation_alias="GOOGLE_API_KEY")
     llm_provider: str = Field("azure", validation_alias="LLM_PROVIDER")
+    # LLM_PROVIDER=replay: scripted offline responses (see src/replay.py) and a latency profile
+    # (none, fast, azure, slow) unless the script sets its own
+    llm_replay_script: Optional[str] = Field(None, validation_alias="SF_LLM_REPLAY_SCRIPT")
+    llm_replay_latency: str = Field("none", validation_alias="SF_LLM_REPLAY_LATENCY")
+
+    # Max number of tool calls from a single model turn that may run at the same time
+    tool_concurrency: int = Field(4, validation_alias="SF_TOOL_CONCURRENCY")
+
+    # run_shell_command: default and maximum timeout (seconds) and how much output is kept for the model
+    shell_timeout: int = Field(30, validation_alias="SF_SHELL_TIMEOUT")
+    shell_max_timeout: int = Field(600, validation_alias="SF_SHELL_MAX_TIMEOUT")
+    shell_max_output_bytes: int = Field(64 * 1024, validation_alias="SF_SHELL_MAX_OUTPUT_BYTES")
+
+    # History compression: the model's context window, how much of it to leave for the reply,
+    # and the tiktoken encoding used to count tokens (o200k_base or cl100k_base, read from TIKTOKEN_CACHE_DIR
+    # or ~/.sf/cache/tiktoken, never downloaded; without it tokens are estimated from characters)
+    context_window_tokens: int = Field(128000, validation_alias="SF_CONTEXT_WINDOW")
+    context_reserve_tokens: int = Field(16000, validation_alias="SF_CONTEXT_RESERVE")
+    tokenizer_encoding: str = Field("o200k_base", validation_alias="SF_TOKENIZER_ENCODING")
+    # What happens to pruned history: "summarize" (background LLM summary) or "prune" (drop + marker)
+    history_strategy: str = Field("summarize", validation_alias="SF_HISTORY_STRATEGY")
+    summary_max_tokens: int = Field(800, validation_alias="SF_SUMMARY_MAX_TOKENS")
+
+    # Session persistence: "sqlite" (.sf/checkpoints.sqlite, resumable) or "memory"
+    checkpoint_backend: str = Field("sqlite", validation_alias="SF_CHECKPOINT_BACKEND")
+    checkpoint_keep: int = Field(20, validation_alias="SF_CHECKPOINT_KEEP")
+    session_max_age_days: float = Field(30, validation_alias="SF_SESSION_MAX_AGE_DAYS")
+
+    # MCP servers: per-server connect timeout, and lazy start (tool schemas from .sf/cache/mcp)
+    mcp_connect_timeout: float = Field(20, validation_alias="SF_MCP_CONNECT_TIMEOUT")
+    mcp_lazy: bool = Field(False, validation_alias="SF_MCP_LAZY")
+    # Seconds between MCP liveness checks (0 disables the supervisor)
+    mcp_health_interval: float = Field(10, validation_alias="SF_MCP_HEALTH_INTERVAL")
+    # Parse-tree / outline cache for code analysis (memory budget in bytes, persisted outlines in .sf/cache)
+    parse_cache_bytes: int = Field(64 * 1024 * 1024, validation_alias="SF_PARSE_CACHE_BYTES")
+    parse_cache_persist: bool = Field(True, validation_alias="SF_PARSE_CACHE_PERSIST")
+    # Files larger than this (bytes) are returned as outline/head/tail by read_file; also caps partial reads
+    read_max_bytes: int = Field(128 * 1024, validation_alias="SF_READ_MAX_BYTES")
+    # Memory budget (bytes) for file contents cached between search_code calls
+    search_cache_bytes: int = Field(64 * 1024 * 1024, validation_alias="SF_SEARCH_CACHE_BYTES")
+    # Research sub-agent budgets: total tokens, wall-clock seconds, tool calls, turns, and prompt size
+    subagent_max_tokens: int = Field(200000, validation_alias="SF_SUBAGENT_MAX_TOKENS")
+    subagent_timeout: float = Field(300, validation_alias="SF_SUBAGENT_TIMEOUT")
+    subagent_max_tool_calls: int = Field(40, validation_alias="SF_SUBAGENT_MAX_TOOL_CALLS")
+    subagent_max_turns: int = Field(10, validation_alias="SF_SUBAGENT_MAX_TURNS")
+    subagent_context_tokens: int = Field(32000, validation_alias="SF_SUBAGENT_CONTEXT_TOKENS")
+    # Memo of read-only tool results (bytes, 0 disables), and whether a repeated identical result
+    # is replaced by a reference to the earlier tool call while that one is still in the context
+    tool_memo_bytes: int = Field(32 * 1024 * 1024, validation_alias="SF_TOOL_MEMO_BYTES")
+    tool_memo_references: bool = Field(True, validation_alias="SF_TOOL_MEMO_REFERENCES")
+    # Tool outputs longer than this (characters) are stored in .sf/artifacts and replaced by a preview
+    # plus a handle for fetch_artifact (0 keeps every output in the conversation)
+    artifact_threshold: int = Field(32 * 1024, validation_alias="SF_ARTIFACT_THRESHOLD")
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -30,3 +84,12 @@ class Settings(BaseSettings):
 
 def get_settings(**kwargs) -> Settings:
     return Settings(**kwargs)
+
+@lru_cache(maxsize=1)
+def get_cached_settings() -> Settings:
+    """
+    Process-wide settings, read from the environment / .env once.
+    Hot paths (graph nodes, tool execution) should use this instead of get_settings().
+    Call get_cached_settings.cache_clear() to force a reload.
+    """
+    return Settings()
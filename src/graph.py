@@ -2,24 +2,37 @@ from typing import TypedDict, Annotated, List, Literal, Union
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 import operator
 
-from src.llm import get_llm
+from src.llm import ModelRegistry
+from src.config import get_cached_settings
+from src.tool_executor import execute_tool_calls
+from src.tool_memo import get_tool_memo
+from src.artifacts import get_artifact_store
+from src.checkpoint import SqliteCheckpointSaver
+import src.tools.base as base
 from src.tools.filesystem import list_directory, read_file
 from src.tools.terminal import run_shell_command
-from src.tools.editor import apply_diff_patch
+from src.tools.editor import apply_diff_patch, apply_edits
 from src.tools.analysis import analyze_code_structure
+from src.tools.symbols import find_definition, find_references, search_symbols
+from src.tools.search import search_code
+from src.tools.artifacts import fetch_artifact
+from src.tools.retrieval import retrieve_code
 from src.tools.subagent import delegate_research
 from src.mcp_loader import MCPManager
-from src.compression import compress_history
-from src.task_manager import task_create, task_complete, task_list
+from src.compression import compress_history, summarizer
+from src.task_manager import task_create, task_complete, task_add_dependencies, task_list, task_next
 from src.tools.skills import list_available_skills, load_skill
 
 # Core Tools
 CORE_TOOLS = [
-    list_directory, read_file, run_shell_command, apply_diff_patch,
-    analyze_code_structure, delegate_research,
-    task_create, task_complete, task_list,
+    list_directory, read_file, search_code, retrieve_code, run_shell_command, apply_diff_patch, apply_edits,
+    fetch_artifact,
+    analyze_code_structure, find_definition, find_references, search_symbols,
+    delegate_research,
+    task_create, task_complete, task_add_dependencies, task_list, task_next,
     list_available_skills, load_skill
 ]
 
@@ -42,9 +55,8 @@ async def coder_node(state: AgentState):
     # the state here (to keep history for the user), unless auto-compact triggers.
     compressed_messages = compress_history(state["messages"])
 
-    llm = get_llm()
-    current_tools = get_all_tools()
-    coder_llm = llm.bind_tools(current_tools)
+    # Shared client + cached tool binding (re-bound only when the MCP tool set changes)
+    coder_llm = ModelRegistry.get_bound(get_all_tools())
 
     # System Prompt with explicit "Laziness" instruction
     system_message = (
@@ -70,6 +82,9 @@ async def coder_node(state: AgentState):
     messages_for_llm = [HumanMessage(content=system_message)] + compressed_messages
 
     response = await coder_llm.ainvoke(messages_for_llm)
+
+    # Summarize anything the compressor just evicted, in the background (never on the critical path)
+    summarizer.schedule()
     return {"messages": [response], "sender": "coder"}
 
 async def tool_execution_node(state: AgentState):
@@ -81,24 +96,20 @@ async def tool_execution_node(state: AgentState):
 
     # Get tools map
     tool_map = {t.name: t for t in get_all_tools()}
-    results = []
-
-    for tool_call in last_message.tool_calls:
-        try:
-            tool = tool_map.get(tool_call["name"])
-            if tool:
-                # Execute
-                output = await tool.ainvoke(tool_call["args"])
-            else:
-                output = f"Error: Tool {tool_call['name']} not found."
-        except Exception as e:
-            output = f"Tool Execution Error: {str(e)}"
-
-        results.append(ToolMessage(
-            tool_call_id=tool_call["id"],
-            content=str(output),
-            name=tool_call["name"]
-        ))
+
+    # Independent calls run concurrently; results keep the order of `tool_calls`.
+    # Repeated reads of unchanged files are served from the memo (or refer to the earlier result),
+    # and large outputs are kept in the artifact store instead of the checkpointed state.
+    settings = get_cached_settings()
+    results = await execute_tool_calls(
+        last_message.tool_calls,
+        tool_map,
+        max_concurrency=settings.tool_concurrency,
+        memo=get_tool_memo(),
+        history=messages,
+        artifacts=get_artifact_store(),
+        spill_threshold=settings.artifact_threshold
+    )
 
     return {"messages": results, "sender": "tools"}
 
@@ -123,7 +134,16 @@ def router_coder(state: AgentState):
 
 # --- Graph ---
 
-def create_graph():
+def get_checkpointer() -> BaseCheckpointSaver:
+    """
+    Session persistence backend. SQLite (default) survives CLI restarts and supports
+    `chat --resume`; "memory" keeps everything in RAM for the process lifetime only.
+    """
+    if get_cached_settings().checkpoint_backend.lower() == "memory":
+        return MemorySaver()
+    return SqliteCheckpointSaver(base.PROJECT_ROOT / ".sf" / "checkpoints.sqlite")
+
+def create_graph(checkpointer: BaseCheckpointSaver = None):
     workflow = StateGraph(AgentState)
 
     workflow.add_node("coder", coder_node)
@@ -135,10 +155,23 @@ def create_graph():
     workflow.add_edge("tools", "coder")
 
     # Persistence
-    memory = MemorySaver()
+    memory = checkpointer if checkpointer is not None else get_checkpointer()
 
     # ⚠️ CRITICAL: The interrupt happens BEFORE the 'tools' node runs.
     # This gives the Human user a chance to see the plan and still say NO.
     return workflow.compile(checkpointer=memory, interrupt_before=["tools"])
 
-app_graph = create_graph()
+_app_graph = None
+
+def get_app_graph():
+    """The CLI's graph, built on first use so that importing this module opens no checkpoint store."""
+    global _app_graph
+    if _app_graph is None:
+        _app_graph = create_graph()
+    return _app_graph
+
+def __getattr__(name: str):
+    # `from src.graph import app_graph` keeps working; the graph is only built when it is asked for
+    if name == "app_graph":
+        return get_app_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,25 @@
+import hashlib
+import json
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_openai import AzureChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
-from src.config import get_settings
+from src.config import Settings, get_settings, get_cached_settings
 
-def get_llm():
+def get_llm(settings: Optional[Settings] = None):
     """
-    Initialize the LLM based on configuration (Azure OpenAI or Gemini).
+    Initialize the LLM based on configuration (Azure OpenAI, Gemini, or the offline replay model).
+    Always builds a NEW client. Use ModelRegistry for the long-lived, shared one.
     """
-    settings = get_settings()
+    if settings is None:
+        settings = get_settings()
+
+    if settings.llm_provider.lower() == "replay":
+        # Scripted responses, no network (benchmarks, offline tests)
+        from src.replay import load_replay_model
+        return load_replay_model(settings.llm_replay_script, settings.llm_replay_latency)
 
     if settings.llm_provider.lower() == "gemini":
         if not settings.google_api_key:
@@ -32,3 +45,91 @@ def get_llm():
         temperature=0,
         streaming=True
     )
+
+def _client_key(settings: Settings) -> Tuple:
+    """Identify a client by provider + deployment, so a config change gets a new client."""
+    provider = settings.llm_provider.lower()
+    if provider == "gemini":
+        return (provider, "gemini-2.5-pro")
+    if provider == "replay":
+        return (provider, settings.llm_replay_script, settings.llm_replay_latency)
+    return (provider, settings.azure_openai_endpoint, settings.azure_openai_deployment_name, settings.azure_openai_api_version)
+
+# id(tool) -> (weak reference, schema digest). Each tool is serialized once while it lives; the entry
+# goes with the tool, so an object that later reuses its id gets a digest of its own
+_tool_digests: Dict[int, Tuple[weakref.ref, str]] = {}
+
+def _tool_digest(tool: Any) -> str:
+    entry = _tool_digests.get(id(tool))
+    if entry is not None and entry[0]() is tool:
+        return entry[1]
+    schema = json.dumps(convert_to_openai_tool(tool), sort_keys=True, default=str)
+    digest = hashlib.sha1(schema.encode("utf-8")).hexdigest()
+    key = id(tool)
+    _tool_digests[key] = (weakref.ref(tool, lambda _, key=key: _tool_digests.pop(key, None)), digest)
+    return digest
+
+def tools_fingerprint(tools: Sequence[Any]) -> Tuple:
+    """
+    Identity of a tool set by content: name plus a digest of the schema that is bound
+    (description and arguments). MCP tools are rebuilt as new objects on every reload;
+    an unchanged schema keeps its binding, a changed one is re-bound.
+    """
+    return tuple((t.name, _tool_digest(t)) for t in tools)
+
+class ModelRegistry:
+    """
+    Process-wide cache of LLM clients and their tool-bound variants.
+
+    - One client per provider/deployment (keeps the HTTP connection pool alive across turns).
+    - One bound model per (client, tool-set fingerprint), so the coder and the sub-agents each keep
+      their binding; a small LRU drops tool sets that went stale (e.g. after an MCP reload).
+    """
+    MAX_BINDINGS = 8
+
+    _clients: Dict[Tuple, Any] = {}
+    _bound: "OrderedDict[Tuple, Any]" = OrderedDict()
+
+    @classmethod
+    def get_client(cls, settings: Optional[Settings] = None):
+        """
+        Return the shared client for the current configuration, creating it on first use.
+        """
+        if settings is None:
+            settings = get_cached_settings()
+
+        key = _client_key(settings)
+        client = cls._clients.get(key)
+        if client is None:
+            client = get_llm(settings)
+            cls._clients[key] = client
+        return client
+
+    @classmethod
+    def get_bound(cls, tools: Sequence[Any], settings: Optional[Settings] = None):
+        """
+        Return the shared client with `tools` bound, binding each distinct tool set only once.
+        """
+        if settings is None:
+            settings = get_cached_settings()
+
+        key = (_client_key(settings), tools_fingerprint(tools))
+        bound = cls._bound.get(key)
+        if bound is not None:
+            cls._bound.move_to_end(key)
+            return bound
+
+        bound = cls.get_client(settings).bind_tools(list(tools))
+        cls._bound[key] = bound
+        while len(cls._bound) > cls.MAX_BINDINGS:
+            cls._bound.popitem(last=False)
+        return bound
+
+    @classmethod
+    def reset(cls):
+        """
+        Drop all cached clients (e.g. after the .env changed, or between tests).
+        """
+        cls._clients = {}
+        cls._bound = OrderedDict()
+        get_cached_settings.cache_clear()
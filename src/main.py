@@ -2,14 +2,19 @@ import typer
 import sys
 import uuid
 import os
+import re
+import json
 import asyncio
+from datetime import datetime
 from typing import Optional, Dict, Any
 
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.prompt import Confirm, Prompt
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from rich.live import Live
+from rich.text import Text
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, ToolMessage
 
 # --- 引入 prompt_toolkit 核心组件 ---
 from prompt_toolkit import PromptSession
@@ -20,7 +25,11 @@ from prompt_toolkit.completion import Completer, Completion
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.graph import app_graph
+from src.checkpoint import SqliteCheckpointSaver
+from src.artifacts import get_artifact_store
+from src.config import get_cached_settings
 from src.llm import get_llm
+from src.replay import script_from_messages
 from src.mcp_loader import MCPManager
 from src.tools.skills import get_all_skills, read_skill_content
 
@@ -29,6 +38,7 @@ COMMANDS = {
     "/help": "Show available commands",
     "/skills": "List all available domain skills",
     "/load": "Load a specific skill into context",
+    "/mcp": "Show MCP server health and call statistics",
     "/clear": "Clear the conversation history (Not implemented)",
     "/exit": "Quit the SF CLI"
 }
@@ -80,13 +90,47 @@ def main():
     pass
 
 @app.command()
-def chat():
+def chat(resume: Optional[str] = typer.Option(None, "--resume", help="Resume a previous session by its Session ID.")):
     """
     Start an interactive chat session with the AI Agent.
     """
-    asyncio.run(run_chat_loop())
+    asyncio.run(run_chat_loop(resume))
 
-async def run_chat_loop():
+@app.command()
+def sessions(limit: int = typer.Option(10, help="Number of sessions to show.")):
+    """
+    List recent sessions that can be continued with `chat --resume <id>`.
+    """
+    checkpointer = app_graph.checkpointer
+    if not isinstance(checkpointer, SqliteCheckpointSaver):
+        console.print("[yellow]Sessions are not persisted (SF_CHECKPOINT_BACKEND=memory).[/yellow]")
+        return
+
+    rows = checkpointer.list_threads(limit)
+    if not rows:
+        console.print("[dim]No saved sessions.[/dim]")
+        return
+    for thread_id, last_active, count in rows:
+        when = datetime.fromtimestamp(last_active).strftime("%Y-%m-%d %H:%M")
+        console.print(f"{thread_id}  [dim]{when}  ({count} checkpoints)[/dim]")
+
+@app.command()
+def record(session_id: str = typer.Argument(..., help="Session ID (see `sessions`)."),
+           output: str = typer.Option("replay.json", "--output", "-o", help="Where to write the script.")):
+    """
+    Write a session's model responses as a replay script (LLM_PROVIDER=replay, SF_LLM_REPLAY_SCRIPT).
+    """
+    state = app_graph.get_state({"configurable": {"thread_id": session_id}})
+    messages = state.values.get("messages", []) if state else []
+    script = script_from_messages(messages)
+    if not script["responses"]:
+        console.print(f"[yellow]No model responses recorded for session {session_id}.[/yellow]")
+        raise typer.Exit(code=1)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(script, f, indent=2, ensure_ascii=False)
+    console.print(f"[green]Wrote {len(script['responses'])} responses to {output}[/green]")
+
+async def run_chat_loop(resume: Optional[str] = None):
     console.print(Panel.fit("[bold blue]SF AI Developer CLI[/bold blue]\n[dim]Secure. Compliant. Autonomous.[/dim]", border_style="blue"))
     console.print("[dim]Hint: Type `/help` to see available local commands.[/dim]")
 
@@ -97,10 +141,27 @@ async def run_chat_loop():
     if mcp_tools:
         console.print(f"[dim]Loaded {len(mcp_tools)} MCP tools[/dim]")
 
-    # Generate a unique thread ID for this session
-    thread_id = str(uuid.uuid4())
+    # Apply session retention (old checkpoints / sessions) before we start
+    checkpointer = app_graph.checkpointer
+    if isinstance(checkpointer, SqliteCheckpointSaver):
+        settings = get_cached_settings()
+        checkpointer.collect_garbage(keep_last=settings.checkpoint_keep, max_age_days=settings.session_max_age_days)
+    # Large tool outputs of sessions past retention go with them
+    artifacts = get_artifact_store()
+    if artifacts is not None:
+        artifacts.collect_garbage(max_age_days=get_cached_settings().session_max_age_days)
+
+    # Resume an existing thread, or generate a unique thread ID for this session
+    thread_id = resume or str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}}
 
+    if resume:
+        snapshot = app_graph.get_state(config)
+        if not snapshot.values:
+            console.print(f"[red]Session {resume} not found.[/red]")
+            return
+        console.print(f"[dim]Resumed session with {len(snapshot.values.get('messages', []))} messages.[/dim]")
+
     console.print(f"[dim]Session ID: {thread_id}[/dim]")
 
     # 👇 [核心修改] 初始化带有自动补全功能的会话 (Session)
@@ -130,6 +191,7 @@ async def run_chat_loop():
 [bold]Available Commands:[/bold]
   /skills              List all available domain skills
   /load <skill_name>   Load a skill into the current context
+  /mcp                 Show MCP server status, calls, errors and latency
   /exit                Quit the CLI
   /clear               (Not implemented) Clear history
 """
@@ -145,6 +207,23 @@ async def run_chat_loop():
                     console.print(Panel(skill_list, title="Available Skills", border_style="cyan"))
                 continue
 
+            if cmd == "/mcp":
+                stats = MCPManager.get_stats()
+                if not stats:
+                    console.print("[yellow]No MCP servers configured.[/yellow]")
+                else:
+                    lines = []
+                    for name, s in stats.items():
+                        color = {"up": "green", "down": "red"}.get(s["status"], "dim")
+                        lines.append(
+                            f"[{color}]{s['status']:>4}[/{color}]  [bold]{name}[/bold]  "
+                            f"calls={s['calls']} errors={s['errors']} avg={s['avg_latency_ms']}ms restarts={s['restarts']}"
+                        )
+                        if s["last_error"]:
+                            lines.append(f"      [dim]last error: {s['last_error']}[/dim]")
+                    console.print(Panel("\n".join(lines), title="MCP Servers", border_style="cyan"))
+                continue
+
             if cmd.startswith("/load "):
                 skill_name = cmd[6:].strip()
                 if not skill_name:
@@ -177,55 +256,105 @@ async def run_chat_loop():
     finally:
         await MCPManager.cleanup()
 
+def _message_text(content: Any) -> str:
+    """Flatten message content (plain string or list of content parts) to text."""
+    if isinstance(content, list):
+        return "".join(part.get('text', '') for part in content if isinstance(part, dict) and part.get('type') == 'text')
+    return str(content) if content else ""
+
+def _full_tool_output(msg: ToolMessage) -> str:
+    """A tool result as the tool returned it, reading spilled outputs back from the artifact store."""
+    handle = msg.artifact.get("handle") if isinstance(msg.artifact, dict) else None
+    if handle is None:
+        # Memoized repeats carry the preview text only
+        match = re.search(r"stored as artifact (art_[0-9a-f]{16})", str(msg.content))
+        handle = match.group(1) if match else None
+    store = get_artifact_store()
+    if handle and store is not None:
+        text = store.get(handle)
+        if text is not None:
+            return text
+    return str(msg.content)
+
+def _render_message(msg: BaseMessage):
+    """Render one finished message, collapsing long ones behind a 't' / 'v' prompt."""
+    if isinstance(msg, AIMessage):  # It's from the Coder
+        # Render thoughts (collapsible)
+        full_thoughts = _message_text(msg.content)
+        if full_thoughts:
+            if len(full_thoughts) <= 150:
+                console.print(f"[bold blue][Coder][/bold blue] {full_thoughts}")
+            else:
+                preview = full_thoughts[:100].replace('\n', ' ') + "..."
+                console.print(f"[bold blue][Coder][/bold blue] [dim]{preview}[/dim]")
+                user_choice = Prompt.ask("[dim]Press 't' to read full thoughts, or ENTER to continue[/dim]", choices=["t"], default="", show_choices=False, show_default=False)
+                if user_choice.lower() == 't':
+                    with console.pager():
+                        console.print(Markdown(full_thoughts))
+        # Render proposed tools (always visible)
+        if msg.tool_calls:
+            console.print(f"[bold cyan][Coder][/bold cyan] Proposed tools: {[tc['name'] for tc in msg.tool_calls]}")
+
+    elif isinstance(msg, ToolMessage):  # It's from a Tool
+        # Render tool results (collapsible)
+        full_content = str(msg.content)
+        if len(full_content) <= 300:
+            console.print(f"[bold magenta][Tool][/bold magenta] Result: {full_content}")
+        else:
+            preview = full_content[:300].replace('\n', ' ') + "\n... [Output Truncated] ..."
+            console.print(f"[bold magenta][Tool][/bold magenta] Result: [dim]{preview}[/dim]")
+            user_choice = Prompt.ask("[dim]Press 'v' to view full output, or ENTER to continue[/dim]", choices=["v"], default="", show_choices=False, show_default=False)
+            if user_choice.lower() == 'v':
+                with console.pager():
+                    console.print(_full_tool_output(msg))
+
+def _live_view(streamed: str) -> Text:
+    """The tail of the tokens streamed so far, sized to the terminal."""
+    max_lines = max(3, console.height - 4)
+    lines = streamed.splitlines()[-max_lines:]
+    return Text.assemble(("[Coder] ", "bold blue"), "\n".join(lines))
+
 async def _run_interaction(inputs: Optional[Dict[str, Any]], config: Dict[str, Any]):
     """
-    [REFACTORED] Run the graph loop with a "collect then render" strategy
-    to support interactive expandable outputs.
+    Run the graph loop, streaming the Coder's tokens live as they arrive.
+    Each finished message is then rendered with the collapsible 't' / 'v' expansion.
     """
+    live: Optional[Live] = None
     try:
-        # --- [核心修改] Step 1: Silently collect all new messages from the stream ---
-        new_messages = []
-        async for event in app_graph.astream(inputs, config=config, stream_mode="updates"):
-            for node, values in event.items():
-                if "messages" in values:
-                    # Just collect, don't print yet!
-                    new_messages.extend(values["messages"])
-
-        # --- [核心修改] Step 2: Interactively render the collected messages ---
-        for msg in new_messages:
-            if isinstance(msg, AIMessage):  # It's from the Coder
-                # Render thoughts (collapsible)
-                if msg.content:
-                    full_thoughts = "".join(part.get('text', '') for part in msg.content if isinstance(part, dict) and part.get('type') == 'text') if isinstance(msg.content, list) else str(msg.content)
-                    if full_thoughts:
-                        if len(full_thoughts) <= 150:
-                            console.print(f"[bold blue][Coder][/bold blue] {full_thoughts}")
-                        else:
-                            preview = full_thoughts[:100].replace('\n', ' ') + "..."
-                            console.print(f"[bold blue][Coder][/bold blue] [dim]{preview}[/dim]")
-                            user_choice = Prompt.ask("[dim]Press 't' to read full thoughts, or ENTER to continue[/dim]", choices=["t"], default="", show_choices=False, show_default=False)
-                            if user_choice.lower() == 't':
-                                with console.pager():
-                                    console.print(Markdown(full_thoughts))
-                # Render proposed tools (always visible)
-                if msg.tool_calls:
-                    console.print(f"[bold cyan][Coder][/bold cyan] Proposed tools: {[tc['name'] for tc in msg.tool_calls]}")
-
-            elif isinstance(msg, ToolMessage):  # It's from a Tool
-                # Render tool results (collapsible)
-                full_content = str(msg.content)
-                if len(full_content) <= 300:
-                    console.print(f"[bold magenta][Tool][/bold magenta] Result: {full_content}")
+        streamed = ""
+        async for mode, data in app_graph.astream(inputs, config=config, stream_mode=["messages", "updates"]):
+            if mode == "messages":
+                # Token chunks. Only the Coder's own LLM call is shown live
+                # (sub-agents and background summaries also stream through here).
+                chunk, metadata = data
+                if metadata.get("langgraph_node") != "coder" or not isinstance(chunk, AIMessageChunk):
+                    continue
+                text = _message_text(chunk.content)
+                if not text:
+                    continue
+                streamed += text
+                if live is None:
+                    live = Live(_live_view(streamed), console=console, transient=True, refresh_per_second=12)
+                    live.start()
                 else:
-                    preview = full_content[:300].replace('\n', ' ') + "\n... [Output Truncated] ..."
-                    console.print(f"[bold magenta][Tool][/bold magenta] Result: [dim]{preview}[/dim]")
-                    user_choice = Prompt.ask("[dim]Press 'v' to view full output, or ENTER to continue[/dim]", choices=["v"], default="", show_choices=False, show_default=False)
-                    if user_choice.lower() == 'v':
-                        with console.pager():
-                            console.print(full_content)
-
-
-        # --- Step 3: Handle the Human-in-the-Loop approval (this part was already correct) ---
+                    live.update(_live_view(streamed))
+
+            elif mode == "updates":
+                # A node finished: replace the live view with the final, collapsible rendering
+                if live is not None:
+                    live.stop()
+                    live = None
+                streamed = ""
+                for node, values in data.items():
+                    if isinstance(values, dict) and "messages" in values:
+                        for msg in values["messages"]:
+                            _render_message(msg)
+
+        if live is not None:
+            live.stop()
+            live = None
+
+        # --- Handle the Human-in-the-Loop approval ---
         snapshot = app_graph.get_state(config)
         if snapshot.next and "tools" in snapshot.next:
             last_msg = snapshot.values["messages"][-1]
@@ -256,9 +385,13 @@ async def _run_interaction(inputs: Optional[Dict[str, Any]], config: Dict[str, A
                     await _run_interaction(None, config)
 
     except KeyboardInterrupt:
+        if live is not None:
+            live.stop()
         console.print("\n[bold red]🛑 Generation interrupted by user.[/bold red]")
         return
     except Exception as e:
+        if live is not None:
+            live.stop()
         console.print(f"[bold red]Interaction Error:[/bold red] {e}")
 
 @app.command()
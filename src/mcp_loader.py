@@ -1,46 +1,377 @@
 import json
 import asyncio
+import hashlib
 import os
 import shutil
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from contextlib import AsyncExitStack
+from typing import Callable, List, Dict, Any, Optional
 
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+from src.config import get_cached_settings
 import src.tools.base as base
 
-# Import the actual MCP adapter
+# Import the actual MCP client
 try:
-    from langchain_mcp_adapters.tools import load_mcp_tools as adapter_load_mcp_tools
     from mcp import ClientSession, StdioServerParameters
     from mcp.client.stdio import stdio_client
     HAS_MCP = True
 except ImportError:
     HAS_MCP = False
-    print("Warning: langchain-mcp-adapters or mcp not installed. MCP tools will not be loaded.")
+    print("Warning: mcp not installed. MCP tools will not be loaded.")
+
+def _resolve_args(name: str, args: List[str]) -> List[str]:
+    """Resolve env vars in args (e.g. env:GITLAB_TOKEN)."""
+    resolved_args = []
+    for arg in args:
+        if arg.startswith("env:"):
+            env_var = arg.split(":", 1)[1]
+            val = os.getenv(env_var)
+            if val:
+                resolved_args.append(val)
+            else:
+                print(f"[MCP] Warning: Environment variable {env_var} not found for server {name}")
+                resolved_args.append(arg) # Keep as is or skip? usually fail.
+        else:
+            resolved_args.append(arg)
+    return resolved_args
+
+def _schema_cache_key(command: str, args: List[str]) -> str:
+    """
+    Cache key for a server's tool schemas: command + args + mtimes of the executable and of
+    any argument that is a file (e.g. a server script), so rebuilding the server invalidates it.
+    """
+    parts = [command, *args]
+    for candidate in [shutil.which(command) or command, *args]:
+        try:
+            path = Path(candidate)
+            if path.is_file():
+                parts.append(f"{path.resolve()}@{path.stat().st_mtime_ns}")
+        except (OSError, ValueError):
+            continue
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+def _result_to_text(result) -> str:
+    """Flatten an MCP CallToolResult into the string form our tools return."""
+    texts = []
+    for block in result.content or []:
+        text = getattr(block, "text", None)
+        if text is not None:
+            texts.append(text)
+        else:
+            texts.append(f"[{getattr(block, 'type', 'binary')} content]")
+    if not texts and getattr(result, "structuredContent", None):
+        texts.append(json.dumps(result.structuredContent))
+
+    output = "\n".join(texts) if texts else "(No output)"
+    if result.isError:
+        return f"Error: {output}"
+    return output
+
+class MCPServer:
+    """
+    One configured stdio MCP server.
+    The connection is owned by a single long-lived runner task (the stdio/session context
+    managers must be entered and exited in the same task), so servers can be started
+    concurrently and stopped independently.
+
+    Also tracks liveness and per-server call metrics for the MCPManager supervisor.
+    """
+    def __init__(self, name: str, params: Any, connect_timeout: float, lazy: bool = False,
+                 on_tools_changed: Optional[Callable[["MCPServer"], None]] = None,
+                 on_started: Optional[Callable[["MCPServer"], None]] = None):
+        self.name = name
+        self.params = params
+        self.connect_timeout = connect_timeout
+        self.lazy = lazy
+        self.on_tools_changed = on_tools_changed
+        self.on_started = on_started
+        self.session = None
+        self.tool_specs: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._start_lock = asyncio.Lock()
+
+        # Supervision: `wanted` = the server should be running (started and not stopped on purpose)
+        self.wanted = False
+        self.restarts = 0
+        self.backoff = 0.0
+        self.next_retry_at = 0.0
+
+        # Metrics
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.session is not None and self._runner is not None and not self._runner.done()
+
+    @property
+    def is_dead(self) -> bool:
+        """Should be running but is not (crashed, or failed to (re)start)."""
+        return self.wanted and not self.is_running
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    listed = await session.list_tools()
+                    self.tool_specs = [
+                        {
+                            "name": t.name,
+                            "description": t.description or "",
+                            "inputSchema": t.inputSchema,
+                            "annotations": t.annotations.model_dump(exclude_none=True) if t.annotations else {},
+                        }
+                        for t in listed.tools
+                    ]
+                    self.session = session
+                    self.error = None
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def start(self) -> bool:
+        """Spawn the server and wait (bounded by connect_timeout) until its tools are listed."""
+        async with self._start_lock:
+            if self.is_running:
+                return True
+
+            previous_specs = self.tool_specs
+            self.wanted = True
+            self._ready = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._runner = asyncio.create_task(self._run(), name=f"mcp-{self.name}")
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.connect_timeout)
+            except asyncio.TimeoutError:
+                self.error = f"connect timed out after {self.connect_timeout}s"
+                await self._shutdown()
+
+            if not self.is_running:
+                self._schedule_retry()
+                return False
+
+            self.backoff = 0.0
+            self.next_retry_at = 0.0
+            if self.on_started:
+                self.on_started(self)
+            # For a lazy server, previous_specs are the cached schemas it was deferred with
+            if previous_specs and previous_specs != self.tool_specs and self.on_tools_changed:
+                self.on_tools_changed(self)
+            return True
+
+    def _schedule_retry(self, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.backoff = min(max_delay, self.backoff * 2 if self.backoff else base_delay)
+        self.next_retry_at = time.monotonic() + self.backoff
+
+    async def _shutdown(self):
+        if self._runner is None:
+            return
+        if self._stop:
+            self._stop.set()
+        try:
+            await asyncio.wait_for(self._runner, timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._runner.cancel()
+        except Exception:
+            pass
+        self._runner = None
+        self.session = None
+
+    async def stop(self):
+        """Stop on purpose (the supervisor will not restart it)."""
+        self.wanted = False
+        await self._shutdown()
+
+    async def restart(self) -> bool:
+        await self._shutdown()
+        ok = await self.start()
+        if ok:
+            self.restarts += 1
+            print(f"[MCP] Reconnected to {self.name} (restart #{self.restarts})")
+        return ok
+
+    async def _is_alive(self, ping_timeout: float = 5.0) -> bool:
+        # The runner task outlives a dead child process (it waits on the stop event),
+        # so liveness is decided by a round-trip, not by the task state.
+        if not self.is_running:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=ping_timeout)
+            return True
+        except Exception as e:
+            self.error = f"ping failed: {e or type(e).__name__}"
+            return False
+
+    async def check_health(self, ping_timeout: float = 5.0):
+        """Ping a running server; restart a dead one once its backoff has elapsed."""
+        if self.is_running:
+            if await self._is_alive(ping_timeout):
+                return
+            print(f"[MCP] {self.name} is not responding: {self.error}")
+            await self._shutdown()
+
+        if self.is_dead and time.monotonic() >= self.next_retry_at:
+            await self.restart()
+
+    async def _ensure_running(self) -> Optional[str]:
+        """Start a lazy / crashed server for a call. Returns an error message if unavailable."""
+        if self.is_running:
+            return None
+        wait = self.next_retry_at - time.monotonic()
+        if self.is_dead and wait > 0:
+            # Fail fast instead of blocking every call on a server that keeps dying
+            return f"Error: MCP server '{self.name}' is down ({self.error}). Next reconnect attempt in {wait:.0f}s."
+        if self.is_dead:
+            ok = await self.restart()
+        else:
+            # Lazy servers are spawned on their first real tool invocation
+            ok = await self.start()
+        if not ok:
+            return f"Error: MCP server '{self.name}' is not available: {self.error}"
+        return None
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            error = await self._ensure_running()
+            if error:
+                self.errors += 1
+                self.last_error = error
+                return error
+
+            try:
+                result = await self.session.call_tool(tool_name, arguments)
+            except Exception as e:
+                if await self._is_alive():
+                    raise
+                # The server died under us. The call itself is not replayed (it may not be
+                # idempotent), but the server is brought back so the next call just works.
+                error = f"Error: MCP server '{self.name}' crashed during '{tool_name}' ({e or type(e).__name__})."
+                print(f"[MCP] {error[7:]} Reconnecting...")
+                if await self.restart():
+                    error += " The server was restarted; the call can be retried."
+                self.errors += 1
+                self.last_error = error
+                return error
+
+            output = _result_to_text(result)
+            if result.isError:
+                self.errors += 1
+                self.last_error = output
+            return output
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+            raise
+        finally:
+            self.total_latency += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        if self.is_running:
+            status = "up"
+        elif self.is_dead:
+            status = "down"
+        else:
+            status = "idle"
+        return {
+            "status": status,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(1000 * self.total_latency / self.calls, 1) if self.calls else 0.0,
+            "restarts": self.restarts,
+            "last_error": self.last_error or self.error,
+        }
 
 class MCPManager:
     """
     Manages MCP connections and tools.
     """
-    _instance = None
-    _exit_stack = None
+    _servers: Dict[str, MCPServer] = {}
     _tools = []
+    _initialized = False
+    _supervisor: Optional[asyncio.Task] = None
+
+    @classmethod
+    def _cache_dir(cls) -> Path:
+        return base.PROJECT_ROOT / ".sf" / "cache" / "mcp"
+
+    @classmethod
+    def _load_cached_specs(cls, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = cls._cache_dir() / f"{key}.json"
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _save_cached_specs(cls, key: str, specs: List[Dict[str, Any]]):
+        try:
+            cache_dir = cls._cache_dir()
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = cache_dir / f"{key}.json.tmp"
+            tmp.write_text(json.dumps(specs), encoding="utf-8")
+            os.replace(tmp, cache_dir / f"{key}.json")
+        except OSError as e:
+            print(f"[MCP] Warning: could not cache tool schemas: {e}")
+
+    @classmethod
+    def _make_tool(cls, server_name: str, spec: Dict[str, Any]) -> StructuredTool:
+        """
+        Build a LangChain tool that routes calls through the manager (not a fixed session),
+        so it works for lazily started servers too.
+        """
+        tool_name = spec["name"]
+
+        async def _call(**kwargs) -> str:
+            return await cls.call_tool(server_name, tool_name, kwargs)
+
+        return StructuredTool(
+            name=tool_name,
+            description=spec.get("description") or tool_name,
+            args_schema=spec.get("inputSchema") or {"type": "object", "properties": {}},
+            coroutine=_call,
+            metadata={**spec.get("annotations", {}), "mcp_server": server_name},
+        )
+
+    @classmethod
+    async def _connect(cls, server: MCPServer) -> List[Dict[str, Any]]:
+        if await server.start():
+            print(f"[MCP] Loaded {len(server.tool_specs)} tools from {server.name}")
+            return server.tool_specs
+        print(f"[MCP] Failed to connect to {server.name}: {server.error}")
+        return []
 
     @classmethod
     async def initialize(cls):
         """
         Initialize connections to all configured MCP servers.
         This must be called within an async context (e.g., startup).
+
+        Servers start concurrently, each bounded by its connect timeout. Servers in lazy mode
+        ("lazy": true in the config, or SF_MCP_LAZY=true) with a warm schema cache are not
+        spawned at all until one of their tools is called.
         """
         if not HAS_MCP:
             return []
 
-        if cls._exit_stack:
+        if cls._initialized:
             # Already initialized
             return cls._tools
 
-        cls._exit_stack = AsyncExitStack()
+        cls._initialized = True
+        cls._servers = {}
         cls._tools = []
 
         config_path = base.PROJECT_ROOT / "sf_mcp_config.json"
@@ -51,74 +382,100 @@ class MCPManager:
             config_content = config_path.read_text(encoding="utf-8")
             config = json.loads(config_content)
             mcp_servers = config.get("mcpServers", {})
+        except Exception as e:
+            print(f"[MCP] Error initializing: {e}")
+            return []
 
-            print(f"[MCP] Found configuration for: {list(mcp_servers.keys())}")
-
-            for name, settings in mcp_servers.items():
-                command = settings.get("command")
-                args = settings.get("args", [])
-                env_config = settings.get("env", {})
-
-                # Check if command exists
-                if command == "uvx" and not shutil.which("uvx"):
-                     # Fallback check or warning
-                     pass
-
-                # Resolve env vars in args (e.g. env:GITLAB_TOKEN)
-                resolved_args = []
-
-                # Merge current env with config env
-                env = os.environ.copy()
-                if env_config:
-                    env.update(env_config)
-
-                for arg in args:
-                    if arg.startswith("env:"):
-                        env_var = arg.split(":", 1)[1]
-                        val = os.getenv(env_var)
-                        if val:
-                            resolved_args.append(val)
-                        else:
-                            print(f"[MCP] Warning: Environment variable {env_var} not found for server {name}")
-                            resolved_args.append(arg) # Keep as is or skip? usually fail.
-                    else:
-                        resolved_args.append(arg)
-
-                server_params = StdioServerParameters(
-                    command=command,
-                    args=resolved_args,
-                    env=env
-                )
-
-                try:
-                    # Connect to server
-                    # We enter the context manager and keep it alive via ExitStack
-                    read, write = await cls._exit_stack.enter_async_context(stdio_client(server_params))
-                    session = await cls._exit_stack.enter_async_context(ClientSession(read, write))
-                    await session.initialize()
+        print(f"[MCP] Found configuration for: {list(mcp_servers.keys())}")
+        settings = get_cached_settings()
 
-                    # Load tools from this session
-                    tools = await adapter_load_mcp_tools(session)
-                    print(f"[MCP] Loaded {len(tools)} tools from {name}")
-                    cls._tools.extend(tools)
+        names, jobs = [], []
+        for name, server_settings in mcp_servers.items():
+            command = server_settings.get("command")
+            args = _resolve_args(name, server_settings.get("args", []))
 
-                except Exception as e:
-                    print(f"[MCP] Failed to connect to {name}: {e}")
+            # Merge current env with config env
+            env = os.environ.copy()
+            env.update(server_settings.get("env", {}))
 
-        except Exception as e:
-            print(f"[MCP] Error initializing: {e}")
+            cache_key = _schema_cache_key(command, args)
+            server = MCPServer(
+                name,
+                StdioServerParameters(command=command, args=args, env=env),
+                connect_timeout=server_settings.get("timeout", settings.mcp_connect_timeout),
+                lazy=server_settings.get("lazy", settings.mcp_lazy),
+                on_tools_changed=cls._on_tools_changed,
+                # Every successful (re)start refreshes the cache, so upgraded servers are not stuck on old schemas
+                on_started=lambda srv, key=cache_key: cls._save_cached_specs(key, srv.tool_specs),
+            )
+            cls._servers[name] = server
+
+            cached = cls._load_cached_specs(cache_key) if server.lazy else None
+            if cached is not None:
+                print(f"[MCP] {name}: {len(cached)} tools from cache (server starts on first use)")
+                server.tool_specs = cached
+                jobs.append(asyncio.sleep(0, result=cached))
+            else:
+                jobs.append(cls._connect(server))
+            names.append(name)
+
+        # Startup is bounded by the slowest server, not the sum
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for name, specs in zip(names, results):
+            if isinstance(specs, BaseException):
+                print(f"[MCP] Failed to connect to {name}: {specs}")
+                continue
+            cls._tools.extend(cls._make_tool(name, spec) for spec in specs)
+
+        if settings.mcp_health_interval > 0:
+            cls._supervisor = asyncio.create_task(cls._supervise(settings.mcp_health_interval), name="mcp-supervisor")
 
         return cls._tools
 
+    @classmethod
+    async def _supervise(cls, interval: float):
+        """Background liveness check: ping running servers, restart dead ones with backoff."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.gather(
+                *(server.check_health() for server in list(cls._servers.values())),
+                return_exceptions=True
+            )
+
+    @classmethod
+    def _on_tools_changed(cls, server: MCPServer):
+        """A restarted server exposes a different tool list: rebuild our tools (the model re-binds)."""
+        print(f"[MCP] Tool list of {server.name} changed; re-binding tools.")
+        cls._tools = [
+            cls._make_tool(name, spec)
+            for name, srv in cls._servers.items()
+            for spec in srv.tool_specs
+        ]
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Per-server status, call counts, error counts, average latency and restarts."""
+        return {name: server.stats() for name, server in cls._servers.items()}
+
+    @classmethod
+    async def call_tool(cls, server_name: str, tool_name: str, arguments: Dict[str, Any]) -> str:
+        server = cls._servers.get(server_name)
+        if server is None:
+            return f"Error: MCP server '{server_name}' is not configured."
+        return await server.call_tool(tool_name, arguments)
+
     @classmethod
     async def cleanup(cls):
         """
         Close all connections.
         """
-        if cls._exit_stack:
-            await cls._exit_stack.aclose()
-            cls._exit_stack = None
-            cls._tools = []
+        if cls._supervisor:
+            cls._supervisor.cancel()
+            cls._supervisor = None
+        await asyncio.gather(*(server.stop() for server in cls._servers.values()), return_exceptions=True)
+        cls._servers = {}
+        cls._tools = []
+        cls._initialized = False
 
     @classmethod
     def get_tools(cls) -> List[Any]:
@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class Latency(NamedTuple):
+    """Simulated timing of one completion."""
+    first_token: float = 0.0     # seconds until the first chunk
+    per_chunk: float = 0.0       # seconds between chunks
+    chunk_chars: int = 16        # characters of content per streamed chunk
+
+# Named profiles for SF_LLM_REPLAY_LATENCY (a script's own "latency" takes precedence)
+LATENCY_PROFILES: Dict[str, Latency] = {
+    "none": Latency(0.0, 0.0),
+    "fast": Latency(0.05, 0.002),
+    "azure": Latency(0.6, 0.015),
+    "slow": Latency(2.0, 0.04),
+}
+
+DEFAULT_RESPONSE = {"content": "Done."}
+
+def _text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content or "")
+
+class ReplayScript:
+    """
+    Scripted model responses, served in order. A script is JSON:
+
+        {
+          "latency": {"first_token": 0.2, "per_chunk": 0.01},      # optional
+          "default": {"content": "Done."},                          # once responses run out
+          "responses": [
+            {"content": "Looking around.", "tool_calls": [{"name": "list_directory", "args": {}}]},
+            {"when": "Research Sub-Agent", "content": "Findings...", "repeat": true},
+            {"content": "All done."}
+          ]
+        }
+
+    A response is used once, in order, unless it has "repeat": true. With "when" it is only
+    used if the regex matches the text of the prompt's first or last message (e.g. to answer
+    sub-agents differently from the main agent). Shared by the in-process chat model and the
+    OpenAI-compatible server (src/replay_server.py); thread-safe.
+    """
+    def __init__(self, responses: Sequence[Dict[str, Any]], default: Optional[Dict[str, Any]] = None,
+                 latency: Optional[Latency] = None):
+        self.responses = list(responses)
+        self.default = default or DEFAULT_RESPONSE
+        self.latency = latency
+        self._used = [False] * len(self.responses)
+        self._lock = threading.Lock()
+        self._call_ids = itertools.count(1)
+        self.served = 0
+
+    @classmethod
+    def from_file(cls, path) -> "ReplayScript":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        latency = Latency(**data["latency"]) if data.get("latency") else None
+        return cls(data.get("responses", []), data.get("default"), latency)
+
+    def next_response(self, first_text: str, last_text: str) -> Dict[str, Any]:
+        """The next response for a prompt, with tool call ids filled in."""
+        with self._lock:
+            chosen = self.default
+            for i, response in enumerate(self.responses):
+                if self._used[i]:
+                    continue
+                when = response.get("when")
+                if when and not (re.search(when, first_text) or re.search(when, last_text)):
+                    continue
+                if not response.get("repeat"):
+                    self._used[i] = True
+                chosen = response
+                break
+            self.served += 1
+            tool_calls = [
+                {"name": tc["name"], "args": tc.get("args", {}), "id": tc.get("id") or f"call_replay_{next(self._call_ids)}"}
+                for tc in chosen.get("tool_calls", [])
+            ]
+        return {"content": chosen.get("content", ""), "tool_calls": tool_calls}
+
+    def reset(self):
+        with self._lock:
+            self._used = [False] * len(self.responses)
+            self.served = 0
+
+def script_from_messages(messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    """Record a conversation's model turns (its AIMessages, in order) as a replay script."""
+    responses = []
+    for message in messages:
+        if not isinstance(message, AIMessage):
+            continue
+        response: Dict[str, Any] = {"content": _text(message.content)}
+        if message.tool_calls:
+            response["tool_calls"] = [{"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls]
+        responses.append(response)
+    return {"responses": responses}
+
+def content_chunks(content: str, size: int) -> List[str]:
+    return [content[i:i + size] for i in range(0, len(content), max(1, size))] or [""]
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Offline stand-in for the chat model (LLM_PROVIDER=replay): answers from a ReplayScript,
+    streaming content in chunks with simulated latency, and reports token usage counted with
+    the configured tokenizer so budgets and benchmarks behave as with a real endpoint.
+    """
+    script: Any
+    latency: Latency = Latency()
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # The script decides which tools are called; nothing to send anywhere
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        first = _text(messages[0].content) if messages else ""
+        last = _text(messages[-1].content) if messages else ""
+        return self.script.next_response(first, last)
+
+    def _usage(self, messages: List[BaseMessage], message: AIMessage) -> Dict[str, int]:
+        # Imported here: src.compression imports src.llm, which loads this module
+        from src.compression import get_token_counter
+        counter = get_token_counter()
+        input_tokens = sum(counter.count_message(m) for m in messages)
+        output_tokens = counter.count_message(message)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _message(self, messages: List[BaseMessage], response: Dict[str, Any]) -> AIMessage:
+        message = AIMessage(content=response["content"], tool_calls=response["tool_calls"])
+        message.usage_metadata = self._usage(messages, message)
+        return message
+
+    def _chunks(self, messages: List[BaseMessage], response: Dict[str, Any]) -> Iterator[AIMessageChunk]:
+        pieces = content_chunks(response["content"], self.latency.chunk_chars)
+        for piece in pieces[:-1]:
+            yield AIMessageChunk(content=piece)
+        # The last chunk carries the tool calls and the usage of the whole completion
+        usage = self._usage(messages, AIMessage(content=response["content"], tool_calls=response["tool_calls"]))
+        yield AIMessageChunk(
+            content=pieces[-1],
+            tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i, "type": "tool_call_chunk"}
+                for i, tc in enumerate(response["tool_calls"])
+            ],
+            usage_metadata=usage,
+        )
+
+    def _total_delay(self, response: Dict[str, Any]) -> float:
+        count = len(content_chunks(response["content"], self.latency.chunk_chars))
+        return self.latency.first_token + self.latency.per_chunk * (count - 1)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        response = self._respond(messages)
+        time.sleep(self._total_delay(response))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, response))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        response = self._respond(messages)
+        await asyncio.sleep(self._total_delay(response))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, response))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._respond(messages)
+        time.sleep(self.latency.first_token)
+        for i, chunk in enumerate(self._chunks(messages, response)):
+            if i:
+                time.sleep(self.latency.per_chunk)
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        response = self._respond(messages)
+        await asyncio.sleep(self.latency.first_token)
+        for i, chunk in enumerate(self._chunks(messages, response)):
+            if i:
+                await asyncio.sleep(self.latency.per_chunk)
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+def load_replay_model(script_path: Optional[str], profile: str = "none") -> ReplayChatModel:
+    """The replay model for a script file (or an empty script that always answers DEFAULT_RESPONSE)."""
+    if profile not in LATENCY_PROFILES:
+        raise ValueError(f"Unknown replay latency profile '{profile}'. Choose from: {', '.join(LATENCY_PROFILES)}")
+    script = ReplayScript.from_file(script_path) if script_path else ReplayScript([])
+    return ReplayChatModel(script=script, latency=script.latency or LATENCY_PROFILES[profile])
@@ -0,0 +1,180 @@
+"""
+Local OpenAI-compatible stand-in for the chat completions endpoint, serving a ReplayScript.
+
+    python -m src.replay_server --script replay.json --port 8765 --latency fast
+
+Point a client at it as it would an Azure deployment (AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8765)
+or a plain OpenAI base URL (http://127.0.0.1:8765/v1). Any key is accepted.
+"""
+import argparse
+import json
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.replay import LATENCY_PROFILES, Latency, ReplayScript, content_chunks
+
+# /v1/chat/completions, /chat/completions, /openai/deployments/<name>/chat/completions
+COMPLETIONS_PATH = re.compile(r"^(?:/v1|/openai/deployments/[^/]+)?/chat/completions$")
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+def _estimate_tokens(text: str) -> int:
+    # Same character estimate the compressor falls back to without a tokenizer
+    return max(1, len(text) // 4)
+
+def _tool_calls(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"id": tc["id"], "type": "function", "function": {"name": tc["name"], "arguments": json.dumps(tc["args"])}}
+        for tc in response["tool_calls"]
+    ]
+
+def _usage(messages: List[Dict[str, Any]], response: Dict[str, Any]) -> Dict[str, int]:
+    prompt = sum(_estimate_tokens(_message_text(m)) for m in messages)
+    completion = _estimate_tokens(response["content"] + json.dumps(response["tool_calls"]))
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: "ReplayServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+    def do_POST(self):
+        if not COMPLETIONS_PATH.match(self.path.split("?")[0]):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": {"message": f"Invalid JSON body: {e}", "type": "invalid_request_error"}})
+            return
+
+        messages = request.get("messages") or []
+        first = _message_text(messages[0]) if messages else ""
+        last = _message_text(messages[-1]) if messages else ""
+        response = self.server.script.next_response(first, last)
+        model = request.get("model") or self.server.model_name
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(model, messages, response, include_usage)
+        else:
+            self._complete(model, messages, response)
+
+    def _complete(self, model: str, messages: List[Dict[str, Any]], response: Dict[str, Any]):
+        latency = self.server.latency
+        count = len(content_chunks(response["content"], latency.chunk_chars))
+        time.sleep(latency.first_token + latency.per_chunk * (count - 1))
+        message: Dict[str, Any] = {"role": "assistant", "content": response["content"]}
+        if response["tool_calls"]:
+            message["tool_calls"] = _tool_calls(response)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if response["tool_calls"] else "stop"}],
+            "usage": _usage(messages, response),
+        })
+
+    def _stream(self, model: str, messages: List[Dict[str, Any]], response: Dict[str, Any], include_usage: bool):
+        latency = self.server.latency
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict[str, int]] = None):
+            chunk: Dict[str, Any] = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                chunk["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(latency.first_token)
+        event({"role": "assistant", "content": ""})
+        for i, piece in enumerate(content_chunks(response["content"], latency.chunk_chars)):
+            if i:
+                time.sleep(latency.per_chunk)
+            if piece:
+                event({"content": piece})
+        for i, call in enumerate(_tool_calls(response)):
+            event({"tool_calls": [{"index": i, **call}]})
+        event({}, "tool_calls" if response["tool_calls"] else "stop")
+        if include_usage:
+            event({}, usage=_usage(messages, response))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], script: ReplayScript, latency: Latency,
+                 model_name: str = "replay", verbose: bool = False):
+        super().__init__(address, ReplayHandler)
+        self.script = script
+        self.latency = latency
+        self.model_name = model_name
+        self.verbose = verbose
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve scripted chat completions on an OpenAI-compatible endpoint.")
+    parser.add_argument("--script", help="Replay script (JSON). Without one every request gets the default answer.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="none", choices=sorted(LATENCY_PROFILES),
+                        help="Latency profile, unless the script sets its own.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args(argv)
+
+    script = ReplayScript.from_file(args.script) if args.script else ReplayScript([])
+    server = ReplayServer((args.host, args.port), script, script.latency or LATENCY_PROFILES[args.latency],
+                          verbose=args.verbose)
+    print(f"Replay server on {server.url} ({len(script.responses)} scripted responses)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,13 @@
 import json
 import uuid
 import os
-from typing import List, Dict, Optional, Literal
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, NamedTuple, Optional, Literal
 from pathlib import Path
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+import src.tools.base as base
 
 # Define Task Data Models
 class Task(BaseModel):
@@ -21,79 +24,293 @@ class TaskList(BaseModel):
 # Storage
 TASK_FILE = Path(".sf/tasks.json")
 
+class _FileLock:
+    """
+    Exclusive advisory lock on `<tasks file>.lock`, so concurrent CLI instances
+    do not interleave read-modify-write cycles.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a+b")
+        if os.name == "nt":
+            import msvcrt
+            self._fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+class TaskStore:
+    """
+    In-memory index over the tasks file.
+
+    - tasks: id -> Task (insertion ordered), dependents: id -> ids that depend on it,
+      waiting: id -> number of its dependencies not done yet.
+    - The file is parsed only when its (mtime, size) changed, i.e. another process wrote it.
+    - Mutations run inside `transaction()`: file lock, reload if stale, apply, then an atomic
+      write-rename, so a crash never leaves a half-written file.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.tasks: Dict[str, Task] = {}
+        self.dependents: Dict[str, List[str]] = {}
+        self.waiting: Dict[str, int] = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _index(self, tasks: List[Task]):
+        self.tasks = {t.id: t for t in tasks}
+        self.dependents = {}
+        self.waiting = {}
+        for t in tasks:
+            self._link(t)
+
+    def _link(self, task: Task):
+        for dep_id in task.dependencies:
+            self.dependents.setdefault(dep_id, []).append(task.id)
+        dep_tasks = (self.tasks.get(d) for d in task.dependencies)
+        self.waiting[task.id] = sum(1 for d in dep_tasks if d is None or d.status != "done")
+
+    def refresh(self):
+        """Re-read the file if it changed since we last read or wrote it."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        tasks: List[Task] = []
+        if stamp is not None:
+            try:
+                tasks = TaskList.model_validate_json(self.path.read_bytes()).tasks
+            except Exception as e:
+                print(f"Error loading tasks: {e}")
+        self._index(tasks)
+        self._stamp = stamp
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        payload = {"tasks": [t.model_dump() for t in self.tasks.values()]}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._stamp = self._file_stamp()
+
+    @contextmanager
+    def transaction(self):
+        """Exclusive read-modify-write of the store (across threads and processes)."""
+        with self._lock, _FileLock(self.path.with_name(self.path.name + ".lock")):
+            self.refresh()
+            try:
+                yield self
+            except BaseException:
+                # Drop partial in-memory changes; the file is still the previous version
+                self._stamp = None
+                raise
+            self._write()
+
+    def snapshot(self) -> List[Task]:
+        """Current tasks, for read-only callers (no lock held while formatting)."""
+        with self._lock:
+            self.refresh()
+            return list(self.tasks.values())
+
+    # --- Mutations (call inside transaction()) ---
+
+    def add(self, task: Task):
+        invalid_deps = [d for d in task.dependencies if d not in self.tasks]
+        if invalid_deps:
+            raise ValueError(f"Dependency task IDs not found: {invalid_deps}")
+        if task.id in task.dependencies:
+            raise ValueError(f"Task {task.id} cannot depend on itself.")
+        self.tasks[task.id] = task
+        self._link(task)
+
+    def add_dependencies(self, task_id: str, dep_ids: List[str]):
+        """Make an existing task depend on more tasks, rejecting edges that would close a cycle."""
+        task = self.tasks[task_id]
+        invalid_deps = [d for d in dep_ids if d not in self.tasks]
+        if invalid_deps:
+            raise ValueError(f"Dependency task IDs not found: {invalid_deps}")
+        for dep_id in dep_ids:
+            if dep_id in task.dependencies:
+                continue
+            cycle = self.path_between(dep_id, task_id)
+            if cycle:
+                raise ValueError(f"Dependency would create a cycle: {' -> '.join([task_id] + cycle)}")
+            task.dependencies.append(dep_id)
+            self.dependents.setdefault(dep_id, []).append(task_id)
+            if self.tasks[dep_id].status != "done":
+                self.waiting[task_id] += 1
+                if task.status == "pending":
+                    task.status = "blocked"
+
+    def path_between(self, start_id: str, target_id: str) -> Optional[List[str]]:
+        """A dependency chain start -> ... -> target (following `dependencies`), if one exists."""
+        parents = {start_id: None}
+        stack = [start_id]
+        while stack:
+            current = stack.pop()
+            if current == target_id:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path[::-1]
+            for dep_id in self.tasks[current].dependencies if current in self.tasks else ():
+                if dep_id not in parents:
+                    parents[dep_id] = current
+                    stack.append(dep_id)
+        return None
+
+    def complete(self, task_id: str) -> List[str]:
+        """Mark a task done; returns the ids of tasks this unblocked. O(dependents)."""
+        task = self.tasks[task_id]
+        if task.status == "done":
+            return []
+        task.status = "done"
+        unblocked = []
+        for dependent_id in self.dependents.get(task_id, []):
+            self.waiting[dependent_id] -= 1
+            dependent = self.tasks[dependent_id]
+            if self.waiting[dependent_id] == 0 and dependent.status == "blocked":
+                dependent.status = "pending"
+                unblocked.append(dependent_id)
+        return unblocked
+
+# --- Dependency graph queries (over the tasks that are not done yet) ---
+
+class TaskPlan(NamedTuple):
+    ready: List[Task]            # runnable now: pending, every dependency done
+    waves: List[List[Task]]      # tasks that can run in parallel, wave by wave
+    critical_path: List[Task]    # longest dependency chain still to go
+    stuck: List[Task]            # in (or behind) a dependency cycle, or depending on a missing task
+
+def plan_tasks(tasks: List[Task]) -> TaskPlan:
+    """Topological levels (Kahn) and longest path over the remaining tasks, in O(tasks + dependencies)."""
+    by_id = {t.id: t for t in tasks}
+    remaining = {t.id: t for t in tasks if t.status != "done"}
+    indegree = {}
+    dependents: Dict[str, List[str]] = {}
+    for task_id, task in remaining.items():
+        open_deps = [d for d in task.dependencies if d not in by_id or by_id[d].status != "done"]
+        indegree[task_id] = len(open_deps)
+        for dep_id in open_deps:
+            dependents.setdefault(dep_id, []).append(task_id)
+
+    depth: Dict[str, int] = {}
+    previous: Dict[str, Optional[str]] = {}
+    waves: List[List[Task]] = []
+    level = [task_id for task_id, n in indegree.items() if n == 0]
+    for task_id in level:
+        depth[task_id], previous[task_id] = 1, None
+
+    while level:
+        waves.append([remaining[task_id] for task_id in level])
+        next_level = []
+        for task_id in level:
+            for dependent_id in dependents.get(task_id, []):
+                if depth[task_id] + 1 > depth.get(dependent_id, 0):
+                    depth[dependent_id], previous[dependent_id] = depth[task_id] + 1, task_id
+                indegree[dependent_id] -= 1
+                if indegree[dependent_id] == 0:
+                    next_level.append(dependent_id)
+        level = next_level
+
+    critical_path: List[Task] = []
+    if depth:
+        current = max(depth, key=depth.get)
+        while current is not None:
+            critical_path.append(remaining[current])
+            current = previous[current]
+        critical_path.reverse()
+
+    ready = [t for t in waves[0] if t.status == "pending"] if waves else []
+    stuck = [t for task_id, t in remaining.items() if indegree[task_id] > 0]
+    return TaskPlan(ready, waves, critical_path, stuck)
+
+_stores: Dict[Path, TaskStore] = {}
+
+def get_task_store() -> TaskStore:
+    path = TASK_FILE.resolve()
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = TaskStore(path)
+    return store
+
 def load_tasks() -> TaskList:
-    if not TASK_FILE.exists():
-        return TaskList()
-    try:
-        content = TASK_FILE.read_text(encoding="utf-8")
-        return TaskList.model_validate_json(content)
-    except Exception as e:
-        print(f"Error loading tasks: {e}")
-        return TaskList()
+    return TaskList(tasks=get_task_store().snapshot())
 
 def save_tasks(task_list: TaskList):
-    # Ensure directory exists
-    TASK_FILE.parent.mkdir(parents=True, exist_ok=True)
-    TASK_FILE.write_text(task_list.model_dump_json(indent=2), encoding="utf-8")
+    with get_task_store().transaction() as store:
+        store._index(list(task_list.tasks))
 
 # Core Logic
 def add_task_logic(title: str, dependencies: List[str] = None) -> Task:
-    task_list_obj = load_tasks()
     new_task = Task(title=title, dependencies=dependencies or [])
 
-    # Check if dependencies exist
-    existing_ids = {t.id for t in task_list_obj.tasks}
-    invalid_deps = [d for d in new_task.dependencies if d not in existing_ids]
-    if invalid_deps:
-        raise ValueError(f"Dependency task IDs not found: {invalid_deps}")
-
-    if new_task.dependencies:
-        # Check if deps are done
-        # For simplicity, default to blocked if has deps
-        new_task.status = "blocked"
-
-    task_list_obj.tasks.append(new_task)
-    save_tasks(task_list_obj)
+    with get_task_store().transaction() as store:
+        store.add(new_task)
+        if store.waiting[new_task.id]:
+            # Not runnable until all of its dependencies are done
+            new_task.status = "blocked"
     return new_task
 
 def complete_task_logic(task_id: str) -> str:
-    task_list_obj = load_tasks()
-    target_task = next((t for t in task_list_obj.tasks if t.id == task_id), None)
-
-    if not target_task:
-        return f"Error: Task {task_id} not found."
-
-    target_task.status = "done"
-
-    # Check if this unblocks other tasks
-    unblocked = []
-    for t in task_list_obj.tasks:
-        if t.status == "blocked" and task_id in t.dependencies:
-            # Check if ALL deps are now done
-            all_deps_done = True
-            for dep_id in t.dependencies:
-                dep_task = next((dt for dt in task_list_obj.tasks if dt.id == dep_id), None)
-                if not dep_task or dep_task.status != "done":
-                    all_deps_done = False
-                    break
-
-            if all_deps_done:
-                t.status = "pending"
-                unblocked.append(t.id)
+    with get_task_store().transaction() as store:
+        target_task = store.tasks.get(task_id)
+        if not target_task:
+            return f"Error: Task {task_id} not found."
+        unblocked = store.complete(task_id)
 
-    save_tasks(task_list_obj)
     msg = f"Task {task_id} ('{target_task.title}') marked as DONE."
     if unblocked:
         msg += f" Unblocked tasks: {unblocked}"
     return msg
 
+def add_dependencies_logic(task_id: str, dependencies: List[str]) -> str:
+    with get_task_store().transaction() as store:
+        task = store.tasks.get(task_id)
+        if not task:
+            return f"Error: Task {task_id} not found."
+        store.add_dependencies(task_id, dependencies)
+        status = task.status
+    return f"Task {task_id} now depends on {task.dependencies} ({status.upper()})."
+
 def list_all_tasks_logic() -> str:
-    task_list_obj = load_tasks()
-    if not task_list_obj.tasks:
+    tasks = get_task_store().snapshot()
+    if not tasks:
         return "No tasks found."
 
     output = []
-    for t in task_list_obj.tasks:
+    for t in tasks:
         deps = f" (depends on {t.dependencies})" if t.dependencies else ""
         icon = {
             "pending": "[ ]",
@@ -106,6 +323,29 @@ def list_all_tasks_logic() -> str:
 
     return "\n".join(output)
 
+def next_tasks_logic() -> str:
+    tasks = get_task_store().snapshot()
+    if not tasks:
+        return "No tasks found."
+    plan = plan_tasks(tasks)
+    if not plan.waves and not plan.stuck:
+        return "All tasks are done."
+
+    output = [f"Runnable now ({len(plan.ready)}):"]
+    output += [f"[ ] [{t.id}] {t.title}" for t in plan.ready] or ["(none)"]
+    in_progress = [t for t in plan.waves[0] if t.status == "in_progress"] if plan.waves else []
+    if in_progress:
+        output.append("In progress: " + ", ".join(f"[{t.id}] {t.title}" for t in in_progress))
+
+    output.append("")
+    output.append(f"Remaining plan: {sum(len(w) for w in plan.waves)} tasks in {len(plan.waves)} waves")
+    for i, wave in enumerate(plan.waves[1:], start=2):
+        output.append(f"  wave {i}: " + ", ".join(t.id for t in wave))
+    output.append("Critical path: " + " -> ".join(f"[{t.id}] {t.title}" for t in plan.critical_path))
+    if plan.stuck:
+        output.append("Blocked by a dependency cycle or missing task: " + ", ".join(t.id for t in plan.stuck))
+    return "\n".join(output)
+
 # --- Tool Definitions ---
 
 @tool
@@ -134,6 +374,21 @@ def task_complete(task_id: str) -> str:
     except Exception as e:
         return f"Error completing task: {e}"
 
+@tool
+def task_add_dependencies(task_id: str, dependencies: List[str]) -> str:
+    """
+    Make an existing task wait for other tasks (e.g. when planning reveals a new prerequisite).
+    Dependencies that would create a cycle are rejected.
+    Args:
+        task_id: The ID of the task that must wait.
+        dependencies: Task IDs that must be done first.
+    """
+    try:
+        return add_dependencies_logic(task_id, dependencies)
+    except Exception as e:
+        return f"Error adding dependencies: {e}"
+
+@base.tool_access(read_only=True)
 @tool
 def task_list() -> str:
     """
@@ -149,3 +404,16 @@ def task_list() -> str:
 add_task = add_task_logic
 complete_task = complete_task_logic
 list_all_tasks = list_all_tasks_logic
+
+@base.tool_access(read_only=True)
+@tool
+def task_next() -> str:
+    """
+    List all tasks that can be started now (every dependency done), plus the remaining
+    plan as parallel waves and its critical path. Runnable tasks are independent of each
+    other, so they can be worked on concurrently (e.g. several delegate_research calls).
+    """
+    try:
+        return next_tasks_logic()
+    except Exception as e:
+        return f"Error planning tasks: {e}"
@@ -0,0 +1,151 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+from src.tool_memo import ToolMemo
+from src.artifacts import FETCH_TOOL, ArtifactStore, spill
+import src.tools.base as base
+
+def _access(tool) -> Dict[str, Any]:
+    """
+    Read a tool's access declaration (see base.tool_access).
+    MCP tools carry the server's `readOnlyHint` annotation in their metadata.
+    """
+    metadata = getattr(tool, "metadata", None) or {}
+    return {
+        "read_only": bool(metadata.get("read_only") or metadata.get("readOnlyHint")),
+        "path_arg": metadata.get("path_arg"),
+    }
+
+# _path_key of a path that cannot be resolved (e.g. an embedded NUL byte): the call runs exclusively
+_UNRESOLVABLE = object()
+
+def _path_key(tool_call: Dict[str, Any], path_arg: Optional[str]):
+    """Normalize the path argument so 'a.py' and './a.py' serialize against each other."""
+    if not path_arg:
+        return None
+    value = (tool_call.get("args") or {}).get(path_arg)
+    if not isinstance(value, str):
+        return None
+    try:
+        return str((base.PROJECT_ROOT / value).resolve())
+    except (OSError, RuntimeError, ValueError):
+        return _UNRESOLVABLE
+
+async def _invoke(tool_call: Dict[str, Any], tool, memo: Optional[ToolMemo] = None,
+                  history: Optional[List[BaseMessage]] = None, artifacts: Optional[ArtifactStore] = None,
+                  spill_threshold: int = 0) -> ToolMessage:
+    # Stamped when the call actually runs, i.e. after any earlier write to the same path.
+    # Arguments the memo cannot key (odd types, bad paths) just run the tool unmemoized.
+    try:
+        memo_key = memo.key(tool_call, tool) if memo is not None and tool else None
+    except Exception:
+        memo_key = None
+    if memo_key is not None:
+        entry = memo.lookup(*memo_key)
+        if entry is not None:
+            return ToolMessage(
+                tool_call_id=tool_call["id"],
+                content=memo.answer(tool_call, *memo_key, entry, history),
+                name=tool_call["name"]
+            )
+
+    try:
+        if tool:
+            output = await tool.ainvoke(tool_call["args"])
+        else:
+            output = f"Error: Tool {tool_call['name']} not found."
+    except Exception as e:
+        output = f"Tool Execution Error: {str(e)}"
+
+    content, artifact = str(output), None
+    if artifacts is not None and tool_call["name"] != FETCH_TOOL:
+        # Large outputs live on disk; the conversation (and every later prompt) gets a preview + handle
+        content, artifact = await asyncio.to_thread(spill, content, artifacts, spill_threshold)
+
+    # The memo keeps what was delivered, so a repeat can refer to this exact message
+    if memo_key is not None:
+        memo.store(*memo_key, content, tool_call["id"])
+
+    return ToolMessage(
+        tool_call_id=tool_call["id"],
+        content=content,
+        name=tool_call["name"],
+        artifact=artifact
+    )
+
+def _overlaps(a: str, b: str) -> bool:
+    """Same path, or one is a directory containing the other."""
+    return a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+def _conflicts(read_only: bool, key, other_read_only: bool, other_key) -> bool:
+    """Whether two non-exclusive calls must keep their order: a writer and anything touching its path."""
+    if read_only and other_read_only:
+        return False
+    # A reader without a path (symbol index, retrieval, sub-agents, most MCP tools) may look anywhere
+    return key is None or other_key is None or _overlaps(key, other_key)
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]], tool_map: Dict[str, Any], max_concurrency: int = 4,
+                             memo: Optional[ToolMemo] = None, history: Optional[List[BaseMessage]] = None,
+                             artifacts: Optional[ArtifactStore] = None, spill_threshold: int = 0) -> List[ToolMessage]:
+    """
+    Execute all tool calls of one model turn, concurrently where it is safe.
+
+    Scheduling rules (in the order the model emitted the calls):
+    - Read-only tools run in parallel with each other.
+    - Tools declaring a `path_arg` that write are ordered against earlier calls on the same path,
+      a directory containing it or a file below it (a search of "." after a patch of a file
+      sees the patched content), and against earlier read-only tools without a path, which
+      may read anything. Writers on unrelated paths may overlap.
+    - Read-only tools without a path wait for every earlier writer.
+    - Undeclared tools (shell, task updates) are barriers: they wait for everything before
+      them, and everything after them waits for them. So is a call whose path argument
+      cannot be resolved.
+
+    With a `memo`, repeated memoizable calls on unchanged paths are answered from it; `history`
+    (the conversation so far) lets it refer to an earlier identical result instead of repeating it.
+    With an `artifacts` store, outputs longer than `spill_threshold` characters are stored there
+    and the message carries a preview and the artifact handle.
+
+    Returns:
+        One ToolMessage per call, in the same order as `tool_calls`.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(tool_call, tool, deps):
+        if deps:
+            await asyncio.gather(*deps)
+        async with semaphore:
+            return await _invoke(tool_call, tool, memo, history, artifacts, spill_threshold)
+
+    tasks: List[asyncio.Task] = []
+    barrier: Optional[asyncio.Task] = None
+    # Calls scheduled since the last barrier: (task, read_only, path key)
+    since_barrier: List[Tuple[asyncio.Task, bool, Optional[str]]] = []
+
+    for tool_call in tool_calls:
+        tool = tool_map.get(tool_call["name"])
+        access = _access(tool) if tool else {"read_only": True, "path_arg": None}
+        key = _path_key(tool_call, access["path_arg"])
+        read_only = access["read_only"]
+        exclusive = key is _UNRESOLVABLE or (not read_only and key is None)
+
+        if exclusive:
+            # Exclusive: wait for everything scheduled so far
+            deps = list(tasks)
+        else:
+            deps = [barrier] if barrier else []
+            deps += [task for task, other_read_only, other_key in since_barrier
+                     if _conflicts(read_only, key, other_read_only, other_key)]
+
+        task = asyncio.ensure_future(run(tool_call, tool, deps))
+        tasks.append(task)
+
+        if exclusive:
+            barrier = task
+            since_barrier = []
+        else:
+            since_barrier.append((task, read_only, key))
+
+    return list(await asyncio.gather(*tasks))
@@ -0,0 +1,147 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+from src.config import get_cached_settings
+from src.compression import history_fits
+import src.tools.base as base
+
+# The last messages are never truncated by compress_history, so a reference to them is always safe
+RECENT_MESSAGES = 5
+
+class _Memo(NamedTuple):
+    stamp: Tuple
+    content: str
+    tool_call_id: str        # the call whose message carries the full content
+    referenced: bool         # the last repeat was answered with a reference
+
+def _stamp(target: Path) -> Optional[Tuple]:
+    """(inode, mtime, size) of a file; for a directory, also of the .gitignore files that filter its listing."""
+    try:
+        st = target.stat()
+    except OSError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if target.is_dir():
+        for ignore in (target / ".gitignore", base.PROJECT_ROOT / ".gitignore"):
+            try:
+                ist = ignore.stat()
+                stamp += (ist.st_mtime_ns, ist.st_size)
+            except OSError:
+                stamp += (None,)
+    return stamp
+
+class ToolMemo:
+    """
+    Results of read-only tools declared with `memoize=True` (read_file, list_directory,
+    analyze_code_structure), keyed by tool name and normalized arguments and validated by the
+    stamp of the path they read. LRU bounded by bytes.
+
+    When the same result was already delivered in this conversation and that message is still
+    sent to the model unchanged, the repeat is answered with a short reference to it instead of
+    the full content, so the prompt does not carry the same file twice. A call repeated right
+    after a reference gets the full content (the model may genuinely have lost it).
+    """
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, references: bool = True):
+        self.max_bytes = max_bytes
+        self.references = references
+        self._entries: "OrderedDict[Tuple[str, str], _Memo]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "references": 0}
+
+    @staticmethod
+    def key(tool_call: Dict[str, Any], tool) -> Optional[Tuple[Tuple[str, str], Tuple]]:
+        """(memo key, stamp) of a call, or None if it cannot be memoized."""
+        metadata = getattr(tool, "metadata", None) or {}
+        path_arg = metadata.get("path_arg")
+        if not metadata.get("memoize") or not path_arg:
+            return None
+        args = dict(tool_call.get("args") or {})
+        path = args.get(path_arg, ".")
+        if not isinstance(path, str):
+            return None
+        try:
+            target = (base.PROJECT_ROOT / path).resolve()
+        except (OSError, RuntimeError, ValueError):
+            return None
+        if not base.is_safe_path(target):
+            return None
+        # A directory's stamp covers only its direct entries
+        try:
+            depth = int(args.get("depth") or 1)
+        except (TypeError, ValueError):
+            return None
+        if target.is_dir() and depth > 1:
+            return None
+        stamp = _stamp(target)
+        if stamp is None:
+            return None
+        args[path_arg] = str(target)
+        return (tool_call["name"], json.dumps(args, sort_keys=True, default=str)), stamp
+
+    def lookup(self, key: Tuple[str, str], stamp: Tuple) -> Optional[_Memo]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.stamp != stamp:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def store(self, key: Tuple[str, str], stamp: Tuple, content: str, tool_call_id: str, referenced: bool = False):
+        if content.startswith("Error") or len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.content)
+            self._entries[key] = _Memo(stamp, content, tool_call_id, referenced)
+            self._bytes += len(content)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.content)
+
+    def can_reference(self, entry: _Memo, history: Optional[List[BaseMessage]]) -> bool:
+        """The earlier message still holds this exact content and will reach the model intact."""
+        if not self.references or entry.referenced or not history:
+            return False
+        for position in range(len(history) - 1, -1, -1):
+            message = history[position]
+            if isinstance(message, ToolMessage) and message.tool_call_id == entry.tool_call_id:
+                if message.content != entry.content:
+                    return False
+                return position >= len(history) - RECENT_MESSAGES or history_fits(history)
+        return False
+
+    def answer(self, tool_call: Dict[str, Any], key: Tuple[str, str], stamp: Tuple, entry: _Memo,
+               history: Optional[List[BaseMessage]]) -> str:
+        """Content for a memo hit: a reference to the earlier call if possible, else the full result."""
+        if self.can_reference(entry, history):
+            self.stats["references"] += 1
+            self.store(key, stamp, entry.content, entry.tool_call_id, referenced=True)
+            return (f"[Unchanged since tool_call {entry.tool_call_id}: the result is identical to that earlier "
+                    f"{tool_call['name']} call, see its output above.]")
+        self.store(key, stamp, entry.content, tool_call["id"])
+        return entry.content
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+_memo: Optional[ToolMemo] = None
+
+def get_tool_memo() -> Optional[ToolMemo]:
+    """The session's tool memo, or None if disabled (SF_TOOL_MEMO_BYTES=0)."""
+    global _memo
+    if _memo is None:
+        settings = get_cached_settings()
+        if settings.tool_memo_bytes <= 0:
+            return None
+        _memo = ToolMemo(settings.tool_memo_bytes, settings.tool_memo_references)
+    return _memo
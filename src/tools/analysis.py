@@ -1,29 +1,85 @@
+from typing import Optional
 from langchain_core.tools import tool
-from tree_sitter import Language, Parser
-import tree_sitter_python
 import src.tools.base as base
-
-# Initialize Tree-sitter for Python
-try:
-    PY_LANGUAGE = Language(tree_sitter_python.language())
-    parser = Parser(PY_LANGUAGE)
-except Exception as e:
-    # Fallback or error if initialization fails
-    PY_LANGUAGE = None
-    parser = None
-    print(f"Warning: Failed to initialize tree-sitter: {e}")
-
+import src.tools.parse_cache as parse_cache
+from src.tools.grammars import Grammar, GrammarRegistry
+
+# Bump when the outline rendering changes, so persisted outlines are rebuilt
+OUTLINE_VERSION = 2
+
+def _function_signature(node, text):
+    """Name and parameter list of a function node, following C/C++ declarator chains."""
+    name_node = node.child_by_field_name("name")
+    params_node = node.child_by_field_name("parameters")
+    declarator = node.child_by_field_name("declarator")
+    while name_node is None and declarator is not None:
+        if declarator.child_by_field_name("parameters") is not None:
+            params_node = declarator.child_by_field_name("parameters")
+            name_node = declarator.child_by_field_name("declarator")
+            break
+        declarator = declarator.child_by_field_name("declarator")
+    if name_node is None:
+        return None
+    return text(name_node), text(params_node) if params_node else ""
+
+def _build_outline(source: bytes, tree, grammar: Grammar) -> str:
+    """Render the class/def skeleton of a parsed file (iterative walk, no Python recursion)."""
+    def text(node) -> str:
+        return source[node.start_byte:node.end_byte].decode("utf-8")
+
+    containers = grammar.spec.containers
+    functions = grammar.spec.functions
+
+    outline = []
+    stack = [(tree.root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        indent = "  " * depth
+
+        if node.type in containers:
+            keyword, name_field = containers[node.type]
+            name_node = node.child_by_field_name(name_field)
+            body_node = node.child_by_field_name("body")
+            # Forward declarations / variable types (e.g. `struct Foo x;`) have no body
+            if name_node and body_node:
+                outline.append(f"{indent}{keyword} {text(name_node)}:")
+
+                # Process body
+                stack.extend((child, depth + 1) for child in reversed(body_node.children))
+
+        elif node.type in functions:
+            signature = _function_signature(node, text)
+            if signature:
+                name, params = signature
+                outline.append(f"{indent}def {name}{params}: ...")
+
+        # Everything else (module, decorators, exports, templates, namespace bodies) is transparent
+        else:
+            stack.extend((child, depth) for child in reversed(node.children))
+
+    return "\n".join(outline) if outline else "(No classes or functions found)"
+
+def get_outline(target_path, grammar: Optional[Grammar] = None) -> Optional[str]:
+    """Cached outline of a file, or None if no grammar handles its extension."""
+    grammar = grammar or GrammarRegistry.for_path(target_path)
+    if grammar is None:
+        return None
+    return parse_cache.get_parse_cache().get_outline(
+        target_path, grammar,
+        lambda source, tree: _build_outline(source, tree, grammar),
+        kind=f"{grammar.name}-v{OUTLINE_VERSION}"
+    )
+
+@base.tool_access(read_only=True, path_arg="path", memoize=True)
 @tool
 def analyze_code_structure(path: str) -> str:
     """
-    Analyze the structure of a Python file using AST (Tree-sitter).
+    Analyze the structure of a source file using AST (Tree-sitter).
     Returns a skeletal outline (Classes, Methods, Functions) without implementation details.
+    Supports Python, C#, C/C++, TypeScript/JavaScript, Java, Go and Rust.
     Args:
         path: Relative path to the file to analyze.
     """
-    if not parser:
-        return "Error: Tree-sitter parser not initialized."
-
     target_path = (base.PROJECT_ROOT / path).resolve()
 
     if not base.is_safe_path(target_path):
@@ -35,50 +91,13 @@ def analyze_code_structure(path: str) -> str:
     if not target_path.is_file():
         return f"Error: Not a file: {path}"
 
-    try:
-        content = target_path.read_text(encoding="utf-8")
-        tree = parser.parse(bytes(content, "utf8"))
-
-        # Traverse and build outline
-        cursor = tree.walk()
-
-        outline = []
-
-        def traverse(node, depth=0):
-            indent = "  " * depth
-
-            if node.type == "class_definition":
-                name_node = node.child_by_field_name("name")
-                if name_node:
-                    name = content[name_node.start_byte:name_node.end_byte]
-                    outline.append(f"{indent}class {name}:")
-
-                    # Process body
-                    body_node = node.child_by_field_name("body")
-                    if body_node:
-                        for child in body_node.children:
-                            traverse(child, depth + 1)
-
-            elif node.type == "function_definition":
-                name_node = node.child_by_field_name("name")
-                params_node = node.child_by_field_name("parameters")
-
-                if name_node:
-                    name = content[name_node.start_byte:name_node.end_byte]
-                    params = ""
-                    if params_node:
-                        params = content[params_node.start_byte:params_node.end_byte]
-
-                    outline.append(f"{indent}def {name}{params}: ...")
-
-            # For module level functions/classes, we need to iterate children if it's the module
-            elif node.type == "module":
-                for child in node.children:
-                    traverse(child, depth)
-
-        traverse(tree.root_node)
-
-        return "\n".join(outline) if outline else "(No classes or functions found)"
+    grammar = GrammarRegistry.for_path(target_path)
+    if grammar is None:
+        return f"Error: Unsupported file type for structure analysis: {target_path.suffix or target_path.name}"
 
+    try:
+        return get_outline(target_path, grammar)
+    except UnicodeDecodeError:
+        return "Error: File appears to be binary or not UTF-8 encoded."
     except Exception as e:
         return f"Error analyzing code: {str(e)}"
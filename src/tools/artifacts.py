@@ -0,0 +1,68 @@
+from typing import Optional
+from langchain_core.tools import tool
+from src.artifacts import FETCH_TOOL, get_artifact_store
+from src.config import get_cached_settings
+import src.tools.base as base
+
+@base.tool_access(read_only=True)
+@tool(FETCH_TOOL)
+def fetch_artifact(handle: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+                   offset: Optional[int] = None, length: Optional[int] = None) -> str:
+    """
+    Read a large tool output that was stored as an artifact (its handle, like "art_1a2b...",
+    is given at the end of the shortened output). Read it by lines, or by characters with
+    offset/length (for very long lines, e.g. minified JSON or one-line logs).
+    Args:
+        handle: The artifact handle.
+        start_line: First line to read (1-based). Defaults to 1.
+        end_line: Last line to read (inclusive). Defaults to as many lines as fit in one result.
+        offset: First character to read (0-based). Use instead of start_line/end_line.
+        length: Number of characters to read from offset. Defaults to as many as fit in one result.
+    """
+    store = get_artifact_store()
+    text = store.get(handle.strip()) if store is not None else None
+    if text is None:
+        return f"Error: Artifact not found: {handle}"
+
+    # Stay below the spill threshold, so a fetched part is never turned into an artifact again
+    budget = max(1024, get_cached_settings().artifact_threshold - 256)
+
+    if offset is not None or length is not None:
+        if start_line is not None or end_line is not None:
+            return "Error: Use either start_line/end_line or offset/length, not both."
+        first = max(0, offset or 0)
+        if first >= len(text):
+            return f"Error: offset {first} is beyond the end of the artifact ({len(text)} characters)."
+        wanted = len(text) - first if length is None else max(0, length)
+        end = min(len(text), first + min(wanted, budget))
+        note = f" (truncated; continue with offset={end})" if end < min(len(text), first + wanted) else ""
+        return f"[Characters {first}-{end} of {len(text)} in artifact {handle.strip()}{note}]\n" + text[first:end]
+
+    lines = text.split("\n")
+    count = len(lines)
+    first = max(1, start_line or 1)
+    last = min(count, end_line or count)
+    if first > count:
+        return f"Error: start_line {first} is beyond the end of the artifact ({count} lines)."
+    if last < first:
+        return f"Error: end_line {last} is before start_line {first}."
+
+    line_offset = sum(len(line) + 1 for line in lines[:first - 1])
+    parts, size, note = [], 0, ""
+    for number in range(first, last + 1):
+        line = lines[number - 1]
+        if parts and size + len(line) + 1 > budget:
+            note = f" (truncated; continue with start_line={number})"
+            last = number - 1
+            break
+        if len(line) > budget:
+            # A single huge line: show its start, the rest is read by characters
+            note = f" (line {number} cut at {budget} characters; continue with offset={line_offset + budget})"
+            parts.append(line[:budget])
+            last = number
+            break
+        parts.append(line)
+        size += len(line) + 1
+        line_offset += len(line) + 1
+
+    return f"[Lines {first}-{last} of {count} in artifact {handle.strip()}{note}]\n" + "\n".join(parts)
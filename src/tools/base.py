@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 # Use project root as the base for all operations
 PROJECT_ROOT = Path.cwd().resolve()
@@ -12,3 +13,26 @@ def is_safe_path(path: Path) -> bool:
         return resolved_path.is_relative_to(PROJECT_ROOT)
     except (ValueError, RuntimeError):
         return False
+
+def tool_access(read_only: bool = False, path_arg: Optional[str] = None, memoize: bool = False):
+    """
+    Declare how a tool touches the workspace, for the concurrent tool executor.
+    Usage (stacked above @tool):
+
+        @base.tool_access(read_only=True, path_arg="path")
+        @tool
+        def read_file(path: str) -> str: ...
+
+    Args:
+        read_only: The tool never modifies anything, so it may run in parallel with other calls.
+        path_arg: Name of the argument holding the file/directory the tool operates on.
+                  Writers are serialized against calls on the same path, a directory containing it or
+                  a file below it; writers on unrelated paths may overlap.
+        memoize: The result depends only on the arguments and the content of `path_arg`, so repeated
+                 calls can be answered from the tool memo while that path is unchanged (see src/tool_memo.py).
+    Tools without a declaration are treated as exclusive (run alone, in order).
+    """
+    def decorator(t):
+        t.metadata = {**(t.metadata or {}), "read_only": read_only, "path_arg": path_arg, "memoize": memoize}
+        return t
+    return decorator
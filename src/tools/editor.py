@@ -1,13 +1,23 @@
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 import src.tools.base as base
+import src.tools.parse_cache as parse_cache
+from src.tools.matching import BlockMatcher, MatchError
 
+@base.tool_access(path_arg="path")
 @tool
 def apply_diff_patch(path: str, search_block: str, replace_block: str) -> str:
     """
     Apply a diff patch to a file by searching for a block of text and replacing it.
     Args:
         path: Relative path to the file to modify.
-        search_block: The exact block of text to search for.
+        search_block: The block of text to search for. Should match exactly; differences in
+                      indentation or whitespace are tolerated if the block is still unambiguous.
         replace_block: The text to replace the search block with.
     """
     target_path = (base.PROJECT_ROOT / path).resolve()
@@ -24,22 +34,306 @@ def apply_diff_patch(path: str, search_block: str, replace_block: str) -> str:
     try:
         content = target_path.read_text(encoding="utf-8")
 
-        # Check for existence
-        count = content.count(search_block)
-
-        if count == 0:
-            return "Error: Search block not found in file. Please ensure exact match (including whitespace)."
-
-        if count > 1:
-            return f"Error: Ambiguous match. Search block found {count} times. Please provide more context to uniquely identify the block."
+        # Exact match first; otherwise whitespace-insensitive or a clear near match
+        matcher = BlockMatcher(content)
+        try:
+            match = matcher.find(search_block, replace_block)
+        except MatchError as e:
+            return f"Error: {e}"
 
         # Perform replacement
-        new_content = content.replace(search_block, replace_block)
+        new_content = content[:match.start] + match.replacement + content[match.end:]
         target_path.write_text(new_content, encoding="utf-8")
 
+        # Keep a cached parse tree in sync (incremental re-parse instead of a full one later)
+        start_byte = len(content[:match.start].encode("utf-8"))
+        parse_cache.get_parse_cache().note_edit(
+            target_path,
+            content.encode("utf-8"),
+            start_byte,
+            start_byte + len(content[match.start:match.end].encode("utf-8")),
+            new_content.encode("utf-8"),
+        )
+
+        if match.note:
+            return f"Success: Patch applied successfully ({match.note} at line {matcher.line_of(match.start)})."
         return "Success: Patch applied successfully."
 
     except UnicodeDecodeError:
         return "Error: File appears to be binary or not UTF-8 encoded."
     except Exception as e:
         return f"Error applying patch: {str(e)}"
+
+# --- Batched edits ---
+
+class EditHunk(BaseModel):
+    """One search/replace edit for apply_edits."""
+    path: str = Field(description="Relative path to the file to modify.")
+    search_block: str = Field(description="The exact block of text to replace. Empty to create a new file.")
+    replace_block: str = Field(description="The text to replace the search block with.")
+
+class _Hunk(NamedTuple):
+    path: str
+    search: str
+    replace: str
+    hint_line: Optional[int]    # where a unified diff says the hunk starts (1-based), to pick among repeats
+
+class HunkError(Exception):
+    """A hunk that cannot be applied; the message is shown to the model."""
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+def _diff_path(header: str) -> Optional[str]:
+    path = header[4:].rstrip("\r\n").split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return None
+    # Git's a/ and b/ prefixes, unless the project really has such a directory
+    if path[:2] in ("a/", "b/") and not (base.PROJECT_ROOT / path).exists():
+        path = path[2:]
+    return path
+
+def parse_unified_diff(diff: str) -> List[_Hunk]:
+    """
+    Split a unified diff into search/replace hunks: the search block is the context plus
+    removed lines, the replace block the context plus added lines. Hunk line counts are not
+    trusted (models often get them wrong); a hunk ends at the next header.
+    """
+    hunks: List[_Hunk] = []
+    old_path = new_path = None
+    search: List[str] = []
+    replace: List[str] = []
+    hint: Optional[int] = None
+    in_hunk = False
+
+    def flush():
+        if in_hunk:
+            if new_path is None:
+                raise HunkError(f"Deleting files is not supported ({old_path}); use run_shell_command.")
+            hunks.append(_Hunk(new_path, "".join(search), "".join(replace), hint if old_path else None))
+
+    lines = diff.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            flush()
+            in_hunk = False
+            old_path = _diff_path(line)
+        elif line.startswith("+++ ") and not in_hunk:
+            new_path = _diff_path(line)
+        elif line.startswith("@@"):
+            flush()
+            match = _HUNK_HEADER.match(line)
+            if not match:
+                raise HunkError(f"Malformed hunk header: {line.strip()}")
+            if new_path is None and old_path is None:
+                raise HunkError("Hunk without a preceding ---/+++ file header.")
+            search, replace, in_hunk = [], [], True
+            start, count = int(match.group(1)), match.group(2)
+            # "-l,0" inserts after line l
+            hint = start + 1 if count == "0" else max(1, start)
+        elif in_hunk:
+            if line.startswith("\\"):
+                # "\ No newline at end of file" applies to the line before it
+                previous = lines[i - 1][:1]
+                if previous in (" ", "-") and search:
+                    search[-1] = search[-1].rstrip("\r\n")
+                if previous in (" ", "+") and replace:
+                    replace[-1] = replace[-1].rstrip("\r\n")
+            elif line.startswith("-"):
+                search.append(line[1:])
+            elif line.startswith("+"):
+                replace.append(line[1:])
+            elif line.startswith(" ") or line in ("\n", "\r\n"):
+                # Editors often strip the single space of blank context lines
+                search.append(line[1:] if line.startswith(" ") else line)
+                replace.append(line[1:] if line.startswith(" ") else line)
+            elif line.startswith("diff ") or line.startswith("index "):
+                flush()
+                in_hunk = False
+    flush()
+    if not hunks:
+        raise HunkError("No hunks found in diff.")
+    return hunks
+
+class _FileEdit:
+    """One file's original content and the hunks to apply to it."""
+    def __init__(self, path: str, target: Path):
+        self.path = path
+        self.target = target
+        self.exists = target.exists()
+        self.content = ""
+        self.newline = "\n"
+        self.hunks: List[Tuple[int, _Hunk]] = []
+        self.new_content: Optional[str] = None
+        self.span: Optional[Tuple[int, int]] = None    # byte range of the original that changed
+
+    def load(self):
+        if self.exists:
+            if not self.target.is_file():
+                raise HunkError(f"Not a file: {self.path}")
+            # newline="" keeps CRLF files as they are
+            with open(self.target, encoding="utf-8", newline="") as f:
+                self.content = f.read()
+            if "\r\n" in self.content:
+                self.newline = "\r\n"
+
+def _count_lines(text: str) -> int:
+    return text.count("\n") + (bool(text) and not text.endswith("\n"))
+
+def _plan_file(edit: _FileEdit, results: Dict[int, str]):
+    """Locate every hunk of a file in its original content and build the new content in one pass."""
+    if not edit.exists:
+        # Only a single hunk with an empty search block may create a file
+        number, hunk = edit.hunks[0]
+        if hunk.search or len(edit.hunks) > 1:
+            for number, _ in edit.hunks:
+                results[number] = f"FAILED: File not found: {edit.path}"
+            return
+        edit.new_content = hunk.replace
+        results[number] = f"created ({_count_lines(hunk.replace)} lines)"
+        return
+
+    content, matcher = edit.content, BlockMatcher(edit.content)
+    spans = []
+    for number, hunk in edit.hunks:
+        search, replace = hunk.search, hunk.replace
+        if edit.newline == "\r\n" and "\r\n" not in search:
+            search, replace = search.replace("\n", "\r\n"), replace.replace("\n", "\r\n")
+        try:
+            if search:
+                start, end, replace, note = matcher.find(search, replace, hunk.hint_line)
+            elif hunk.hint_line is not None:
+                # Pure insertion from a diff without context
+                starts = matcher.line_starts
+                start = end = starts[hunk.hint_line - 1] if hunk.hint_line <= len(starts) else len(content)
+                note = ""
+            else:
+                raise HunkError("Empty search block; the file already exists.")
+        except (HunkError, MatchError) as e:
+            results[number] = f"FAILED: {e}"
+            continue
+        spans.append((start, end, number, replace, note))
+
+    spans.sort()
+    pieces, cursor, previous = [], 0, None
+    for start, end, number, replace, note in spans:
+        line = matcher.line_of(start)
+        if start < cursor:
+            results[number] = f"FAILED: Overlaps hunk {previous} (line {line}); merge them into one hunk."
+            continue
+        pieces += [content[cursor:start], replace]
+        cursor, previous = end, number
+        results[number] = f"applied at line {line} (-{_count_lines(content[start:end])} +{_count_lines(replace)} lines)"
+        if note:
+            results[number] += f" [{note}]"
+    pieces.append(content[cursor:])
+
+    if spans:
+        edit.new_content = "".join(pieces)
+        first, last = spans[0][0], max(span[1] for span in spans)
+        edit.span = (len(content[:first].encode("utf-8")), len(content[:last].encode("utf-8")))
+
+def _write_atomically(edits: List[_FileEdit]):
+    """
+    Write every file to a temp file next to it, then rename them all into place.
+    A failure before the renames leaves every file untouched; a failure during them
+    restores the files already replaced.
+    """
+    staged = []
+    try:
+        for edit in edits:
+            edit.target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = edit.target.with_name(f".{edit.target.name}.{os.getpid()}.sf-tmp")
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.write(edit.new_content)
+            if edit.exists:
+                shutil.copymode(edit.target, tmp)
+            staged.append((edit, tmp))
+    except BaseException:
+        for _, tmp in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    done = []
+    try:
+        for edit, tmp in staged:
+            os.replace(tmp, edit.target)
+            done.append(edit)
+    except BaseException:
+        for edit in done:
+            if edit.exists:
+                with open(edit.target, "w", encoding="utf-8", newline="") as f:
+                    f.write(edit.content)
+            else:
+                edit.target.unlink(missing_ok=True)
+        for _, tmp in staged[len(done):]:
+            tmp.unlink(missing_ok=True)
+        raise
+
+# Writes several files, so it runs exclusively (no path declaration for the tool executor)
+@tool
+def apply_edits(hunks: Optional[List[EditHunk]] = None, diff: Optional[str] = None) -> str:
+    """
+    Apply many edits, in one or more files, in a single call. Prefer this over repeated
+    apply_diff_patch calls. All hunks are checked first; if any hunk fails, no file is changed.
+    Hunks of the same file refer to its original content and must not overlap.
+    Args:
+        hunks: Search/replace edits: [{"path": ..., "search_block": ..., "replace_block": ...}].
+               An empty search_block creates a new file.
+        diff: A unified diff (as produced by `git diff` / `diff -u`), alternatively or in addition.
+    Returns:
+        The result of every hunk, and whether the changes were written.
+    """
+    try:
+        parsed: List[_Hunk] = []
+        for h in hunks or []:
+            h = h if isinstance(h, EditHunk) else EditHunk.model_validate(h)
+            parsed.append(_Hunk(h.path, h.search_block, h.replace_block, None))
+        if diff:
+            parsed += parse_unified_diff(diff)
+    except HunkError as e:
+        return f"Error: {e}"
+    if not parsed:
+        return "Error: No edits given. Pass hunks and/or a unified diff."
+
+    # Group by file, keeping the order in which files were first mentioned
+    files: Dict[Path, _FileEdit] = {}
+    results: Dict[int, str] = {}
+    for number, hunk in enumerate(parsed, start=1):
+        target = (base.PROJECT_ROOT / hunk.path).resolve()
+        if not base.is_safe_path(target):
+            results[number] = f"FAILED: Access denied. Path must be within project root: {base.PROJECT_ROOT}"
+            continue
+        if target not in files:
+            files[target] = _FileEdit(hunk.path, target)
+        files[target].hunks.append((number, hunk))
+
+    for edit in files.values():
+        try:
+            edit.load()
+        except (HunkError, UnicodeDecodeError, OSError) as e:
+            reason = "File appears to be binary or not UTF-8 encoded." if isinstance(e, UnicodeDecodeError) else str(e)
+            for number, _ in edit.hunks:
+                results[number] = f"FAILED: {reason}"
+            continue
+        _plan_file(edit, results)
+
+    report = [f"[{n}] {parsed[n - 1].path}: {results[n]}" for n in sorted(results)]
+    failed = sum(1 for r in results.values() if r.startswith("FAILED"))
+    if failed:
+        return f"Error: No changes written; {failed} of {len(parsed)} hunks failed.\n" + "\n".join(report)
+
+    changed = [e for e in files.values() if not e.exists or e.new_content != e.content]
+    try:
+        _write_atomically(changed)
+    except Exception as e:
+        return f"Error applying edits: {str(e)}. No changes written."
+
+    cache = parse_cache.get_parse_cache()
+    for edit in changed:
+        if edit.span is not None:
+            old_source = edit.content.encode("utf-8")
+            new_source = edit.new_content.encode("utf-8")
+            start, old_end = edit.span
+            cache.note_edit(edit.target, old_source, start, old_end, new_source)
+
+    return f"Success: Applied {len(parsed)} hunks to {len(changed)} files.\n" + "\n".join(report)
@@ -1,15 +1,31 @@
+import bisect
+import mmap
 import os
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from langchain_core.tools import tool
+from src.config import get_cached_settings
 import src.tools.base as base
+from src.tools.analysis import get_outline
+from src.tools.walker import LISTING_PRUNED, walk
 
+# Recursive listings stop here; narrow the path or depth to see more
+MAX_LIST_ENTRIES = 1000
+
+@base.tool_access(read_only=True, path_arg="path", memoize=True)
 @tool
-def list_directory(path: str = ".") -> str:
+def list_directory(path: str = ".", depth: int = 1) -> str:
     """
-    List files in a directory. respects .gitignore (simplified implementation).
+    List files in a directory. Respects .gitignore.
     Args:
         path: Relative path to the directory to list. Defaults to current directory.
+        depth: How many levels to descend (1 = only this directory). Dependency, cache and build
+               directories (node_modules, __pycache__, .venv, bin, obj, ...) are shown and marked,
+               but not descended into; list them directly to see their content.
     """
     target_path = (base.PROJECT_ROOT / path).resolve()
 
@@ -23,26 +39,147 @@ def list_directory(path: str = ".") -> str:
         return f"Error: Not a directory: {path}"
 
     try:
-        # Simple listing, ignoring hidden files starting with .git (except .gitignore)
-        entries = []
-        for entry in target_path.iterdir():
-            # Skip .git directory
-            if entry.name == ".git":
-                continue
+        start = target_path.relative_to(base.PROJECT_ROOT).as_posix()
+        depth = max(1, depth)
+        found = walk(base.PROJECT_ROOT, start, max_depth=depth, pruned=LISTING_PRUNED)
+        prefix_len = len(start) + 1 if start != "." else 0
 
-            prefix = "[DIR] " if entry.is_dir() else "[FILE]"
-            entries.append(f"{prefix} {entry.name}")
+        entries = []
+        for entry in found:
+            prefix = "[DIR] " if entry.is_dir else "[FILE]"
+            note = ""
+            if entry.is_dir and entry.depth < depth and entry.path.rsplit("/", 1)[-1] in LISTING_PRUNED:
+                note = " (not expanded; list it directly)"
+            entries.append(f"{prefix} {entry.path[prefix_len:]}{note}")
+        entries.sort()
 
-        return "\n".join(sorted(entries))
+        if len(entries) > MAX_LIST_ENTRIES:
+            omitted = len(entries) - MAX_LIST_ENTRIES
+            entries = entries[:MAX_LIST_ENTRIES] + [f"... ({omitted} more entries; use a narrower path or smaller depth)"]
+        return "\n".join(entries)
     except Exception as e:
         return f"Error listing directory: {str(e)}"
 
+class LineIndex:
+    """
+    Byte offset of every line start in a file, so reading a line range is a single slice
+    instead of a scan. offsets[i] is where line i+1 starts; the last entry is the file size.
+    """
+    def __init__(self, data):
+        offsets = array("Q", [0])
+        pos = data.find(b"\n")
+        while pos != -1:
+            offsets.append(pos + 1)
+            pos = data.find(b"\n", pos + 1)
+        if offsets[-1] != len(data):
+            offsets.append(len(data))
+        self.offsets = offsets
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def span(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """Byte range of lines start_line..end_line (1-based, inclusive)."""
+        return self.offsets[start_line - 1], self.offsets[end_line]
+
+    def line_at(self, byte_offset: int) -> int:
+        """The (1-based) line containing a byte offset."""
+        return bisect.bisect_right(self.offsets, byte_offset)
+
+# Line indexes of recently read files, keyed by path and validated by (mtime, size)
+_line_indexes: "OrderedDict[str, Tuple[Tuple[int, int], LineIndex]]" = OrderedDict()
+_line_indexes_lock = threading.Lock()
+MAX_LINE_INDEXES = 32
+
+# Lines shown from each end of a file that is too large to return whole
+PREVIEW_LINES = 40
+
+def _get_line_index(target_path: Path, stamp: Tuple[int, int], data) -> LineIndex:
+    key = str(target_path)
+    with _line_indexes_lock:
+        cached = _line_indexes.get(key)
+        if cached is not None and cached[0] == stamp:
+            _line_indexes.move_to_end(key)
+            return cached[1]
+
+    index = LineIndex(data)
+    with _line_indexes_lock:
+        _line_indexes[key] = (stamp, index)
+        _line_indexes.move_to_end(key)
+        while len(_line_indexes) > MAX_LINE_INDEXES:
+            _line_indexes.popitem(last=False)
+    return index
+
+@contextmanager
+def _open_data(target_path: Path, size: int, max_bytes: int):
+    """File contents as bytes, or memory-mapped when it is too large to load for a partial read."""
+    if size == 0:
+        yield b""
+    elif size <= max_bytes:
+        yield target_path.read_bytes()
+    else:
+        with open(target_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def _char_boundary(data, pos: int) -> int:
+    """Move a byte offset back to the start of the UTF-8 character it falls in."""
+    floor = max(0, pos - 3)
+    while pos > floor and pos < len(data) and data[pos] & 0xC0 == 0x80:
+        pos -= 1
+    return pos
+
+def _clip(text: bytes, limit: int) -> str:
+    end = _char_boundary(text, limit)
+    clipped = text[:end].decode("utf-8", errors="replace")
+    if len(text) > end:
+        clipped += f"\n... [{len(text) - end} more bytes]"
+    return clipped
+
+def _too_large_summary(path: str, target_path: Path, data, index: LineIndex, max_bytes: int) -> str:
+    """Outline, head and tail of a file instead of its full content."""
+    count = index.line_count
+    parts = [
+        f"[File too large to return whole: {path} is {len(data)} bytes, {count} lines (limit {max_bytes} bytes).",
+        "Read a part with start_line/end_line, or offset/length.]",
+    ]
+
+    try:
+        outline = get_outline(target_path)
+    except Exception:
+        outline = None
+    if outline:
+        parts += ["", "Outline:", _clip(outline.encode("utf-8"), max_bytes // 4)]
+
+    head_end = min(count, PREVIEW_LINES)
+    start, end = index.span(1, head_end)
+    parts += ["", f"Lines 1-{head_end}:", _clip(data[start:end], max_bytes // 4)]
+
+    tail_start = max(head_end + 1, count - PREVIEW_LINES + 1)
+    if tail_start <= count:
+        start, end = index.span(tail_start, count)
+        parts += ["", f"Lines {tail_start}-{count}:", _clip(data[start:end], max_bytes // 4)]
+    return "\n".join(parts)
+
+@base.tool_access(read_only=True, path_arg="path", memoize=True)
 @tool
-def read_file(path: str) -> str:
+def read_file(
+    path: str,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+) -> str:
     """
-    Read the content of a file.
+    Read the content of a file, or a part of it.
+    Files above the size limit are not returned whole: you get their outline, first and last
+    lines and total line count, and can then read the part you need.
     Args:
         path: Relative path to the file to read.
+        start_line: First line to read (1-based). Use with end_line to read a line range.
+        end_line: Last line to read (inclusive). Defaults to the end of the file.
+        offset: Byte offset to start reading at (for files without useful line structure).
+        length: Number of bytes to read from offset.
     """
     target_path = (base.PROJECT_ROOT / path).resolve()
 
@@ -56,9 +193,50 @@ def read_file(path: str) -> str:
         return f"Error: Not a file: {path}"
 
     try:
-        # Limit file size reading? Maybe for safety, but instruction doesn't specify.
-        # Assuming text files.
-        return target_path.read_text(encoding="utf-8")
+        max_bytes = get_cached_settings().read_max_bytes
+        st = target_path.stat()
+        size = st.st_size
+        stamp = (st.st_mtime_ns, size)
+
+        if start_line is None and end_line is None and offset is None and length is None and size <= max_bytes:
+            return target_path.read_text(encoding="utf-8")
+
+        with _open_data(target_path, size, max_bytes) as data:
+            if offset is not None or length is not None:
+                start = max(0, offset or 0)
+                end = min(size, start + min(length or max_bytes, max_bytes))
+                if start >= size and size:
+                    return f"Error: offset {start} is beyond the end of the file ({size} bytes)."
+                header = f"[Bytes {start}-{end} of {size} in {path}]"
+                return header + "\n" + data[start:end].decode("utf-8", errors="replace")
+
+            if start_line is None and end_line is None:
+                return _too_large_summary(path, target_path, data, _get_line_index(target_path, stamp, data), max_bytes)
+
+            index = _get_line_index(target_path, stamp, data)
+            count = index.line_count
+            first = max(1, start_line or 1)
+            last = min(count, end_line or count)
+            if first > count:
+                return f"Error: start_line {first} is beyond the end of the file ({count} lines)."
+            if last < first:
+                return f"Error: end_line {last} is before start_line {first}."
+
+            start, end = index.span(first, last)
+            note = ""
+            if end - start > max_bytes:
+                # Stop at the last whole line that fits, and say where to continue
+                last = max(first, index.line_at(start + max_bytes) - 1)
+                start, end = index.span(first, last)
+                if end - start > max_bytes:
+                    # A single huge line: cut it at a character boundary, the rest is read by bytes
+                    end = _char_boundary(data, start + max_bytes)
+                    note = f" (line {first} cut at {end - start} bytes; continue with offset={end})"
+                else:
+                    note = f" (truncated at {max_bytes} bytes; continue with start_line={last + 1})"
+
+            header = f"[Lines {first}-{last} of {count} in {path}{note}]"
+            return header + "\n" + data[start:end].decode("utf-8")
     except UnicodeDecodeError:
         return "Error: File appears to be binary or not UTF-8 encoded."
     except Exception as e:
@@ -0,0 +1,155 @@
+import ctypes
+import importlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+from tree_sitter import Language, Parser
+
+class GrammarSpec(NamedTuple):
+    """
+    How to load a tree-sitter grammar and which of its nodes make up an outline.
+    containers: node type -> (keyword, name field); their body is outlined one level deeper.
+    functions: node types rendered as `def name(params): ...` (bodies are never entered).
+    """
+    name: str
+    extensions: Tuple[str, ...]
+    module: str
+    factory: str = "language"
+    containers: Dict[str, Tuple[str, str]] = {}
+    functions: Tuple[str, ...] = ()
+
+_TS_CONTAINERS = {
+    "class_declaration": ("class", "name"),
+    "abstract_class_declaration": ("class", "name"),
+    "interface_declaration": ("interface", "name"),
+    "enum_declaration": ("enum", "name"),
+    "internal_module": ("namespace", "name"),
+}
+_TS_FUNCTIONS = ("function_declaration", "generator_function_declaration", "method_definition", "method_signature", "abstract_method_signature")
+
+_CPP_CONTAINERS = {
+    "class_specifier": ("class", "name"),
+    "struct_specifier": ("struct", "name"),
+    "namespace_definition": ("namespace", "name"),
+}
+
+SPECS = [
+    GrammarSpec("python", (".py", ".pyi"), "tree_sitter_python",
+                containers={"class_definition": ("class", "name")},
+                functions=("function_definition",)),
+    GrammarSpec("c_sharp", (".cs",), "tree_sitter_c_sharp",
+                containers={
+                    "namespace_declaration": ("namespace", "name"),
+                    "class_declaration": ("class", "name"),
+                    "interface_declaration": ("interface", "name"),
+                    "struct_declaration": ("struct", "name"),
+                    "record_declaration": ("record", "name"),
+                    "enum_declaration": ("enum", "name"),
+                },
+                functions=("method_declaration", "constructor_declaration")),
+    GrammarSpec("cpp", (".cpp", ".cc", ".cxx", ".hpp", ".hh", ".hxx", ".h"), "tree_sitter_cpp",
+                containers=_CPP_CONTAINERS, functions=("function_definition",)),
+    GrammarSpec("c", (".c",), "tree_sitter_c",
+                containers={"struct_specifier": ("struct", "name")}, functions=("function_definition",)),
+    GrammarSpec("typescript", (".ts", ".mts", ".cts"), "tree_sitter_typescript", "language_typescript",
+                containers=_TS_CONTAINERS, functions=_TS_FUNCTIONS),
+    GrammarSpec("tsx", (".tsx",), "tree_sitter_typescript", "language_tsx",
+                containers=_TS_CONTAINERS, functions=_TS_FUNCTIONS),
+    GrammarSpec("javascript", (".js", ".jsx", ".mjs", ".cjs"), "tree_sitter_javascript",
+                containers={"class_declaration": ("class", "name")}, functions=_TS_FUNCTIONS),
+    GrammarSpec("java", (".java",), "tree_sitter_java",
+                containers={
+                    "class_declaration": ("class", "name"),
+                    "interface_declaration": ("interface", "name"),
+                    "enum_declaration": ("enum", "name"),
+                },
+                functions=("method_declaration", "constructor_declaration")),
+    GrammarSpec("go", (".go",), "tree_sitter_go",
+                functions=("function_declaration", "method_declaration")),
+    GrammarSpec("rust", (".rs",), "tree_sitter_rust",
+                containers={
+                    "mod_item": ("mod", "name"),
+                    "trait_item": ("trait", "name"),
+                    "impl_item": ("impl", "type"),
+                },
+                functions=("function_item", "function_signature_item")),
+]
+
+class Grammar:
+    """A loaded grammar. Parsers are not thread-safe, so each thread gets its own."""
+    def __init__(self, spec: GrammarSpec, language: Language):
+        self.spec = spec
+        self.name = spec.name
+        self.language = language
+        self._local = threading.local()
+
+    @property
+    def parser(self) -> Parser:
+        parser = getattr(self._local, "parser", None)
+        if parser is None:
+            parser = Parser(self.language)
+            self._local.parser = parser
+        return parser
+
+    def parse(self, source: bytes, old_tree=None):
+        if old_tree is None:
+            return self.parser.parse(source)
+        return self.parser.parse(source, old_tree)
+
+def _load_from_bundle(name: str) -> Language:
+    """
+    Load a grammar from the tree-sitter-languages bundle. Its get_language() only works with the
+    tree-sitter binding it was built against, so fall back to the symbol in its shared library.
+    """
+    import tree_sitter_languages
+    try:
+        return tree_sitter_languages.get_language(name)
+    except TypeError:
+        library = ctypes.cdll.LoadLibrary(str(Path(tree_sitter_languages.__file__).parent / "languages.so"))
+        factory = getattr(library, f"tree_sitter_{name}")
+        factory.restype = ctypes.c_void_p
+        return Language(factory())
+
+class GrammarRegistry:
+    """
+    Picks the grammar by file extension and loads each one on first use:
+    from its own package (tree_sitter_<lang>) if installed, else from tree-sitter-languages.
+    """
+    _specs_by_ext = {ext: spec for spec in SPECS for ext in spec.extensions}
+    _specs_by_name = {spec.name: spec for spec in SPECS}
+    _loaded: Dict[str, Optional[Grammar]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str) -> Optional[Grammar]:
+        """The grammar called `name`, or None if it is unknown or cannot be loaded."""
+        if name in cls._loaded:
+            return cls._loaded[name]
+        spec = cls._specs_by_name.get(name)
+        if spec is None:
+            return None
+
+        with cls._lock:
+            if name in cls._loaded:
+                return cls._loaded[name]
+            grammar = None
+            try:
+                module = importlib.import_module(spec.module)
+                grammar = Grammar(spec, Language(getattr(module, spec.factory)()))
+            except Exception:
+                try:
+                    grammar = Grammar(spec, _load_from_bundle(spec.name))
+                except Exception as e:
+                    print(f"Warning: tree-sitter grammar '{spec.name}' is not available: {e}")
+            cls._loaded[name] = grammar
+            return grammar
+
+    @classmethod
+    def for_path(cls, path) -> Optional[Grammar]:
+        spec = cls._specs_by_ext.get(os.path.splitext(str(path))[1].lower())
+        return cls.get(spec.name) if spec else None
+
+    @classmethod
+    def extensions(cls) -> Tuple[str, ...]:
+        return tuple(cls._specs_by_ext)
@@ -0,0 +1,183 @@
+import bisect
+import difflib
+import heapq
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+# A near match is applied without asking only above this similarity (after whitespace normalization)
+FUZZY_APPLY_RATIO = 0.95
+
+# Below this, the closest region is not worth showing
+FUZZY_HINT_RATIO = 0.5
+
+# Lines this common ("}", "return", "else:") are useless as anchors
+MAX_ANCHOR_OCCURRENCES = 50
+
+# Candidate regions scored with difflib per search
+MAX_FUZZY_CANDIDATES = 20
+
+# Lines fully compared per anchor when no line of the block occurs verbatim
+MAX_SIMILAR_LINES = 200
+
+class MatchError(Exception):
+    """The search block cannot be placed; the message is shown to the model."""
+
+class Match(NamedTuple):
+    start: int              # character span of the matched text
+    end: int
+    replacement: str        # replace block, re-indented to the matched text if needed
+    note: str               # "" for an exact match, else how it was matched
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+class BlockMatcher:
+    """
+    Finds where a search block goes in one file's content.
+
+    Exact matches are tried first. Otherwise a line index over whitespace-normalized text
+    (built on first use, shared by all searches in the file) gives candidate regions anchored
+    on the block's lines: a region equal up to whitespace is used directly, re-indenting the
+    replacement; other regions are ranked by similarity, and only a clear winner above
+    FUZZY_APPLY_RATIO is used. Otherwise the error names the closest region and its lines.
+    """
+    def __init__(self, content: str):
+        self.content = content
+        self.lines = content.split("\n")
+        self.line_starts = [0]
+        for line in self.lines[:-1]:
+            self.line_starts.append(self.line_starts[-1] + len(line) + 1)
+        self._normalized: Optional[List[str]] = None
+        self._index: Optional[Dict[str, List[int]]] = None
+
+    def line_of(self, pos: int) -> int:
+        """1-based line of a character offset."""
+        return bisect.bisect_right(self.line_starts, pos)
+
+    def _build_index(self):
+        self._normalized = [_normalize(line) for line in self.lines]
+        self._index = {}
+        for number, norm in enumerate(self._normalized):
+            if norm:
+                self._index.setdefault(norm, []).append(number)
+
+    def find(self, search: str, replace: str, hint_line: Optional[int] = None) -> Match:
+        """Locate `search` (nearest to hint_line if it repeats) and return the span and replacement."""
+        found, pos = [], self.content.find(search)
+        while pos != -1 and len(found) < 100:
+            found.append(pos)
+            pos = self.content.find(search, pos + 1)
+        if len(found) == 1:
+            return Match(found[0], found[0] + len(search), replace, "")
+        if found:
+            lines = [self.line_of(p) for p in found]
+            start = self._pick(lines, hint_line, f"Search block found {len(found)} times")
+            return Match(found[lines.index(start)], found[lines.index(start)] + len(search), replace, "")
+        return self._find_fuzzy(search, replace, hint_line)
+
+    @staticmethod
+    def _pick(lines: List[int], hint_line: Optional[int], what: str) -> int:
+        if hint_line is None:
+            raise MatchError(f"Ambiguous match. {what} (lines {', '.join(map(str, lines[:10]))}). "
+                             "Please provide more context to uniquely identify the block.")
+        distances = sorted((abs(line - hint_line), line) for line in lines)
+        if distances[0][0] == distances[1][0]:
+            raise MatchError(f"Ambiguous match. {what}, equally close to line {hint_line}.")
+        return distances[0][1]
+
+    def _find_fuzzy(self, search: str, replace: str, hint_line: Optional[int]) -> Match:
+        if self._index is None:
+            self._build_index()
+        wanted = [_normalize(line) for line in search.rstrip("\n").split("\n")]
+        size = len(wanted)
+        last_start = len(self.lines) - size
+        if not any(wanted) or last_start < 0:
+            raise MatchError("Search block not found in file. Please ensure exact match (including whitespace).")
+
+        # Anchor on every distinctive line of the block: each occurrence votes for a start line
+        votes: Counter = Counter()
+        for offset, norm in enumerate(wanted):
+            occurrences = self._index.get(norm, ()) if norm else ()
+            if len(occurrences) > MAX_ANCHOR_OCCURRENCES:
+                continue
+            for number in occurrences:
+                if 0 <= number - offset <= last_start:
+                    votes[number - offset] += 1
+
+        if not votes:
+            self._similar_line_votes(wanted, last_start, votes)
+
+        exact = [s for s in votes if self._normalized[s:s + size] == wanted]
+        if exact:
+            start = exact[0] if len(exact) == 1 else self._pick(
+                [s + 1 for s in exact], hint_line, f"Search block matches {len(exact)} places up to whitespace") - 1
+            return self._match(start, size, search, replace, "whitespace-insensitive match")
+
+        target = "\n".join(wanted)
+        scored = []
+        for start, _ in votes.most_common(MAX_FUZZY_CANDIDATES):
+            window = "\n".join(self._normalized[start:start + size])
+            scored.append((difflib.SequenceMatcher(None, target, window).ratio(), start))
+        scored.sort(reverse=True)
+
+        if scored and scored[0][0] >= FUZZY_APPLY_RATIO and (len(scored) == 1 or scored[1][0] < FUZZY_APPLY_RATIO):
+            ratio, start = scored[0]
+            return self._match(start, size, search, replace, f"fuzzy match, {ratio:.0%} similar")
+
+        message = "Search block not found in file. Please ensure exact match (including whitespace)."
+        if scored and scored[0][0] >= FUZZY_HINT_RATIO:
+            ratio, start = scored[0]
+            shown = "\n".join(f"{start + i + 1:>5}| {self.lines[start + i].rstrip()}" for i in range(size))
+            message += f"\nClosest match ({ratio:.0%} similar) at lines {start + 1}-{start + size}:\n{shown}"
+        raise MatchError(message)
+
+    def _similar_line_votes(self, wanted: List[str], last_start: int, votes: Counter):
+        """No line of the block occurs verbatim: anchor on file lines similar to its first few lines instead."""
+        matcher = difflib.SequenceMatcher()
+        anchors = [(offset, norm) for offset, norm in enumerate(wanted) if norm][:3]
+        for offset, norm in anchors:
+            matcher.set_seq2(norm)
+            # The cheap upper bound first; the full ratio only for the most promising lines
+            rough = []
+            for number, line in enumerate(self._normalized[offset:last_start + offset + 1], start=offset):
+                if line:
+                    matcher.set_seq1(line)
+                    if matcher.real_quick_ratio() >= FUZZY_HINT_RATIO:
+                        bound = matcher.quick_ratio()
+                        if bound >= FUZZY_HINT_RATIO:
+                            rough.append((bound, number))
+            for _, number in heapq.nlargest(MAX_SIMILAR_LINES, rough):
+                matcher.set_seq1(self._normalized[number])
+                # Weighted by similarity, so the best-matching regions are the ones scored in full
+                ratio = matcher.ratio()
+                if ratio >= FUZZY_HINT_RATIO:
+                    votes[number - offset] += ratio
+
+    def _match(self, start: int, size: int, search: str, replace: str, note: str) -> Match:
+        """Span of lines start..start+size and the replacement re-indented like the file."""
+        begin = self.line_starts[start]
+        end_line = start + size
+        end = self.line_starts[end_line] if end_line < len(self.line_starts) else len(self.content)
+        if not search.endswith("\n"):
+            # Keep the line break after the region, as the search block did not include it
+            end -= len(self.content[begin:end]) - len(self.content[begin:end].rstrip("\r\n"))
+
+        # Shift the replacement by the indentation difference of the first non-blank line
+        search_lines = search.split("\n")
+        for offset, line in enumerate(search_lines[:size]):
+            if line.strip():
+                old_indent, new_indent = _indent(line), _indent(self.lines[start + offset])
+                break
+        else:
+            old_indent = new_indent = ""
+        if old_indent != new_indent:
+            replace = "\n".join(
+                new_indent + line[len(old_indent):] if line.startswith(old_indent) and line.strip() else line
+                for line in replace.split("\n")
+            )
+        if self.content[begin:end].endswith("\n") and "\r\n" in self.content[begin:end] and "\r\n" not in replace:
+            replace = replace.replace("\n", "\r\n")
+        return Match(begin, end, replace, note)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.config import get_cached_settings
+import src.tools.base as base
+
+# Trees are not serializable, so only rendered outlines are persisted; a parsed tree costs
+# several times its source in memory, which this factor accounts for in the byte budget.
+TREE_BYTES_FACTOR = 4
+
+def _point(source: bytes, offset: int) -> Tuple[int, int]:
+    """(row, column) of a byte offset, as tree-sitter expects it."""
+    row = source.count(b"\n", 0, offset)
+    return (row, offset - (source.rfind(b"\n", 0, offset) + 1))
+
+class _Entry:
+    __slots__ = ("stamp", "source", "tree", "grammar", "outlines")
+
+    def __init__(self, stamp, source, tree, grammar):
+        self.stamp = stamp
+        self.source = source
+        self.tree = tree
+        self.grammar = grammar
+        self.outlines: Dict[str, str] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.source) * (1 + TREE_BYTES_FACTOR) + sum(len(o) for o in self.outlines.values())
+
+class ParseCache:
+    """
+    Parsed tree-sitter trees and rendered outlines, keyed by path and validated by (mtime, size).
+
+    - In memory: LRU bounded by an (estimated) byte budget.
+    - On disk (optional): outlines under .sf/cache/outlines, so a fresh session does not
+      re-parse modules that have not changed.
+    - Edits made through our own tools are applied to the cached tree with `tree.edit`,
+      and re-parsing reuses the old tree (tree-sitter's incremental parse).
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, persist: bool = True):
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "incremental": 0, "disk_hits": 0}
+
+    @staticmethod
+    def _stamp(path: Path) -> Tuple[int, int]:
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+
+    def _persist_path(self, key: str, kind: str) -> Path:
+        digest = hashlib.sha1(f"{kind}\0{key}".encode("utf-8")).hexdigest()
+        return base.PROJECT_ROOT / ".sf" / "cache" / "outlines" / f"{digest}.json"
+
+    def _lookup(self, key: str, stamp) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stamp != stamp:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _store(self, key: str, entry: _Entry):
+        with self._lock:
+            self._remove(key)
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def get_tree(self, path: Path, grammar) -> Tuple[bytes, Any]:
+        """Source bytes and parsed tree of a file, parsing only if it changed since last time."""
+        key = str(path)
+        stamp = self._stamp(path)
+        entry = self._lookup(key, stamp)
+        if entry is not None and entry.grammar is grammar:
+            self.stats["hits"] += 1
+            return entry.source, entry.tree
+
+        self.stats["misses"] += 1
+        source = path.read_bytes()
+        tree = grammar.parse(source)
+        self._store(key, _Entry(stamp, source, tree, grammar))
+        return source, tree
+
+    def get_outline(self, path: Path, grammar, build: Callable[[bytes, Any], str], kind: str = "outline") -> str:
+        """
+        Rendered outline of a file. `build(source, tree)` is only called on a cache miss;
+        `kind` distinguishes different renderings (e.g. per language / format version).
+        """
+        key = str(path)
+        stamp = self._stamp(path)
+        entry = self._lookup(key, stamp)
+        if entry is not None and kind in entry.outlines:
+            self.stats["hits"] += 1
+            return entry.outlines[kind]
+
+        persist_path = self._persist_path(key, kind)
+        if entry is None and self.persist:
+            try:
+                stored = json.loads(persist_path.read_text(encoding="utf-8"))
+                if (stored["mtime_ns"], stored["size"]) == stamp:
+                    self.stats["disk_hits"] += 1
+                    return stored["outline"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        source, tree = self.get_tree(path, grammar)
+        outline = build(source, tree)
+
+        entry = self._lookup(key, stamp)
+        if entry is not None:
+            with self._lock:
+                self._bytes += len(outline)
+                entry.outlines[kind] = outline
+        if self.persist:
+            self._save(persist_path, stamp, outline)
+        return outline
+
+    def _save(self, persist_path: Path, stamp, outline: str):
+        try:
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = persist_path.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_text(json.dumps({"mtime_ns": stamp[0], "size": stamp[1], "outline": outline}), encoding="utf-8")
+            os.replace(tmp, persist_path)
+        except OSError:
+            pass
+
+    def note_edit(self, path: Path, old_source: bytes, start_byte: int, old_end_byte: int, new_source: bytes):
+        """
+        Called after a tool rewrote `path` from `old_source` to `new_source`, replacing
+        old_source[start_byte:old_end_byte]. If we hold the tree for `old_source`, it is edited
+        and re-parsed incrementally; otherwise the stale entry is simply dropped.
+        """
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.source != old_source:
+                self._remove(key)
+                return
+            self._remove(key)
+
+        new_end_byte = old_end_byte + len(new_source) - len(old_source)
+        # Edit a copy: readers may still be walking the cached tree
+        tree = entry.tree.copy()
+        tree.edit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=new_end_byte,
+            start_point=_point(old_source, start_byte),
+            old_end_point=_point(old_source, old_end_byte),
+            new_end_point=_point(new_source, new_end_byte),
+        )
+        new_tree = entry.grammar.parse(new_source, tree)
+        self.stats["incremental"] += 1
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return
+        self._store(key, _Entry(stamp, new_source, new_tree, entry.grammar))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+_cache: Optional[ParseCache] = None
+
+def get_parse_cache() -> ParseCache:
+    global _cache
+    if _cache is None:
+        settings = get_cached_settings()
+        _cache = ParseCache(settings.parse_cache_bytes, persist=settings.parse_cache_persist)
+    return _cache
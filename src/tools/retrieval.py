@@ -0,0 +1,377 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from langchain_core.tools import tool
+import src.tools.base as base
+from src.tools.grammars import GrammarRegistry
+from src.tools.walker import walk_files
+
+# Consecutive queries within this window reuse the last scan of the tree
+REFRESH_INTERVAL = 2.0
+
+# Bump when chunking or tokenization changes, so persisted indexes are rebuilt
+INDEX_VERSION = 1
+
+# Larger files are generated code or data, not worth indexing
+MAX_INDEX_FILE_BYTES = 1024 * 1024
+
+# Chunks are functions / methods; longer ones, and the code between them, are split into windows
+MAX_CHUNK_LINES = 80
+
+# Lines of each hit shown in the tool output
+SNIPPET_LINES = 30
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_WORD_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms of code or a question. Identifiers are kept whole and also split into
+    their camelCase / snake_case parts, so "parseHttpHeader" matches "http header" and vice versa.
+    """
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        parts = _WORD_PARTS.findall(identifier)
+        lowered = identifier.lower()
+        if len(parts) > 1 and len(lowered) > 1:
+            terms.append(lowered)
+        terms.extend(p.lower() for p in parts if len(p) > 1)
+    return terms
+
+class Chunk(NamedTuple):
+    start_line: int     # 1-based, inclusive
+    end_line: int
+    title: str          # symbol name, or "" for code between symbols
+
+def _windows(start: int, end: int, title: str) -> List[Chunk]:
+    return [Chunk(s, min(end, s + MAX_CHUNK_LINES - 1), title) for s in range(start, end + 1, MAX_CHUNK_LINES)]
+
+def chunk_source(path: str, source: bytes) -> List[Chunk]:
+    """Split a file at function / method boundaries (via its tree-sitter grammar), else into line windows."""
+    line_count = source.count(b"\n") + (not source.endswith(b"\n"))
+    grammar = GrammarRegistry.for_path(path)
+    symbols: List[Chunk] = []
+    if grammar is not None:
+        functions = set(grammar.spec.functions)
+        containers = grammar.spec.containers
+        stack = [(grammar.parse(source).root_node, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if node.type in functions:
+                name_node = node.child_by_field_name("name")
+                name = source[name_node.start_byte:name_node.end_byte].decode("utf-8", "replace") if name_node else ""
+                symbols.append(Chunk(node.start_point[0] + 1, node.end_point[0] + 1, prefix + name))
+                continue
+            if node.type in containers:
+                name_node = node.child_by_field_name(containers[node.type][1])
+                if name_node is not None:
+                    prefix = prefix + source[name_node.start_byte:name_node.end_byte].decode("utf-8", "replace") + "."
+            stack.extend((child, prefix) for child in reversed(node.children))
+        symbols.sort()
+
+    chunks: List[Chunk] = []
+    cursor = 1
+    for symbol in symbols:
+        if symbol.start_line < cursor:
+            continue
+        if symbol.start_line > cursor:
+            chunks += _windows(cursor, symbol.start_line - 1, "")
+        chunks += _windows(symbol.start_line, symbol.end_line, symbol.title)
+        cursor = symbol.end_line + 1
+    if cursor <= line_count:
+        chunks += _windows(cursor, line_count, "")
+    return chunks
+
+class RetrievalIndex:
+    """
+    BM25 index over code chunks of the project, persisted to .sf/cache/retrieval.npz.
+
+    Layout: chunks are rows of parallel arrays (file, start/end line, length); postings are a
+    CSR matrix by term (offsets into doc ids and term frequencies), so scoring a query is a few
+    vectorized NumPy operations per query term. Files are re-chunked only when their
+    (mtime, size) changes; the postings of unchanged files are carried over as they are.
+    """
+    def __init__(self, root: Path, store_path: Path):
+        self.root = root
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._loaded = False
+
+        self.files: Dict[str, Tuple[int, int]] = {}        # path -> (mtime_ns, size)
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        # Per chunk
+        self.doc_path = np.zeros(0, dtype=np.int32)          # index into self.paths
+        self.doc_start = np.zeros(0, dtype=np.int32)
+        self.doc_end = np.zeros(0, dtype=np.int32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.doc_title: List[str] = []
+        self.paths: List[str] = []
+        # Doc-term triples, grouped by document (the source of truth the postings are built from)
+        self.triple_doc = np.zeros(0, dtype=np.int32)
+        self.triple_term = np.zeros(0, dtype=np.int32)
+        self.triple_tf = np.zeros(0, dtype=np.float32)
+        # Postings by term (CSR)
+        self.post_offsets = np.zeros(1, dtype=np.int64)
+        self.post_doc = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+
+    # --- Persistence ---
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with np.load(self.store_path, allow_pickle=False) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, KeyError, ValueError):
+            return
+        self.paths = arrays["paths"].tolist()
+        self.files = {p: (int(m), int(s)) for p, m, s in zip(self.paths, arrays["mtimes"], arrays["sizes"])}
+        self.terms = arrays["terms"].tolist()
+        self.vocab = {t: i for i, t in enumerate(self.terms)}
+        self.doc_path, self.doc_start, self.doc_end = arrays["doc_path"], arrays["doc_start"], arrays["doc_end"]
+        self.doc_len, self.doc_title = arrays["doc_len"], arrays["doc_title"].tolist()
+        self.triple_doc, self.triple_term, self.triple_tf = arrays["triple_doc"], arrays["triple_term"], arrays["triple_tf"]
+        self._build_postings()
+
+    def _save(self):
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.store_path.with_name(f"{self.store_path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp,
+            version=np.array(INDEX_VERSION),
+            paths=np.array(self.paths, dtype=str),
+            mtimes=np.array([self.files[p][0] for p in self.paths], dtype=np.int64),
+            sizes=np.array([self.files[p][1] for p in self.paths], dtype=np.int64),
+            terms=np.array(self.terms, dtype=str),
+            doc_path=self.doc_path, doc_start=self.doc_start, doc_end=self.doc_end,
+            doc_len=self.doc_len, doc_title=np.array(self.doc_title, dtype=str),
+            triple_doc=self.triple_doc, triple_term=self.triple_term, triple_tf=self.triple_tf,
+        )
+        os.replace(tmp, self.store_path)
+
+    # --- Updating ---
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        for rel_path in walk_files(self.root):
+            try:
+                st = os.stat(self.root / rel_path)
+            except OSError:
+                continue
+            if st.st_size <= MAX_INDEX_FILE_BYTES:
+                found[rel_path] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = self.vocab[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def _index_file(self, rel_path: str, source: bytes):
+        """Chunks and doc-term triples of one file (doc ids relative to the file's first chunk)."""
+        lines = source.decode("utf-8", errors="replace").split("\n")
+        path_terms = tokenize(rel_path)
+        chunks, docs, terms, tfs, lengths = [], [], [], [], []
+        for chunk in chunk_source(rel_path, source):
+            counts = Counter(tokenize("\n".join(lines[chunk.start_line - 1:chunk.end_line])))
+            # The file path and symbol name describe the chunk as much as its body
+            counts.update(path_terms + tokenize(chunk.title))
+            if not counts:
+                continue
+            doc = len(chunks)
+            chunks.append(chunk)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                docs.append(doc)
+                terms.append(self._term_id(term))
+                tfs.append(tf)
+        return chunks, docs, terms, tfs, lengths
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Bring the index up to date with the working tree. Returns counts of changed files."""
+        stats = {"indexed": 0, "removed": 0}
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return stats
+
+            current = self._scan()
+            stale = {p for p, stamp in self.files.items() if current.get(p) != stamp}
+            added = [p for p, stamp in current.items() if self.files.get(p) != stamp]
+            stats["removed"] = len(stale - set(current))
+
+            if stale or added:
+                self._update(stale, added, current)
+                stats["indexed"] = len(added)
+                self._save()
+            self._last_refresh = time.monotonic()
+        return stats
+
+    def _update(self, stale, added: List[str], current: Dict[str, Tuple[int, int]]):
+        # Keep the chunks of unchanged files, renumbering documents and paths
+        stale_ids = [i for i, p in enumerate(self.paths) if p in stale]
+        keep_doc = ~np.isin(self.doc_path, stale_ids)
+        new_doc_ids = np.cumsum(keep_doc, dtype=np.int64) - 1
+        keep_triple = keep_doc[self.triple_doc]
+
+        kept_paths = [p for p in self.paths if p not in stale]
+        position = {p: i for i, p in enumerate(self.paths)}
+        path_ids = np.full(len(self.paths), -1, dtype=np.int32)
+        for new_id, p in enumerate(kept_paths):
+            path_ids[position[p]] = new_id
+
+        doc_path = [path_ids[self.doc_path[keep_doc]]]
+        doc_start, doc_end, doc_len = [self.doc_start[keep_doc]], [self.doc_end[keep_doc]], [self.doc_len[keep_doc]]
+        doc_title = [t for t, keep in zip(self.doc_title, keep_doc) if keep]
+        triple_doc = [new_doc_ids[self.triple_doc[keep_triple]].astype(np.int32)]
+        triple_term, triple_tf = [self.triple_term[keep_triple]], [self.triple_tf[keep_triple]]
+        next_doc = int(keep_doc.sum())
+
+        files = {p: self.files[p] for p in kept_paths}
+        paths = kept_paths
+        for rel_path in sorted(added):
+            try:
+                source = (self.root / rel_path).read_bytes()
+            except OSError:
+                continue
+            if b"\0" in source[:8192]:
+                files[rel_path] = current[rel_path]     # binary: remembered, never chunked
+                paths.append(rel_path)
+                continue
+            chunks, docs, terms, tfs, lengths = self._index_file(rel_path, source)
+            files[rel_path] = current[rel_path]
+            paths.append(rel_path)
+            if not chunks:
+                continue
+            doc_path.append(np.full(len(chunks), len(paths) - 1, dtype=np.int32))
+            doc_start.append(np.array([c.start_line for c in chunks], dtype=np.int32))
+            doc_end.append(np.array([c.end_line for c in chunks], dtype=np.int32))
+            doc_len.append(np.array(lengths, dtype=np.float32))
+            doc_title += [c.title for c in chunks]
+            triple_doc.append(np.array(docs, dtype=np.int32) + next_doc)
+            triple_term.append(np.array(terms, dtype=np.int32))
+            triple_tf.append(np.array(tfs, dtype=np.float32))
+            next_doc += len(chunks)
+
+        self.files, self.paths = files, paths
+        self.doc_path = np.concatenate(doc_path).astype(np.int32)
+        self.doc_start, self.doc_end = np.concatenate(doc_start), np.concatenate(doc_end)
+        self.doc_len, self.doc_title = np.concatenate(doc_len), doc_title
+        self.triple_doc = np.concatenate(triple_doc)
+        self.triple_term, self.triple_tf = np.concatenate(triple_term), np.concatenate(triple_tf)
+        self._build_postings()
+
+    def _build_postings(self):
+        order = np.argsort(self.triple_term, kind="stable")
+        counts = np.bincount(self.triple_term, minlength=len(self.terms))
+        self.post_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.post_doc = self.triple_doc[order]
+        self.post_tf = self.triple_tf[order]
+
+    # --- Querying ---
+
+    def search(self, query: str, top_k: int = 5, path_prefix: str = "") -> List[Tuple[float, str, int, int, str]]:
+        """(score, path, start_line, end_line, title) of the best-matching chunks."""
+        with self._lock:
+            n_docs = len(self.doc_len)
+            term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+            if not n_docs or not term_ids:
+                return []
+
+            avg_len = float(self.doc_len.mean())
+            norm = K1 * (1 - B + B * self.doc_len / avg_len)
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term_id in term_ids:
+                start, end = self.post_offsets[term_id], self.post_offsets[term_id + 1]
+                if start == end:
+                    continue
+                docs, tf = self.post_doc[start:end], self.post_tf[start:end]
+                df = end - start
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scores[docs] += idf * tf * (K1 + 1) / (tf + norm[docs])
+
+            if path_prefix:
+                allowed = np.array([p == path_prefix or p.startswith(path_prefix + "/") for p in self.paths], dtype=bool)
+                scores[~allowed[self.doc_path]] = 0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [
+                (float(scores[d]), self.paths[self.doc_path[d]], int(self.doc_start[d]), int(self.doc_end[d]), self.doc_title[d])
+                for d in candidates
+            ]
+
+_indexes: Dict[Path, RetrievalIndex] = {}
+
+def get_retrieval_index() -> RetrievalIndex:
+    """The (up to date) retrieval index of the current project root."""
+    root = base.PROJECT_ROOT
+    index = _indexes.get(root)
+    if index is None:
+        index = RetrievalIndex(root, root / ".sf" / "cache" / "retrieval.npz")
+        _indexes[root] = index
+    index.refresh()
+    return index
+
+@base.tool_access(read_only=True)
+@tool
+def retrieve_code(query: str, top_k: int = 5, path: Optional[str] = None) -> str:
+    """
+    Find the code most relevant to a natural-language question or a set of keywords
+    (ranked lexical search over functions and code blocks of the whole project, offline).
+    Use this to locate where something is implemented before reading files.
+    Args:
+        query: What you are looking for, e.g. "retry backoff for mcp server restart".
+        top_k: Number of snippets to return. Defaults to 5.
+        path: Optional directory to restrict the search to.
+    Returns:
+        The best-matching snippets with their path and line range.
+    """
+    prefix = ""
+    if path:
+        target_path = (base.PROJECT_ROOT / path).resolve()
+        if not base.is_safe_path(target_path):
+            return f"Error: Access denied. Path must be within project root: {base.PROJECT_ROOT}"
+        rel = target_path.relative_to(base.PROJECT_ROOT.resolve()).as_posix()
+        prefix = "" if rel == "." else rel
+
+    try:
+        hits = get_retrieval_index().search(query, max(1, top_k), prefix)
+    except Exception as e:
+        return f"Error searching code: {str(e)}"
+    if not hits:
+        return f"No code found for '{query}'."
+
+    output = []
+    for rank, (score, rel_path, start, end, title) in enumerate(hits, start=1):
+        label = f"  {title}" if title else ""
+        output.append(f"[{rank}] {rel_path}:{start}-{end}{label}  (score {score:.2f})")
+        try:
+            lines = (base.PROJECT_ROOT / rel_path).read_text(encoding="utf-8", errors="replace").split("\n")
+        except OSError:
+            continue
+        shown_end = min(end, start + SNIPPET_LINES - 1)
+        output += [f"{n:>5}| {lines[n - 1]}" for n in range(start, min(shown_end, len(lines)) + 1)]
+        if shown_end < end:
+            output.append(f"  ... ({end - shown_end} more lines; read_file start_line={shown_end + 1} end_line={end})")
+        output.append("")
+    return "\n".join(output).rstrip()
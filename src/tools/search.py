@@ -0,0 +1,176 @@
+import fnmatch
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+from langchain_core.tools import tool
+from src.config import get_cached_settings
+import src.tools.base as base
+from src.tools.walker import walk_files
+
+# Files larger than this are skipped (generated bundles, data dumps); read them with read_file ranges
+MAX_SEARCH_FILE_BYTES = 4 * 1024 * 1024
+
+class ContentCache:
+    """
+    Decoded text of recently searched files, keyed by path and validated by (mtime, size),
+    so repeated searches in a session do not hit the disk again. LRU bounded by bytes.
+    Binary files are remembered as None.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Optional[str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, path: Path) -> Optional[str]:
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        key = str(path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[1]
+
+        self.stats["misses"] += 1
+        if st.st_size > MAX_SEARCH_FILE_BYTES:
+            return None
+        data = path.read_bytes()
+        text = None if b"\0" in data[:8192] else data.decode("utf-8", errors="replace")
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1] or "")
+            self._entries[key] = (stamp, text)
+            self._bytes += len(text or "")
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted or "")
+        return text
+
+_content_cache: Optional[ContentCache] = None
+
+def get_content_cache() -> ContentCache:
+    global _content_cache
+    if _content_cache is None:
+        _content_cache = ContentCache(get_cached_settings().search_cache_bytes)
+    return _content_cache
+
+def _search_file(text: str, regex: "re.Pattern", context_lines: int, limit: int) -> List[Tuple[int, bool, str]]:
+    """(line number, is_match, line) for matches and their context, at most `limit` matches."""
+    lines = text.splitlines()
+    hits = []
+    for number, line in enumerate(lines, start=1):
+        if regex.search(line):
+            hits.append(number)
+            if len(hits) >= limit:
+                break
+
+    matched, shown, out = set(hits), set(), []
+    for number in hits:
+        for n in range(max(1, number - context_lines), min(len(lines), number + context_lines) + 1):
+            if n not in shown:
+                shown.add(n)
+                out.append((n, n in matched, lines[n - 1]))
+    out.sort()
+    return out
+
+@base.tool_access(read_only=True, path_arg="path")
+@tool
+def search_code(
+    pattern: str,
+    path: str = ".",
+    regex: bool = False,
+    ignore_case: bool = False,
+    glob: Optional[str] = None,
+    context_lines: int = 0,
+    max_results: int = 100,
+) -> str:
+    """
+    Search file contents across the project (respects .gitignore, skips binary files).
+    Prefer this over grep/findstr via run_shell_command.
+    Args:
+        pattern: Text to search for (literal unless regex=True).
+        path: Relative directory (or file) to search in. Defaults to the project root.
+        regex: Treat pattern as a Python regular expression.
+        ignore_case: Case-insensitive matching.
+        glob: Only search files whose name or relative path matches this glob (e.g. "*.py", "src/**/*.ts").
+        context_lines: Lines of context to show around each match.
+        max_results: Maximum number of matching lines to return. Defaults to 100.
+    Returns:
+        Matches as "path:line: text" (context lines as "path-line- text").
+    """
+    target_path = (base.PROJECT_ROOT / path).resolve()
+
+    if not base.is_safe_path(target_path):
+        return f"Error: Access denied. Path must be within project root: {base.PROJECT_ROOT}"
+
+    if not target_path.exists():
+        return f"Error: Path not found: {path}"
+
+    try:
+        # MULTILINE so ^/$ mean line boundaries in the whole-file pre-check too
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        compiled = re.compile(pattern if regex else re.escape(pattern), flags)
+    except re.error as e:
+        return f"Error: Invalid regular expression: {e}"
+
+    root = base.PROJECT_ROOT
+    if target_path.is_file():
+        files = [target_path.relative_to(root).as_posix()]
+    else:
+        files = walk_files(root, target_path.relative_to(root).as_posix())
+    if glob:
+        files = [f for f in files if fnmatch.fnmatch(f, glob) or fnmatch.fnmatch(f.rsplit("/", 1)[-1], glob)]
+    files.sort()
+
+    cache = get_content_cache()
+    context_lines = max(0, context_lines)
+
+    def search_one(rel_path: str):
+        try:
+            text = cache.get(root / rel_path)
+        except OSError:
+            return rel_path, []
+        # Cheap whole-file check first; most files have no match at all
+        if text is None or not compiled.search(text):
+            return rel_path, []
+        return rel_path, _search_file(text, compiled, context_lines, max_results + 1)
+
+    output, matches, files_matched, truncated = [], 0, 0, False
+    pool = ThreadPoolExecutor(max_workers=8)
+    try:
+        for rel_path, hits in pool.map(search_one, files):
+            if truncated:
+                break
+            if not hits:
+                continue
+            previous, counted = None, False
+            for number, is_match, line in hits:
+                if is_match:
+                    if matches >= max_results:
+                        truncated = True
+                        break
+                    if not counted:
+                        files_matched += 1
+                        counted = True
+                    matches += 1
+                if previous is not None and number > previous + 1:
+                    output.append("--")
+                output.append(f"{rel_path}{':' if is_match else '-'}{number}{':' if is_match else '-'} {line}")
+                previous = number
+    finally:
+        # Files not searched yet are not needed once the result cap is hit
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    if not output:
+        return f"No matches for '{pattern}' in {len(files)} files."
+    summary = f"[{matches} matches in {files_matched} files"
+    summary += f"; stopped at max_results={max_results}]" if truncated else "]"
+    return "\n".join(output + [summary])
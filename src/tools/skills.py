@@ -1,6 +1,7 @@
 from typing import List
 from pathlib import Path
 from langchain_core.tools import tool
+import src.tools.base as base
 
 SKILLS_DIR = Path(".sf/skills")
 
@@ -26,6 +27,7 @@ def read_skill_content(skill_name: str) -> str:
     # or just call load_skill directly. For simplicity, let's reuse logic.
     return load_skill.invoke({"skill_name": skill_name})
 
+@base.tool_access(read_only=True)
 @tool
 def list_available_skills() -> str:
     """
@@ -40,6 +42,7 @@ def list_available_skills() -> str:
 
     return "\n".join(skills)
 
+@base.tool_access(read_only=True)
 @tool
 def load_skill(skill_name: str) -> str:
     """
@@ -1,94 +1,279 @@
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage
-from langchain_core.prompts import ChatPromptTemplate
-from typing import List, Dict, Any, Optional
+import asyncio
+import inspect
+import itertools
+import threading
+from collections import OrderedDict
+from langchain_core.tools import StructuredTool
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
 # Import read-only tools
 from src.tools.filesystem import list_directory, read_file
-from src.tools.terminal import run_shell_command
-from src.llm import get_llm
+from src.tools.symbols import find_definition, find_references, search_symbols
+from src.tools.search import search_code
+from src.tools.retrieval import retrieve_code
+from src.llm import ModelRegistry
+from src.config import get_cached_settings
+from src.tool_executor import execute_tool_calls
+from src.compression import compress_history, get_token_counter
+import src.tools.base as base
 
 # Define the set of tools available to the sub-agent (READ-ONLY)
-SUBAGENT_TOOLS = [list_directory, read_file, run_shell_command]
+# Strictly read-only (no shell): delegate_research is declared read-only, so sub-agents may run
+# alongside patches of the same turn
+SUBAGENT_TOOLS = [list_directory, read_file, search_code, retrieve_code, find_definition, find_references, search_symbols]
 
-@tool
-def delegate_research(task_description: str) -> str:
+class FileReadCache:
+    """
+    read_file results shared by all sub-agents of the session, keyed by the resolved path and
+    range arguments and validated by the file's (mtime, size). Parallel research branches
+    usually start by reading the same entry points; only the first one pays for it.
+    """
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(args: Dict[str, Any]) -> Optional[Tuple[Tuple, Tuple[int, int]]]:
+        path = args.get("path")
+        if not isinstance(path, str):
+            return None
+        try:
+            target = (base.PROJECT_ROOT / path).resolve()
+            st = target.stat()
+        except (OSError, RuntimeError):
+            return None
+        ranges = tuple(args.get(name) for name in ("start_line", "end_line", "offset", "length"))
+        return (str(target), ranges), (st.st_mtime_ns, st.st_size)
+
+    async def read(self, **args) -> str:
+        key = self._key(args)
+        if key is not None:
+            with self._lock:
+                cached = self._entries.get(key[0])
+                if cached is not None and cached[0] == key[1]:
+                    self._entries.move_to_end(key[0])
+                    self.stats["hits"] += 1
+                    return cached[1]
+
+        self.stats["misses"] += 1
+        result = await read_file.ainvoke(args)
+        if key is not None and not result.startswith("Error"):
+            with self._lock:
+                old = self._entries.pop(key[0], None)
+                if old is not None:
+                    self._bytes -= len(old[1])
+                self._entries[key[0]] = (key[1], result)
+                self._bytes += len(result)
+                while self._bytes > self.max_bytes and self._entries:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return result
+
+read_cache = FileReadCache()
+
+async def _cached_read_file(**args) -> str:
+    return await read_cache.read(**args)
+
+# Same name, schema and access declaration as read_file, but served through the shared cache
+cached_read_file = StructuredTool.from_function(
+    coroutine=_cached_read_file,
+    name=read_file.name,
+    description=read_file.description,
+    args_schema=read_file.args_schema,
+    metadata=read_file.metadata,
+)
+
+SYSTEM_PROMPT = (
+    "You are a ephemeral Research Sub-Agent. "
+    "Your goal is to investigate the codebase and answer the user's question. "
+    "You have access to READ-ONLY tools. "
+    "You cannot modify files. "
+    "Perform the necessary research (list files, read content) and then provide a final summary answer. "
+    "Request independent tool calls together in one turn; they run in parallel. "
+    "Do not ask the user for more input. "
+    "When you have the answer, respond with the final summary directly."
+)
+
+_agent_ids = itertools.count(1)
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+class ResearchBudget(NamedTuple):
+    """Limits for one sub-agent run (see the SF_SUBAGENT_* settings)."""
+    max_tokens: int          # prompt + completion tokens over all turns
+    timeout: float           # wall-clock seconds
+    max_tool_calls: int
+    max_turns: int
+    context_tokens: int      # prompt size; older scratch history is truncated / pruned beyond it
+
+    @classmethod
+    def from_settings(cls) -> "ResearchBudget":
+        settings = get_cached_settings()
+        return cls(
+            settings.subagent_max_tokens,
+            settings.subagent_timeout,
+            settings.subagent_max_tool_calls,
+            settings.subagent_max_turns,
+            settings.subagent_context_tokens,
+        )
+
+class ResearchResult(NamedTuple):
+    findings: str
+    status: str              # completed | max_turns | token_budget | time_budget | tool_budget
+    turns: int
+    tool_calls: int
+    input_tokens: int
+    output_tokens: int
+    elapsed: float
+
+    def render(self) -> str:
+        return (
+            f"Research Findings:\n{self.findings}\n\n"
+            f"[Sub-agent usage: status={self.status}, turns={self.turns}, tool_calls={self.tool_calls}, "
+            f"input_tokens={self.input_tokens}, output_tokens={self.output_tokens}, elapsed={self.elapsed:.1f}s]"
+        )
+
+WRAP_UP_PROMPT = (
+    "Your research budget is used up. Do not call any more tools. "
+    "Give your final summary now, based on what you have found so far."
+)
+
+def _usage(response, prompt: List[BaseMessage]) -> Tuple[int, int]:
+    """Token usage reported by the provider, or our own count if it reports none."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    counter = get_token_counter()
+    return sum(counter.count_message(m) for m in prompt), counter.count_message(response)
+
+async def run_research(task_description: str, budget: Optional[ResearchBudget] = None) -> ResearchResult:
+    """Run one sub-agent on a research task, within the given (or configured) budget."""
+    budget = budget or ResearchBudget.from_settings()
+    agent_id = next(_agent_ids)
+    agent = f"Sub-Agent {agent_id}"
+    print(f"\n[{agent}] Starting research task: {task_description}")
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + budget.timeout
+
+    # 1. Reuse the shared LLM client with the (cached) read-only tool binding
+    llm_with_tools = ModelRegistry.get_bound(SUBAGENT_TOOLS)
+
+    # 2. Initialize fresh message history (the id gives this run its own token ledger)
+    messages: List[BaseMessage] = [
+        SystemMessage(content=SYSTEM_PROMPT, id=f"subagent-{agent_id}"),
+        HumanMessage(content=task_description),
+    ]
+
+    tool_map = {t.name: t for t in SUBAGENT_TOOLS}
+    tool_map[cached_read_file.name] = cached_read_file
+    max_concurrency = get_cached_settings().tool_concurrency
+
+    findings, status = "", "max_turns"
+    turns = tool_calls = input_tokens = output_tokens = 0
+
+    async def call_llm(llm, prompt):
+        nonlocal turns, input_tokens, output_tokens
+        response = await asyncio.wait_for(llm.ainvoke(prompt), timeout=max(0.0, deadline - loop.time()))
+        turns += 1
+        used_in, used_out = _usage(response, prompt)
+        input_tokens += used_in
+        output_tokens += used_out
+        return response
+
+    # 3. Run the ReAct loop (simple manual loop for isolation)
+    try:
+        while turns < budget.max_turns:
+            if input_tokens + output_tokens >= budget.max_tokens:
+                status = "token_budget"
+                break
+
+            # Scratch history is compressed like the main conversation (system prompt + task always kept)
+            prompt = compress_history(messages, max_tokens=budget.context_tokens, keep_first=2, strategy="prune")
+            response = await call_llm(llm_with_tools, prompt)
+            messages.append(response)
+
+            # Check if it's a tool call or final answer
+            if not response.tool_calls:
+                # No tool calls -> Final Answer
+                findings, status = _content_text(response.content), "completed"
+                print(f"[{agent}] Finished. Returning summary.")
+                break
+
+            print(f"[{agent}] Turn {turns}: Calling tools {[tc['name'] for tc in response.tool_calls]}...")
+            allowed = response.tool_calls[:max(0, budget.max_tool_calls - tool_calls)]
+            refused = response.tool_calls[len(allowed):]
+            tool_calls += len(allowed)
+
+            # Read-only calls of one turn run in parallel
+            results = await asyncio.wait_for(
+                execute_tool_calls(allowed, tool_map, max_concurrency=max_concurrency),
+                timeout=max(0.0, deadline - loop.time())
+            )
+            messages.extend(results)
+            messages.extend(
+                ToolMessage(tool_call_id=tc["id"], name=tc["name"], content="Error: Tool-call budget exhausted.")
+                for tc in refused
+            )
+
+            if refused or tool_calls >= budget.max_tool_calls:
+                # One last turn without tools to turn what we have into an answer
+                status = "tool_budget"
+                if input_tokens + output_tokens < budget.max_tokens:
+                    prompt = compress_history(messages, max_tokens=budget.context_tokens, keep_first=2, strategy="prune")
+                    response = await call_llm(ModelRegistry.get_client(), prompt + [HumanMessage(content=WRAP_UP_PROMPT)])
+                    findings = _content_text(response.content)
+                break
+    except asyncio.TimeoutError:
+        status = "time_budget"
+        print(f"[{agent}] Time budget of {budget.timeout:.0f}s exhausted.")
+
+    if not findings:
+        # Keep whatever the model said along the way instead of discarding it
+        notes = [_content_text(m.content) for m in messages if isinstance(m, AIMessage) and m.content]
+        findings = "\n".join(notes) or "(No findings before the research budget ran out.)"
+        if status == "max_turns":
+            findings = "Sub-agent reached maximum turn limit without a final answer. Partial findings:\n" + findings
+
+    return ResearchResult(findings, status, turns, tool_calls, input_tokens, output_tokens, loop.time() - started)
+
+async def _delegate_research_async(task_description: str) -> str:
     """
     Delegate a research task to a temporary sub-agent.
     Use this for reading multiple files, exploring directories, or investigating code
     without polluting your main context window.
+    Several delegate_research calls in the same turn run concurrently, so split broad
+    research into independent questions. Each sub-agent runs under token, time and
+    tool-call budgets and reports its usage.
 
-    The sub-agent has access to read-only tools (list_directory, read_file, run_shell_command).
-    It does NOT have access to write_file or apply_diff_patch.
+    The sub-agent has access to read-only tools (list_directory, read_file, search_code, retrieve_code,
+    find_definition, find_references, search_symbols).
+    It does NOT have access to the shell, write_file, apply_diff_patch or apply_edits.
 
     Args:
         task_description: The specific research question or task for the sub-agent.
 
     Returns:
-        A summary of the findings found by the sub-agent.
+        A summary of the findings found by the sub-agent, followed by its usage stats.
     """
-    print(f"\n[Sub-Agent] Starting research task: {task_description}")
-
-    # 1. Initialize fresh LLM and bind tools
-    llm = get_llm()
-    llm_with_tools = llm.bind_tools(SUBAGENT_TOOLS)
-
-    # 2. Initialize fresh message history
-    messages = [
-        SystemMessage(content=(
-            "You are a ephemeral Research Sub-Agent. "
-            "Your goal is to investigate the codebase and answer the user's question. "
-            "You have access to READ-ONLY tools. "
-            "You cannot modify files. "
-            "Perform the necessary research (list files, read content) and then provide a final summary answer. "
-            "Do not ask the user for more input. "
-            "When you have the answer, respond with the final summary directly."
-        )),
-        HumanMessage(content=task_description)
-    ]
+    return (await run_research(task_description)).render()
 
-    # 3. Run the ReAct loop (simple manual loop for isolation)
-    max_turns = 10
-    final_answer = ""
-
-    tool_map = {t.name: t for t in SUBAGENT_TOOLS}
+def _delegate_research_sync(task_description: str) -> str:
+    # Sync callers get their own event loop
+    return asyncio.run(_delegate_research_async(task_description))
 
-    for turn in range(max_turns):
-        # Invoke LLM
-        response = llm_with_tools.invoke(messages)
-        messages.append(response)
-
-        # Check if it's a tool call or final answer
-        if response.tool_calls:
-            print(f"[Sub-Agent] Turn {turn+1}: Calling tools {[tc['name'] for tc in response.tool_calls]}...")
-
-            # Execute tools
-            for tc in response.tool_calls:
-                tool_name = tc["name"]
-                tool_args = tc["args"]
-                tool_id = tc["id"]
-
-                if tool_name in tool_map:
-                    try:
-                        tool_result = tool_map[tool_name].invoke(tool_args)
-                    except Exception as e:
-                        tool_result = f"Error: {str(e)}"
-                else:
-                    tool_result = f"Error: Tool {tool_name} not found or not allowed."
-
-                # Append tool result
-                messages.append(ToolMessage(
-                    tool_call_id=tool_id,
-                    content=str(tool_result),
-                    name=tool_name
-                ))
-        else:
-            # No tool calls -> Final Answer
-            final_answer = response.content
-            print(f"[Sub-Agent] Finished. Returning summary.")
-            break
-
-    if not final_answer and turn == max_turns - 1:
-        final_answer = "Sub-agent reached maximum turn limit without a final answer. Partial findings may be in the logs (discarded)."
-
-    return f"Research Findings:\n{final_answer}"
+# The sub-agent only has read-only tools, so several research tasks may run side by side.
+delegate_research = base.tool_access(read_only=True)(StructuredTool.from_function(
+    func=_delegate_research_sync,
+    coroutine=_delegate_research_async,
+    name="delegate_research",
+    description=inspect.cleandoc(_delegate_research_async.__doc__),
+))
@@ -0,0 +1,435 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from langchain_core.tools import tool
+try:
+    from tree_sitter import Query, QueryCursor
+except ImportError:
+    # QueryCursor needs tree-sitter >= 0.25; without it the symbol tools report themselves unavailable
+    Query = QueryCursor = None
+import src.tools.base as base
+from src.tools.grammars import SPECS, Grammar, GrammarRegistry
+from src.tools.walker import walk_files
+
+# Re-walking the tree is cheap but not free; consecutive lookups within this window reuse the last scan
+REFRESH_INTERVAL = 2.0
+
+# Definitions are captured as @def.<kind>; references (call sites, imports, base classes,
+# decorators) as @ref. Plain variable reads are deliberately not indexed to keep the store small.
+# Kinds are shared across languages: structs, interfaces, enums and traits count as "class".
+PY_SYMBOL_QUERY = """
+(class_definition name: (identifier) @def.class)
+(function_definition name: (identifier) @def.function)
+(module (expression_statement (assignment left: (identifier) @def.variable)))
+(call function: (identifier) @ref)
+(call function: (attribute attribute: (identifier) @ref))
+(import_from_statement name: (dotted_name (identifier) @ref .))
+(import_from_statement name: (aliased_import name: (dotted_name (identifier) @ref .)))
+(class_definition superclasses: (argument_list (identifier) @ref))
+(decorator (identifier) @ref)
+(decorator (attribute attribute: (identifier) @ref))
+"""
+
+CS_SYMBOL_QUERY = """
+(class_declaration name: (identifier) @def.class)
+(interface_declaration name: (identifier) @def.class)
+(struct_declaration name: (identifier) @def.class)
+(record_declaration name: (identifier) @def.class)
+(enum_declaration name: (identifier) @def.class)
+(method_declaration name: (identifier) @def.function)
+(property_declaration name: (identifier) @def.variable)
+(invocation_expression function: (identifier) @ref)
+(invocation_expression function: (member_access_expression name: (identifier) @ref))
+(object_creation_expression type: (identifier) @ref)
+(base_list (identifier) @ref)
+(attribute name: (identifier) @ref)
+"""
+
+CPP_SYMBOL_QUERY = """
+(class_specifier name: (type_identifier) @def.class)
+(struct_specifier name: (type_identifier) @def.class)
+(enum_specifier name: (type_identifier) @def.class)
+(function_definition declarator: (function_declarator declarator: (identifier) @def.function))
+(function_definition declarator: (function_declarator declarator: (field_identifier) @def.function))
+(function_definition declarator: (function_declarator declarator: (qualified_identifier name: (identifier) @def.function)))
+(function_definition declarator: (pointer_declarator declarator: (function_declarator declarator: (identifier) @def.function)))
+(call_expression function: (identifier) @ref)
+(call_expression function: (field_expression field: (field_identifier) @ref))
+(call_expression function: (qualified_identifier name: (identifier) @ref))
+(base_class_clause (type_identifier) @ref)
+"""
+
+C_SYMBOL_QUERY = """
+(struct_specifier name: (type_identifier) @def.class)
+(function_definition declarator: (function_declarator declarator: (identifier) @def.function))
+(function_definition declarator: (pointer_declarator declarator: (function_declarator declarator: (identifier) @def.function)))
+(call_expression function: (identifier) @ref)
+(call_expression function: (field_expression field: (field_identifier) @ref))
+"""
+
+TS_SYMBOL_QUERY = """
+(class_declaration name: (type_identifier) @def.class)
+(abstract_class_declaration name: (type_identifier) @def.class)
+(interface_declaration name: (type_identifier) @def.class)
+(enum_declaration name: (identifier) @def.class)
+(type_alias_declaration name: (type_identifier) @def.class)
+(function_declaration name: (identifier) @def.function)
+(generator_function_declaration name: (identifier) @def.function)
+(method_definition name: (property_identifier) @def.function)
+(program (lexical_declaration (variable_declarator name: (identifier) @def.variable)))
+(program (export_statement declaration: (lexical_declaration (variable_declarator name: (identifier) @def.variable))))
+(call_expression function: (identifier) @ref)
+(call_expression function: (member_expression property: (property_identifier) @ref))
+(new_expression constructor: (identifier) @ref)
+(import_specifier name: (identifier) @ref)
+(extends_clause value: (identifier) @ref)
+(implements_clause (type_identifier) @ref)
+(decorator (identifier) @ref)
+"""
+
+JS_SYMBOL_QUERY = """
+(class_declaration name: (identifier) @def.class)
+(function_declaration name: (identifier) @def.function)
+(generator_function_declaration name: (identifier) @def.function)
+(method_definition name: (property_identifier) @def.function)
+(program (lexical_declaration (variable_declarator name: (identifier) @def.variable)))
+(program (export_statement declaration: (lexical_declaration (variable_declarator name: (identifier) @def.variable))))
+(call_expression function: (identifier) @ref)
+(call_expression function: (member_expression property: (property_identifier) @ref))
+(new_expression constructor: (identifier) @ref)
+(import_specifier name: (identifier) @ref)
+(class_heritage (identifier) @ref)
+"""
+
+JAVA_SYMBOL_QUERY = """
+(class_declaration name: (identifier) @def.class)
+(interface_declaration name: (identifier) @def.class)
+(enum_declaration name: (identifier) @def.class)
+(method_declaration name: (identifier) @def.function)
+(field_declaration declarator: (variable_declarator name: (identifier) @def.variable))
+(method_invocation name: (identifier) @ref)
+(object_creation_expression type: (type_identifier) @ref)
+(superclass (type_identifier) @ref)
+(super_interfaces (type_list (type_identifier) @ref))
+(marker_annotation name: (identifier) @ref)
+(annotation name: (identifier) @ref)
+"""
+
+GO_SYMBOL_QUERY = """
+(function_declaration name: (identifier) @def.function)
+(method_declaration name: (field_identifier) @def.function)
+(type_spec name: (type_identifier) @def.class)
+(source_file (var_declaration (var_spec name: (identifier) @def.variable)))
+(source_file (const_declaration (const_spec name: (identifier) @def.variable)))
+(call_expression function: (identifier) @ref)
+(call_expression function: (selector_expression field: (field_identifier) @ref))
+"""
+
+RUST_SYMBOL_QUERY = """
+(struct_item name: (type_identifier) @def.class)
+(enum_item name: (type_identifier) @def.class)
+(trait_item name: (type_identifier) @def.class)
+(function_item name: (identifier) @def.function)
+(function_signature_item name: (identifier) @def.function)
+(const_item name: (identifier) @def.variable)
+(static_item name: (identifier) @def.variable)
+(call_expression function: (identifier) @ref)
+(call_expression function: (field_expression field: (field_identifier) @ref))
+(call_expression function: (scoped_identifier name: (identifier) @ref))
+(macro_invocation macro: (identifier) @ref)
+(use_declaration argument: (scoped_identifier name: (identifier) @ref))
+"""
+
+SYMBOL_QUERIES = {
+    "python": PY_SYMBOL_QUERY,
+    "c_sharp": CS_SYMBOL_QUERY,
+    "cpp": CPP_SYMBOL_QUERY,
+    "c": C_SYMBOL_QUERY,
+    "typescript": TS_SYMBOL_QUERY,
+    "tsx": TS_SYMBOL_QUERY,
+    "javascript": JS_SYMBOL_QUERY,
+    "java": JAVA_SYMBOL_QUERY,
+    "go": GO_SYMBOL_QUERY,
+    "rust": RUST_SYMBOL_QUERY,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS defs (
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    container TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (
+    name TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS defs_name ON defs(name);
+CREATE INDEX IF NOT EXISTS defs_file ON defs(file_id);
+CREATE INDEX IF NOT EXISTS refs_name ON refs(name);
+CREATE INDEX IF NOT EXISTS refs_file ON refs(file_id);
+"""
+
+def _container(node, source: bytes, spec) -> Optional[str]:
+    """Dotted name of the classes / functions enclosing a definition (per the grammar's outline spec)."""
+    names = []
+    parent = node.parent.parent if node.parent else None
+    while parent is not None:
+        field = spec.containers[parent.type][1] if parent.type in spec.containers else "name" if parent.type in spec.functions else None
+        name_node = parent.child_by_field_name(field) if field else None
+        if name_node:
+            names.append(source[name_node.start_byte:name_node.end_byte].decode("utf-8", "replace"))
+        parent = parent.parent
+    return ".".join(reversed(names)) or None
+
+class SymbolIndex:
+    """
+    Project-wide index of definitions and references, stored in SQLite under .sf/cache.
+    Covers every grammar with a query in SYMBOL_QUERIES; files of a language whose grammar
+    cannot be loaded are left out. Files are re-indexed only when their (mtime, size)
+    changes; deleted files are dropped.
+    """
+    def __init__(self, root: Path, db_path: Path):
+        self.root = root
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queries: Dict[str, Tuple[Grammar, Query]] = {}
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.extensions = {ext for spec in SPECS if spec.name in SYMBOL_QUERIES for ext in spec.extensions}
+
+    def _language(self, path: str) -> Optional[Tuple[Grammar, Query]]:
+        """Grammar and compiled symbol query for a file, or None if its grammar is unavailable."""
+        grammar = GrammarRegistry.for_path(path)
+        if grammar is None:
+            return None
+        if grammar.name not in self._queries:
+            self._queries[grammar.name] = (grammar, Query(grammar.language, SYMBOL_QUERIES[grammar.name]))
+        return self._queries[grammar.name]
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Relative path -> (mtime_ns, size) of every indexable, non-ignored file under the root."""
+        found = {}
+        for rel_path in walk_files(self.root):
+            if os.path.splitext(rel_path)[1].lower() not in self.extensions or self._language(rel_path) is None:
+                continue
+            try:
+                st = os.stat(self.root / rel_path)
+            except OSError:
+                continue
+            found[rel_path] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _extract(self, path: str, source: bytes):
+        grammar, query = self._language(path)
+        tree = grammar.parse(source)
+        defs, refs = [], []
+        for capture, nodes in QueryCursor(query).captures(tree.root_node).items():
+            for node in nodes:
+                name = source[node.start_byte:node.end_byte].decode("utf-8", "replace")
+                line = node.start_point[0] + 1
+                if capture == "ref":
+                    refs.append((name, line))
+                else:
+                    defs.append((name, capture.split(".", 1)[1], line, _container(node, source, grammar.spec)))
+        return defs, refs
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Bring the index up to date with the working tree. Returns counts of changed files."""
+        stats = {"indexed": 0, "removed": 0}
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return stats
+
+            conn = self.conn
+            known = {path: (file_id, mtime, size) for file_id, path, mtime, size in conn.execute("SELECT id, path, mtime_ns, size FROM files")}
+            current = self._scan()
+
+            with conn:
+                for path, (file_id, _, _) in known.items():
+                    if path not in current:
+                        self._forget(file_id)
+                        conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                        stats["removed"] += 1
+
+                for path, stamp in current.items():
+                    entry = known.get(path)
+                    if entry is not None and entry[1:] == stamp:
+                        continue
+                    try:
+                        source = (self.root / path).read_bytes()
+                    except OSError:
+                        continue
+
+                    if entry is None:
+                        file_id = conn.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)", (path, *stamp)).lastrowid
+                    else:
+                        file_id = entry[0]
+                        self._forget(file_id)
+                        conn.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?", (*stamp, file_id))
+
+                    defs, refs = self._extract(path, source)
+                    conn.executemany("INSERT INTO defs VALUES (?, ?, ?, ?, ?)", [(n, k, file_id, l, c) for n, k, l, c in defs])
+                    conn.executemany("INSERT INTO refs VALUES (?, ?, ?)", [(n, file_id, l) for n, l in refs])
+                    stats["indexed"] += 1
+
+            self._last_refresh = time.monotonic()
+        return stats
+
+    def _forget(self, file_id: int):
+        self.conn.execute("DELETE FROM defs WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM refs WHERE file_id = ?", (file_id,))
+
+    def definitions(self, name: str, limit: int = 50) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """(name, kind, path, line, container) of definitions named `name` (or `Container.name`)."""
+        container, _, short = name.rpartition(".")
+        sql = "SELECT d.name, d.kind, f.path, d.line, d.container FROM defs d JOIN files f ON f.id = d.file_id WHERE d.name = ?"
+        params: list = [short]
+        if container:
+            sql += " AND (d.container = ? OR d.container LIKE ?)"
+            params += [container, f"%.{container}"]
+        with self._lock:
+            return self.conn.execute(sql + " ORDER BY f.path, d.line LIMIT ?", (*params, limit)).fetchall()
+
+    def references(self, name: str, limit: int = 50) -> List[Tuple[str, int]]:
+        """(path, line) of the places that call / import / subclass / decorate with `name`."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT f.path, r.line FROM refs r JOIN files f ON f.id = r.file_id WHERE r.name = ? ORDER BY f.path, r.line LIMIT ?",
+                (name.rpartition(".")[2], limit)
+            ).fetchall()
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 50) -> List[Tuple[str, str, str, int, Optional[str]]]:
+        """Definitions whose name contains `query` (case-insensitive): exact, then prefix, then substring."""
+        sql = (
+            "SELECT d.name, d.kind, f.path, d.line, d.container FROM defs d JOIN files f ON f.id = d.file_id "
+            "WHERE d.name LIKE ? ESCAPE '\\'"
+        )
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params: list = [f"%{escaped}%"]
+        if kind:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY lower(d.name) = lower(?) DESC, d.name LIKE ? ESCAPE '\\' DESC, length(d.name), f.path, d.line LIMIT ?"
+        params += [query, f"{escaped}%", limit]
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+_indexes: Dict[Path, SymbolIndex] = {}
+
+def get_symbol_index() -> SymbolIndex:
+    """The (up to date) index of the current project root."""
+    if QueryCursor is None:
+        raise RuntimeError("symbol index unavailable, it needs tree-sitter >= 0.25 (use search_code instead)")
+    root = base.PROJECT_ROOT
+    index = _indexes.get(root)
+    if index is None:
+        index = SymbolIndex(root, root / ".sf" / "cache" / "symbols.sqlite")
+        _indexes[root] = index
+    index.refresh()
+    return index
+
+_NOT_INDEXED = " (Only Python, C#, C/C++, TypeScript/JavaScript, Java, Go and Rust files are indexed; use search_code for other languages.)"
+
+def _format_defs(rows) -> str:
+    lines = []
+    for name, kind, path, line, container in rows:
+        where = f" (in {container})" if container else ""
+        lines.append(f"{path}:{line}  {kind} {name}{where}")
+    return "\n".join(lines)
+
+def _source_lines(rows: List[Tuple[str, int]]) -> List[str]:
+    """Render (path, line) hits with the stripped source line, reading each file once."""
+    lines, cache = [], {}
+    for path, line in rows:
+        if path not in cache:
+            try:
+                cache[path] = (base.PROJECT_ROOT / path).read_text(encoding="utf-8", errors="replace").splitlines()
+            except OSError:
+                cache[path] = []
+        text = cache[path][line - 1].strip() if line <= len(cache[path]) else ""
+        lines.append(f"{path}:{line}: {text}")
+    return lines
+
+@base.tool_access(read_only=True)
+@tool
+def find_definition(name: str) -> str:
+    """
+    Find where a class, function or module-level variable is defined, across the whole project.
+    Indexed languages: Python, C#, C/C++, TypeScript/JavaScript, Java, Go and Rust; use search_code for others.
+    Args:
+        name: Symbol name, optionally qualified by its class (e.g. "parse" or "Parser.parse").
+    """
+    try:
+        rows = get_symbol_index().definitions(name)
+    except Exception as e:
+        return f"Error searching symbols: {str(e)}"
+    if not rows:
+        return f"No definition found for '{name}'.{_NOT_INDEXED}"
+    return _format_defs(rows)
+
+@base.tool_access(read_only=True)
+@tool
+def find_references(name: str, limit: int = 50) -> str:
+    """
+    Find where a symbol is used: call sites, imports, base classes and decorators.
+    Indexed languages: Python, C#, C/C++, TypeScript/JavaScript, Java, Go and Rust; use search_code for others.
+    Args:
+        name: Symbol name (e.g. "compress_history").
+        limit: Maximum number of results. Defaults to 50.
+    """
+    try:
+        rows = get_symbol_index().references(name, limit + 1)
+    except Exception as e:
+        return f"Error searching symbols: {str(e)}"
+    if not rows:
+        return f"No references found for '{name}'.{_NOT_INDEXED}"
+    lines = _source_lines(rows[:limit])
+    if len(rows) > limit:
+        lines.append(f"... (more than {limit} references, increase limit to see more)")
+    return "\n".join(lines)
+
+@base.tool_access(read_only=True)
+@tool
+def search_symbols(query: str, kind: Optional[str] = None, limit: int = 50) -> str:
+    """
+    Search definitions by (partial, case-insensitive) name across the project.
+    Indexed languages: Python, C#, C/C++, TypeScript/JavaScript, Java, Go and Rust; use search_code for others.
+    Args:
+        query: Part of the symbol name (e.g. "token" matches count_tokens, TokenCounter).
+        kind: Optional filter: "class", "function" or "variable".
+        limit: Maximum number of results. Defaults to 50.
+    """
+    try:
+        rows = get_symbol_index().search(query, kind, limit)
+    except Exception as e:
+        return f"Error searching symbols: {str(e)}"
+    if not rows:
+        return f"No symbols matching '{query}'.{_NOT_INDEXED}"
+    return _format_defs(rows)
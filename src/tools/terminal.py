@@ -1,8 +1,13 @@
-import subprocess
-from pathlib import Path
-from langchain_core.tools import tool
-import shlex
+import asyncio
+import inspect
 import os
+import shlex
+import signal
+import sys
+from collections import deque
+from typing import Callable, Optional
+from langchain_core.tools import StructuredTool
+from src.config import get_cached_settings
 import src.tools.base as base
 
 # List of blocked commands/binaries for safety
@@ -18,15 +23,59 @@ BLOCKED_COMMANDS = [
     "chmod -R 777"
 ]
 
-@tool
-def run_shell_command(command: str) -> str:
+def _print_chunk(stream: str, line: str):
+    """Default live output sink: echo each line dimmed under the tool call."""
+    prefix = "  │ " if stream == "stdout" else "  ! "
+    print(f"\033[2m{prefix}{line}\033[0m", flush=True)
+
+# Receives (stream_name, line) while a command runs. The CLI may replace it; None disables echo.
+stream_handler: Optional[Callable[[str, str], None]] = _print_chunk
+
+class OutputBuffer:
     """
-    Run a shell command safely.
-    Args:
-        command: The shell command to execute.
+    Bounded capture of a process stream: keeps the first `head_bytes` and the last
+    `tail_bytes`, and only counts what falls in between. Memory stays O(limit)
+    no matter how chatty the command is.
     """
-    command_str = command.strip()
+    def __init__(self, max_bytes: int):
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head.extend(data[:room])
+            data = data[room:]
+        if not data:
+            return
 
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail_size > self.tail_bytes:
+            excess = self.tail_size - self.tail_bytes
+            first = self.tail[0]
+            if len(first) <= excess:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+                self.dropped += len(first)
+            else:
+                self.tail[0] = first[excess:]
+                self.tail_size -= excess
+                self.dropped += excess
+
+    def getvalue(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = b"".join(self.tail).decode("utf-8", errors="replace")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes of output omitted] ...\n{tail}"
+        return head + tail
+
+def _check_command(command_str: str) -> Optional[str]:
+    """Return an error message if the command is not allowed, else None."""
     # Basic blocklist check
     # Instead of substring matching, check tokens
     command_tokens = shlex.split(command_str)
@@ -52,33 +101,121 @@ def run_shell_command(command: str) -> str:
     if "/etc" in command_str or "~/.ssh" in command_str:
         return "Error: Access to sensitive paths (/etc, ~/.ssh) is restricted."
 
+    return None
+
+async def _pump(reader: asyncio.StreamReader, name: str, buffer: OutputBuffer):
+    """Copy a process stream into `buffer`, echoing complete lines to the stream handler."""
+    pending = b""
+    while True:
+        chunk = await reader.read(8192)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if stream_handler:
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                stream_handler(name, line.decode("utf-8", errors="replace").rstrip("\r"))
+            if len(pending) > 8192:
+                # Don't hold unbounded partial lines just for the echo
+                stream_handler(name, pending.decode("utf-8", errors="replace"))
+                pending = b""
+    if stream_handler and pending:
+        stream_handler(name, pending.decode("utf-8", errors="replace").rstrip("\r"))
+
+def _kill(process: asyncio.subprocess.Process):
+    """Kill the shell and everything it started."""
+    if process.returncode is not None:
+        return
     try:
-        # Use subprocess.run with shell=True for convenience but with restrictions
-        # However, for better security, splitting args and shell=False is preferred,
-        # but user might pipe commands (e.g. ls | grep).
-        # Given "Do NOT allow commands like rm -rf /", maybe allow simple commands.
-        # But shell=True is needed for | and && which are common in CLI tasks.
-        # Let's use shell=True but rely on the blocked list and cwd restriction.
-
-        # Run command in project root
-        result = subprocess.run(
+        if sys.platform != "win32":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+async def _run_shell_command_async(command: str, timeout: Optional[int] = None) -> str:
+    """
+    Run a shell command safely.
+    Output is streamed live to the terminal; very long output is trimmed to its head and tail.
+    Args:
+        command: The shell command to execute.
+        timeout: Optional timeout in seconds (defaults to SF_SHELL_TIMEOUT, 30s; capped at SF_SHELL_MAX_TIMEOUT, 600s).
+    """
+    command_str = command.strip()
+
+    error = _check_command(command_str)
+    if error:
+        return error
+
+    settings = get_cached_settings()
+    if timeout is None:
+        timeout = settings.shell_timeout
+    elif timeout <= 0:
+        return f"Error: timeout must be a positive number of seconds, got {timeout}."
+    timeout = min(timeout, settings.shell_max_timeout)
+
+    try:
+        # shell=True is needed for | and && which are common in CLI tasks.
+        # We rely on the blocked list and cwd restriction.
+        # On POSIX the shell gets its own process group so a timeout / Ctrl+C kills its children too.
+        process = await asyncio.create_subprocess_shell(
             command_str,
-            shell=True,
             cwd=base.PROJECT_ROOT,
-            capture_output=True,
-            text=True,
-            timeout=30  # Timeout to prevent hanging
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=(sys.platform != "win32")
         )
+    except Exception as e:
+        return f"Error executing command: {str(e)}"
 
-        stdout = result.stdout.strip()
-        stderr = result.stderr.strip()
-
-        if result.returncode != 0:
-            return f"Command failed with exit code {result.returncode}:\nStdout: {stdout}\nStderr: {stderr}"
+    stdout_buf = OutputBuffer(settings.shell_max_output_bytes)
+    stderr_buf = OutputBuffer(settings.shell_max_output_bytes)
 
-        return stdout if stdout else "(No output)"
+    async def _communicate():
+        await asyncio.gather(
+            _pump(process.stdout, "stdout", stdout_buf),
+            _pump(process.stderr, "stderr", stderr_buf)
+        )
+        return await process.wait()
 
-    except subprocess.TimeoutExpired:
-        return "Error: Command timed out after 30 seconds."
+    try:
+        returncode = await asyncio.wait_for(_communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        _kill(process)
+        await process.wait()
+        # What the command printed before it hung; stderr usually says why
+        message = f"Error: Command timed out after {timeout} seconds."
+        for label, buffer in (("Stdout", stdout_buf), ("Stderr", stderr_buf)):
+            partial = buffer.getvalue().strip()
+            if partial:
+                message += f"\n{label} (partial):\n{partial}"
+        return message
+    except asyncio.CancelledError:
+        # Ctrl+C / graph cancellation: never leave the process running
+        _kill(process)
+        raise
     except Exception as e:
+        _kill(process)
         return f"Error executing command: {str(e)}"
+
+    stdout = stdout_buf.getvalue().strip()
+    stderr = stderr_buf.getvalue().strip()
+
+    if returncode != 0:
+        return f"Command failed with exit code {returncode}:\nStdout: {stdout}\nStderr: {stderr}"
+
+    return stdout if stdout else "(No output)"
+
+def _run_shell_command_sync(command: str, timeout: Optional[int] = None) -> str:
+    # Sync callers (e.g. the sub-agent's worker thread) get their own event loop
+    return asyncio.run(_run_shell_command_async(command, timeout))
+
+run_shell_command = StructuredTool.from_function(
+    func=_run_shell_command_sync,
+    coroutine=_run_shell_command_async,
+    name="run_shell_command",
+    description=inspect.cleandoc(_run_shell_command_async.__doc__),
+)
@@ -0,0 +1,179 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# Never descended into, whatever .gitignore says
+ALWAYS_SKIPPED = {".git", ".sf"}
+
+# Descended into only when explicitly asked (dependencies, caches, virtualenvs). Build output is
+# left to .gitignore: generic names like bin/ often hold real sources (e.g. Rust's src/bin).
+DEFAULT_PRUNED = {"__pycache__", "node_modules", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache"}
+
+# Listings also stop at typical .NET build output, but say so (the directory may be sources)
+LISTING_PRUNED = DEFAULT_PRUNED | {"bin", "obj"}
+
+class IgnoreRule(NamedTuple):
+    regex: "re.Pattern"
+    negate: bool
+    dir_only: bool
+
+def _translate(pattern: str) -> str:
+    """Translate the body of a gitignore glob into a regex (without anchors)."""
+    out, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+def parse_gitignore(text: str) -> List[IgnoreRule]:
+    """Rules of one .gitignore file, in order (the last matching rule wins)."""
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but at the end anchors the pattern to the .gitignore's directory
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "^" if anchored else "^(?:.*/)?"
+        rules.append(IgnoreRule(re.compile(prefix + _translate(line) + "$"), negate, dir_only))
+    return rules
+
+# A .gitignore applies to paths relative to the directory that contains it
+RuleChain = Tuple[Tuple[str, Tuple[IgnoreRule, ...]], ...]
+
+def is_ignored(rel_path: str, is_dir: bool, chain: RuleChain) -> bool:
+    ignored = False
+    for base_dir, rules in chain:
+        relative = rel_path[len(base_dir) + 1:] if base_dir else rel_path
+        for rule in rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(relative):
+                ignored = not rule.negate
+    return ignored
+
+def _load_rules(directory: Path, rel_dir: str, chain: RuleChain) -> RuleChain:
+    try:
+        text = (directory / ".gitignore").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return chain
+    rules = parse_gitignore(text)
+    return chain + ((rel_dir, tuple(rules)),) if rules else chain
+
+def root_rules(root: Path) -> RuleChain:
+    """Rules in effect at the project root: .git/info/exclude and the root .gitignore."""
+    chain: RuleChain = ()
+    try:
+        exclude = parse_gitignore((root / ".git" / "info" / "exclude").read_text(encoding="utf-8", errors="replace"))
+        if exclude:
+            chain = (("", tuple(exclude)),)
+    except OSError:
+        pass
+    return _load_rules(root, "", chain)
+
+class Entry(NamedTuple):
+    path: str          # relative to the root, "/"-separated
+    is_dir: bool
+    depth: int         # 1 = directly inside the start directory
+
+def _scan(root: Path, rel_dir: str, chain: RuleChain, depth: int, pruned: frozenset) -> Tuple[List[Entry], List[Tuple[str, RuleChain]]]:
+    """List one directory: its non-ignored entries, and the subdirectories to descend into."""
+    entries, subdirs = [], []
+    directory = root / rel_dir if rel_dir else root
+    chain = _load_rules(directory, rel_dir, chain) if rel_dir else chain
+    try:
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.name in ALWAYS_SKIPPED:
+                    continue
+                try:
+                    is_dir = item.is_dir()
+                except OSError:
+                    continue
+                rel_path = f"{rel_dir}/{item.name}" if rel_dir else item.name
+                if is_ignored(rel_path, is_dir, chain):
+                    continue
+                entries.append(Entry(rel_path, is_dir, depth))
+                if is_dir and item.name not in pruned and not item.is_symlink():
+                    subdirs.append((rel_path, chain))
+    except OSError:
+        pass
+    return entries, subdirs
+
+def walk(root: Path, start: str = "", max_depth: Optional[int] = None, pruned: Iterable[str] = DEFAULT_PRUNED,
+         workers: int = 8) -> List[Entry]:
+    """
+    Breadth-first, gitignore-aware walk below `root / start`.
+    Each level's directories are listed in parallel (scandir/stat release the GIL).
+    Directories in `pruned` are reported but not descended into.
+    """
+    start = start.strip("/").replace(os.sep, "/")
+    if start in (".", ""):
+        start = ""
+    pruned = frozenset(pruned)
+
+    # Rules from the root down to the start directory
+    chain = root_rules(root)
+    if start:
+        parts = start.split("/")
+        for i in range(1, len(parts)):
+            rel = "/".join(parts[:i])
+            chain = _load_rules(root / rel, rel, chain)
+
+    results: List[Entry] = []
+    level = [(start, chain)]
+    depth = 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level and (max_depth is None or depth <= max_depth):
+            next_level = []
+            for entries, subdirs in pool.map(lambda job: _scan(root, job[0], job[1], depth, pruned), level):
+                results.extend(entries)
+                next_level.extend(subdirs)
+            level = next_level
+            depth += 1
+    return results
+
+def walk_files(root: Path, start: str = "", pruned: Iterable[str] = DEFAULT_PRUNED) -> List[str]:
+    """Relative paths of all non-ignored files below `root / start`."""
+    return [entry.path for entry in walk(root, start, pruned=pruned) if not entry.is_dir]
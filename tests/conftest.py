@@ -0,0 +1,16 @@
+import os
+import pytest
+
+# Importing src.main builds the CLI graph: keep its sessions in memory, never in the checkout
+os.environ["SF_CHECKPOINT_BACKEND"] = "memory"
+
+@pytest.fixture(autouse=True)
+def project_root_in_tmp(tmp_path_factory, monkeypatch):
+    """
+    Run every test against an empty temporary project root, so tool caches (.sf/cache),
+    artifacts and checkpoints are never written into the developer's checkout.
+    Tests that need files set up their own root on top of this.
+    """
+    root = tmp_path_factory.mktemp("project")
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", root)
+    return root
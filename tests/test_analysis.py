@@ -40,3 +40,115 @@ def test_analyze_code_structure(analysis_test_files):
     assert "def utility_func(x, y): ..." in result
     assert "print" not in result # Implementation details should be hidden
     assert "return x + y" not in result
+
+def test_outline_is_cached_until_file_changes(analysis_test_files, monkeypatch):
+    """Test that unchanged files are not re-parsed, and outlines survive a new session on disk"""
+    import src.tools.parse_cache as parse_cache
+    cache = parse_cache.ParseCache()
+    monkeypatch.setattr(parse_cache, "_cache", cache)
+
+    first = analyze_code_structure.invoke({"path": "example.py"})
+    second = analyze_code_structure.invoke({"path": "example.py"})
+    assert first == second
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 1
+
+    # A new process starts with an empty memory cache but finds the persisted outline
+    fresh = parse_cache.ParseCache()
+    monkeypatch.setattr(parse_cache, "_cache", fresh)
+    assert analyze_code_structure.invoke({"path": "example.py"}) == first
+    assert fresh.stats["disk_hits"] == 1 and fresh.stats["misses"] == 0
+
+def test_patch_reparses_incrementally(analysis_test_files, monkeypatch):
+    """Test that editing through apply_diff_patch updates the cached tree incrementally"""
+    import src.tools.parse_cache as parse_cache
+    from src.tools.editor import apply_diff_patch
+    cache = parse_cache.ParseCache(persist=False)
+    monkeypatch.setattr(parse_cache, "_cache", cache)
+
+    analyze_code_structure.invoke({"path": "example.py"})
+    apply_diff_patch.invoke({
+        "path": "example.py",
+        "search_block": "def utility_func(x, y):",
+        "replace_block": "def helper(x, y, z=1):\n    pass\n\ndef utility_func(x, y):",
+    })
+    result = analyze_code_structure.invoke({"path": "example.py"})
+
+    assert cache.stats["incremental"] == 1
+    assert cache.stats["misses"] == 1  # the edited file was never fully re-parsed
+    assert "def helper(x, y, z=1): ..." in result
+    assert "def utility_func(x, y): ..." in result
+
+CSHARP_CODE = """
+using System;
+
+namespace Vision.Tools
+{
+    public class Inspector : ToolBase
+    {
+        public Inspector(string name) { }
+
+        public bool Run(int frame, double threshold)
+        {
+            return frame > threshold;
+        }
+    }
+}
+"""
+
+CPP_CODE = """
+namespace geo {
+struct Point {
+    double length() const { return 0; }
+};
+
+int area(const Point& a, const Point& b) {
+    return 0;
+}
+}
+"""
+
+TS_CODE = """
+export class Store<T> {
+    get(key: string): T | undefined { return undefined; }
+}
+
+export function createStore(name: string): Store<number> {
+    return new Store();
+}
+"""
+
+@pytest.mark.parametrize("filename, code, expected", [
+    ("Inspector.cs", CSHARP_CODE, [
+        "namespace Vision.Tools:",
+        "  class Inspector:",
+        "    def Inspector(string name): ...",
+        "    def Run(int frame, double threshold): ...",
+    ]),
+    ("geo.cpp", CPP_CODE, [
+        "namespace geo:",
+        "  struct Point:",
+        "    def length(): ...",
+        "  def area(const Point& a, const Point& b): ...",
+    ]),
+    ("store.ts", TS_CODE, [
+        "class Store:",
+        "  def get(key: string): ...",
+        "def createStore(name: string): ...",
+    ]),
+])
+def test_analyze_other_languages(tmp_path, monkeypatch, filename, code, expected):
+    """Test the same compact outline for C#, C++ and TypeScript (skipped if the grammar is missing)"""
+    from src.tools.grammars import GrammarRegistry
+    if GrammarRegistry.for_path(filename) is None:
+        pytest.skip(f"no grammar available for {filename}")
+    (tmp_path / filename).write_text(code, encoding="utf-8")
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+
+    result = analyze_code_structure.invoke({"path": filename})
+    assert result.splitlines() == expected
+
+def test_unsupported_extension(analysis_test_files):
+    """Test that files without a known grammar are rejected instead of misparsed"""
+    (analysis_test_files / "notes.txt").write_text("class A: pass", encoding="utf-8")
+    result = analyze_code_structure.invoke({"path": "notes.txt"})
+    assert result.startswith("Error: Unsupported file type")
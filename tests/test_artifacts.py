@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from langchain_core.tools import StructuredTool
+import src.artifacts as artifacts
+from src.artifacts import ArtifactStore, get_artifact_store
+from src.config import get_cached_settings
+from src.tool_executor import execute_tool_calls
+from src.tools.artifacts import fetch_artifact
+
+BIG_OUTPUT = "\n".join(f"line {i}: " + "x" * 60 for i in range(1, 2001))
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(get_cached_settings(), "artifact_threshold", 8 * 1024)
+    return tmp_path
+
+def _spill(text):
+    def _run() -> str:
+        return text
+    tool = StructuredTool.from_function(func=_run, name="dump", description="dump")
+    calls = [{"name": "dump", "args": {}, "id": "call_1"}]
+    return asyncio.run(execute_tool_calls(calls, {"dump": tool}, artifacts=get_artifact_store(), spill_threshold=8 * 1024))[0]
+
+def test_store_is_content_addressed(project, monkeypatch):
+    """Test that identical outputs share one compressed blob, with zlib when zstd is missing"""
+    store = ArtifactStore(project / ".sf" / "artifacts")
+    handle = store.put(BIG_OUTPUT)
+    assert store.put(BIG_OUTPUT) == handle
+    blobs = [p for p in (project / ".sf" / "artifacts").rglob("*") if p.is_file()]
+    assert len(blobs) == 1 and blobs[0].stat().st_size < len(BIG_OUTPUT) // 10
+    assert ArtifactStore(store.root).get(handle) == BIG_OUTPUT
+    assert store.get("art_0000000000000000") is None
+    assert store.get("../../etc/passwd") is None
+
+    monkeypatch.setattr(artifacts, "zstandard", None)
+    other = ArtifactStore(project / "zlib")
+    assert other.get(other.put("plain " * 10)) == "plain " * 10
+    assert list((project / "zlib").rglob("*.zz"))
+
+def test_large_outputs_are_spilled_and_fetched(project):
+    """Test that a large result is replaced by a preview + handle and can be paged through"""
+    message = _spill(BIG_OUTPUT)
+    handle = message.artifact["handle"]
+    assert len(message.content) < 8 * 1024
+    assert message.content.startswith("line 1: ")
+    assert "line 2000: " in message.content and "line 1000: " not in message.content
+    assert f"stored as artifact {handle}" in message.content
+
+    part = fetch_artifact.invoke({"handle": handle, "start_line": 1000, "end_line": 1001})
+    assert part.startswith(f"[Lines 1000-1001 of 2000 in artifact {handle}]\nline 1000: ")
+
+    whole = fetch_artifact.invoke({"handle": handle})
+    assert "(truncated; continue with start_line=" in whole.split("\n", 1)[0]
+    assert len(whole) < 8 * 1024
+
+    assert "Error: Artifact not found" in fetch_artifact.invoke({"handle": "art_ffffffffffffffff"})
+
+    small = _spill("short")
+    assert small.content == "short" and small.artifact is None
+
+def test_huge_single_line_is_read_by_characters(project):
+    """Test that a one-line output (e.g. minified JSON) can be read past the per-result budget"""
+    text = "header\n" + "".join(f"{i:05d}," for i in range(5000))
+    handle = _spill(text).artifact["handle"]
+
+    by_line = fetch_artifact.invoke({"handle": handle, "start_line": 2})
+    assert by_line.startswith("[Lines 2-2 of 2 in artifact")
+    next_offset = int(by_line.split("continue with offset=")[1].split(")")[0])
+
+    pieces, offset = [], next_offset
+    while True:
+        part = fetch_artifact.invoke({"handle": handle, "offset": offset})
+        header, body = part.split("\n", 1)
+        pieces.append(body)
+        if "continue with offset=" not in header:
+            break
+        offset = int(header.split("continue with offset=")[1].split(")")[0])
+    assert by_line.split("\n", 1)[1] + "".join(pieces) == text.split("\n")[1]
+
+    part = fetch_artifact.invoke({"handle": handle, "offset": 7, "length": 12})
+    assert part == f"[Characters 7-19 of {len(text)} in artifact {handle}]\n00000,00001,"
+    assert "Error: Use either" in fetch_artifact.invoke({"handle": handle, "offset": 0, "start_line": 1})
+    assert "beyond the end" in fetch_artifact.invoke({"handle": handle, "offset": len(text)})
+
+def test_expansion_reads_the_full_output(project):
+    """Test that the CLI 'v' expansion shows the stored output, not the preview"""
+    from src.main import _full_tool_output
+    message = _spill(BIG_OUTPUT)
+    assert _full_tool_output(message) == BIG_OUTPUT
@@ -0,0 +1,62 @@
+import pytest
+from src.bench import APP_SOURCE, FIXED_FILES, _busy, compare, make_synthetic_repo, run_case, run_cases, scenario_script
+
+def test_synthetic_repo_has_requested_size(tmp_path):
+    """Test that the generated repo has exactly the requested number of files and is reused"""
+    root = make_synthetic_repo(tmp_path / "repo", 250)
+    files = [p for p in root.rglob("*") if p.is_file() and p.name != ".bench_repo"]
+    assert len(files) == 250
+    assert all((root / rel).exists() for rel in FIXED_FILES)
+
+    (root / "pkg0000" / "marker.txt").write_text("kept", encoding="utf-8")
+    make_synthetic_repo(root, 250)
+    assert (root / "pkg0000" / "marker.txt").exists()
+
+def test_real_projects_are_never_wiped(tmp_path):
+    """Test that a directory without the synthetic-repo marker is neither replaced nor has its .sf deleted"""
+    project = tmp_path / "project"
+    (project / ".sf").mkdir(parents=True)
+    (project / "main.py").write_text("print('hi')\n", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        make_synthetic_repo(project, 250)
+    with pytest.raises(ValueError):
+        run_case(str(project), "patch")
+    assert (project / "main.py").exists() and (project / ".sf").is_dir()
+
+def test_scenario_scripts_address_main_agent():
+    """Test that every main-agent response is scoped to the coder's prompt"""
+    for response in scenario_script("explore")["responses"]:
+        assert response["when"] == "Senior Python Developer"
+
+def test_busy_counts_overlaps_once():
+    assert _busy([(0.0, 1.0), (0.5, 2.0), (3.0, 4.0)]) == 3.0
+    assert _busy([]) == 0.0
+
+def test_compare_flags_regressions_beyond_threshold_and_noise():
+    """Test that only increases past both the relative threshold and the noise floor count"""
+    def results(wall, tokens, rss):
+        return {"cases": [{"size": 1000, "scenario": "explore", "wall_ms": wall, "prompt_tokens": tokens,
+                           "peak_rss_mb": rss, "overhead_ms_per_turn": 1.0, "checkpoint_bytes": 10}]}
+
+    changes = compare(results(100.0, 1000, 100.0), results(150.0, 1200, 103.0))
+    flagged = {c.metric for c in changes if c.regression}
+    assert flagged == {"prompt_tokens", "wall_ms"}  # +3 MB RSS is within the noise floor
+
+    # Cases missing from the baseline are not compared
+    assert compare({"cases": []}, results(1.0, 1, 1.0)) == []
+
+def test_scenarios_run_end_to_end(tmp_path):
+    """Test that scenarios drive the graph to completion without tool errors and report metrics"""
+    results = run_cases([60], ["patch", "delegate"], tmp_path, log=lambda line: None)
+
+    assert [c["scenario"] for c in results["cases"]] == ["patch", "delegate"]
+    for case in results["cases"]:
+        assert case["tool_errors"] == 0
+        assert case["prompt_tokens"] > 0 and case["checkpoint_bytes"] > 0
+        assert all(turn["overhead_ms"] >= 0 for turn in case["turns"])
+    patch_case, delegate_case = results["cases"]
+    assert patch_case["tools"]["apply_diff_patch"]["count"] == 1
+    assert delegate_case["tools"]["delegate_research"]["count"] == 2
+    # The patch scenario reverts its own change
+    assert (tmp_path / "repo-60" / "core" / "app.py").read_text(encoding="utf-8") == APP_SOURCE
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from langchain_core.messages import AIMessage, HumanMessage
+from src.checkpoint import SqliteCheckpointSaver, MESSAGE_LOG_REF
+from src.graph import create_graph
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / ".sf" / "checkpoints.sqlite"
+
+def _run_turns(graph, config, replies):
+    """Drive the graph through plain-text turns with a mocked model."""
+    mock_coder_llm = MagicMock()
+    mock_coder_llm.ainvoke = AsyncMock(side_effect=[AIMessage(content=r) for r in replies])
+    with patch("src.graph.ModelRegistry.get_bound", return_value=mock_coder_llm):
+        for i in range(len(replies)):
+            inputs = {"messages": [HumanMessage(content=f"question {i}")], "sender": "user"}
+            asyncio.run(graph.ainvoke(inputs, config=config))
+
+def test_session_survives_restart(db_path):
+    """Test that a new saver on the same file resumes the full conversation"""
+    saver = SqliteCheckpointSaver(db_path)
+    config = {"configurable": {"thread_id": "session-1"}}
+    _run_turns(create_graph(saver), config, ["answer 0", "answer 1"])
+    saver.close()
+
+    resumed = create_graph(SqliteCheckpointSaver(db_path))
+    messages = resumed.get_state(config).values["messages"]
+    assert [m.content for m in messages] == ["question 0", "answer 0", "question 1", "answer 1"]
+
+def test_messages_are_stored_as_deltas(db_path):
+    """Test that each message is written once, and checkpoints only reference the log"""
+    saver = SqliteCheckpointSaver(db_path)
+    config = {"configurable": {"thread_id": "session-1"}}
+    _run_turns(create_graph(saver), config, ["answer 0", "answer 1", "answer 2"])
+
+    logged = saver.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    assert logged == 6
+
+    types = {r[0] for r in saver.conn.execute("SELECT type FROM blobs WHERE channel='messages'").fetchall()}
+    assert types == {MESSAGE_LOG_REF}
+
+def test_collect_garbage_keeps_latest_state(db_path):
+    """Test that retention drops old checkpoints without losing the current state"""
+    saver = SqliteCheckpointSaver(db_path)
+    config = {"configurable": {"thread_id": "session-1"}}
+    graph = create_graph(saver)
+    _run_turns(graph, config, ["answer 0", "answer 1", "answer 2"])
+
+    before = len(list(saver.list(config)))
+    stats = saver.collect_garbage(keep_last=2)
+
+    assert stats["checkpoints"] == before - 2
+    assert len(list(saver.list(config))) == 2
+    assert len(graph.get_state(config).values["messages"]) == 6
+
+    # Expired sessions are removed entirely
+    saver.collect_garbage(max_age_days=-1)
+    assert saver.list_threads() == []
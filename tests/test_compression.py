@@ -0,0 +1,162 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+import src.compression as compression
+from src.compression import TokenCounter, HistoryLedger, compress_history
+
+class CountingCounter(TokenCounter):
+    """Character-estimate counter that records how often text is tokenized."""
+    def __init__(self):
+        super().__init__()
+        self._encoding_loaded = True  # force the offline estimate
+        self.calls = 0
+
+    def count_text(self, text):
+        self.calls += 1
+        return super().count_text(text)
+
+@pytest.fixture
+def counter(monkeypatch):
+    counter = CountingCounter()
+    monkeypatch.setattr(compression, "_counter", counter)
+    compression._ledgers.clear()
+    compression._truncated.clear()
+    return counter
+
+def _conversation(turns, tool_output="x" * 4000):
+    messages = [HumanMessage(content="Refactor the parser", id="h0")]
+    for i in range(turns):
+        messages.append(AIMessage(content="", id=f"ai{i}", tool_calls=[
+            {"name": "read_file", "args": {"path": f"f{i}.py"}, "id": f"call_{i}"}
+        ]))
+        messages.append(ToolMessage(content=tool_output, tool_call_id=f"call_{i}", name="read_file", id=f"tool{i}"))
+    return messages
+
+def test_history_under_budget_is_unchanged(counter):
+    """Test that a history within budget is passed through as-is"""
+    messages = _conversation(3, tool_output="short")
+    result = compress_history(messages, max_tokens=10000)
+    assert result == messages
+
+def test_ledger_only_counts_appended_messages(counter):
+    """Test that each message is tokenized once across turns"""
+    messages = _conversation(5)
+    ledger = HistoryLedger()
+    ledger.update(messages, counter)
+    calls_after_first = counter.calls
+
+    messages.append(HumanMessage(content="next", id="h1"))
+    ledger.update(messages, counter)
+
+    assert counter.calls == calls_after_first + 1
+    assert len(ledger.counts) == len(messages)
+    assert ledger.total == sum(ledger.counts)
+
+def test_compress_truncates_then_prunes(counter):
+    """Test that old tool outputs are truncated and the oldest turns dropped to fit the budget"""
+    messages = _conversation(20)
+    result = compress_history(messages, max_tokens=3500)
+
+    assert result[0] is messages[0]
+    assert result[-6:] == messages[-6:]
+    assert isinstance(result[1], SystemMessage) and "Pruned" in result[1].content
+    # The kept history never starts with a tool result whose call was dropped
+    assert not isinstance(result[2], ToolMessage)
+    assert any("Output truncated" in str(m.content) for m in result)
+    assert sum(counter.count_message(m) for m in result) <= 3500
+
+def test_token_counter_uses_tokenizer_when_available():
+    """Test counting with the real tokenizer (skipped when the encoding cannot be loaded offline)"""
+    counter = TokenCounter("cl100k_base")
+    if counter._get_encoding() is None:
+        pytest.skip("tiktoken encoding not available")
+    assert counter.count_text("hello world") == 2
+
+def test_token_counter_never_downloads_the_encoding(tmp_path, monkeypatch):
+    """Test that a missing or corrupt vocabulary falls back to the estimate and nothing is fetched or deleted"""
+    if not compression.HAS_TIKTOKEN:
+        pytest.skip("tiktoken not installed")
+    import tiktoken.load
+    fetched = []
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tiktoken.load, "read_file", lambda blobpath: fetched.append(blobpath))
+
+    assert TokenCounter("o200k_base").count_text("x" * 40) == 10
+
+    corrupt = compression.cached_encoding_file("o200k_base", tmp_path)
+    corrupt.write_bytes(b"not a vocabulary")
+    assert TokenCounter("o200k_base").count_text("x" * 40) == 10
+    assert corrupt.read_bytes() == b"not a vocabulary"
+    assert fetched == []
+
+def test_token_counter_builds_encoding_from_local_file(tmp_path, monkeypatch):
+    """Test that a vocabulary with the expected checksum is loaded from the cache directory"""
+    if not compression.HAS_TIKTOKEN:
+        pytest.skip("tiktoken not installed")
+    import base64
+    import hashlib
+    vocabulary = b"".join(base64.b64encode(bytes([i])) + b" %d\n" % i for i in range(256))
+    compression.cached_encoding_file("bytes_only", tmp_path).write_bytes(vocabulary)
+    monkeypatch.setitem(compression.ENCODINGS, "bytes_only", compression.EncodingSpec(
+        hashlib.sha256(vocabulary).hexdigest(), r"\S+|\s+", {"<|endoftext|>": 256}
+    ))
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+
+    assert TokenCounter("bytes_only").count_text("abc de") == 6  # one token per byte
+
+def test_rolling_summary_replaces_pruned_span(counter, monkeypatch):
+    """Test that evicted messages are summarized in the background and reused on the next turn"""
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock
+    from src.compression import RollingSummarizer
+
+    fake_llm = MagicMock()
+    fake_llm.ainvoke = AsyncMock(return_value=AIMessage(content="- read f0.py .. f10.py"))
+    rolling = RollingSummarizer(llm_factory=lambda: fake_llm)
+    monkeypatch.setattr(compression, "summarizer", rolling)
+
+    messages = _conversation(20)
+    first = compress_history(messages, max_tokens=3500)
+    assert "Pruned" in first[1].content
+    fake_llm.ainvoke.assert_not_called()  # never on the critical path
+
+    asyncio.run(rolling.run_pending())
+    fake_llm.ainvoke.assert_called_once()
+    assert rolling.stats["summaries"] == 1
+
+    second = compress_history(messages, max_tokens=3500)
+    assert "Summary of the" in second[1].content
+    assert "- read f0.py .. f10.py" in second[1].content
+
+    # Nothing new was evicted, so the cached summary is reused without another LLM call
+    asyncio.run(rolling.run_pending())
+    fake_llm.ainvoke.assert_called_once()
+
+def test_keep_first_protects_leading_messages(counter):
+    """Test that keep_first keeps e.g. a sub-agent's system prompt and task when pruning"""
+    messages = [SystemMessage(content="You are a sub-agent", id="sys")] + _conversation(20)
+    result = compress_history(messages, max_tokens=3500, keep_first=2, strategy="prune")
+
+    assert result[:2] == messages[:2]
+    assert "Pruned" in result[2].content
+    assert result[-6:] == messages[-6:]
+
+def test_threads_starting_alike_do_not_share_summaries(counter, monkeypatch):
+    """Test that two threads whose first message is the same id-less "hi" keep separate ledgers and summaries"""
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock
+    from langchain_core.runnables import RunnableLambda
+    from src.compression import RollingSummarizer
+
+    fake_llm = MagicMock()
+    fake_llm.ainvoke = AsyncMock(return_value=AIMessage(content="- thread a only"))
+    rolling = RollingSummarizer(llm_factory=lambda: fake_llm)
+    monkeypatch.setattr(compression, "summarizer", rolling)
+
+    messages = [HumanMessage(content="hi")] + _conversation(20)[1:]
+    compress = RunnableLambda(lambda history: compress_history(history, max_tokens=3500))
+    compress.invoke(messages, config={"configurable": {"thread_id": "a"}})
+    asyncio.run(rolling.run_pending())
+
+    assert "- thread a only" in compress.invoke(messages, config={"configurable": {"thread_id": "a"}})[1].content
+    assert "Summary of the" not in compress.invoke(messages, config={"configurable": {"thread_id": "b"}})[1].content
+    assert len(compression._ledgers) == 2
@@ -1,5 +1,5 @@
 import pytest
-from src.tools.editor import apply_diff_patch
+from src.tools.editor import apply_diff_patch, apply_edits
 
 @pytest.fixture
 def editor_test_files(tmp_path, monkeypatch):
@@ -52,3 +52,103 @@ def test_apply_diff_patch_security(editor_test_files):
     """Test path traversal prevention"""
     result = apply_diff_patch.invoke({"path": "../outside.txt", "search_block": "a", "replace_block": "b"})
     assert "Error: Access denied" in result
+
+def test_apply_edits_multiple_hunks_and_files(editor_test_files):
+    """Test that hunks across several files are applied in one call"""
+    (editor_test_files / "other.py").write_text("A = 1\nB = 2\nC = 3\n", encoding="utf-8")
+    hunks = [
+        {"path": "code.py", "search_block": "def hello():", "replace_block": "def greet():"},
+        {"path": "other.py", "search_block": "C = 3\n", "replace_block": "C = 30\n"},
+        {"path": "code.py", "search_block": "    return True\n", "replace_block": "    return False\n"},
+        {"path": "other.py", "search_block": "A = 1\n", "replace_block": "A = 10\nA2 = 11\n"},
+        {"path": "new/module.py", "search_block": "", "replace_block": "X = 1\n"},
+    ]
+    result = apply_edits.invoke({"hunks": hunks})
+    assert result.startswith("Success: Applied 5 hunks to 3 files.")
+    assert "[4] other.py: applied at line 1 (-1 +2 lines)" in result
+
+    assert (editor_test_files / "code.py").read_text(encoding="utf-8") == "def greet():\n    print('hello')\n    return False\n"
+    assert (editor_test_files / "other.py").read_text(encoding="utf-8") == "A = 10\nA2 = 11\nB = 2\nC = 30\n"
+    assert (editor_test_files / "new" / "module.py").read_text(encoding="utf-8") == "X = 1\n"
+    assert not list(editor_test_files.glob("**/*.sf-tmp"))
+
+def test_apply_edits_is_all_or_nothing(editor_test_files):
+    """Test that one failing hunk leaves every file untouched"""
+    (editor_test_files / "other.py").write_text("A = 1\n", encoding="utf-8")
+    hunks = [
+        {"path": "other.py", "search_block": "A = 1", "replace_block": "A = 2"},
+        {"path": "code.py", "search_block": "nonexistent", "replace_block": "x"},
+    ]
+    result = apply_edits.invoke({"hunks": hunks})
+    assert result.startswith("Error: No changes written; 1 of 2 hunks failed.")
+    assert "[2] code.py: FAILED: Search block not found" in result
+    assert (editor_test_files / "other.py").read_text(encoding="utf-8") == "A = 1\n"
+
+def test_apply_edits_unified_diff(editor_test_files):
+    """Test that a git-style unified diff is applied, using line numbers to pick among repeats"""
+    (editor_test_files / "dup.txt").write_text("x\ny\nx\ny\n", encoding="utf-8")
+    diff = (
+        "diff --git a/code.py b/code.py\n"
+        "--- a/code.py\n"
+        "+++ b/code.py\n"
+        "@@ -1,3 +1,3 @@\n"
+        " def hello():\n"
+        "-    print('hello')\n"
+        "+    print('world')\n"
+        "     return True\n"
+        "--- a/dup.txt\n"
+        "+++ b/dup.txt\n"
+        "@@ -3,2 +3,2 @@\n"
+        " x\n"
+        "-y\n"
+        "+z\n"
+    )
+    result = apply_edits.invoke({"diff": diff})
+    assert result.startswith("Success: Applied 2 hunks to 2 files.")
+    assert "print('world')" in (editor_test_files / "code.py").read_text(encoding="utf-8")
+    assert (editor_test_files / "dup.txt").read_text(encoding="utf-8") == "x\ny\nx\nz\n"
+
+def test_apply_edits_rejects_overlapping_hunks(editor_test_files):
+    """Test that hunks touching the same text are refused instead of applied twice"""
+    hunks = [
+        {"path": "code.py", "search_block": "def hello():\n    print('hello')", "replace_block": "a"},
+        {"path": "code.py", "search_block": "print('hello')\n    return", "replace_block": "b"},
+    ]
+    result = apply_edits.invoke({"hunks": hunks})
+    assert "[2] code.py: FAILED: Overlaps hunk 1" in result
+
+def test_apply_diff_patch_tolerates_indentation(editor_test_files):
+    """Test that a block differing only in indentation is applied, re-indented like the file"""
+    search = "print('hello')\nreturn True\n"
+    replace = "print('world')\nreturn False\n"
+
+    result = apply_diff_patch.invoke({"path": "code.py", "search_block": search, "replace_block": replace})
+    assert "whitespace-insensitive match at line 2" in result
+
+    content = (editor_test_files / "code.py").read_text(encoding="utf-8")
+    assert content == "def hello():\n    print('world')\n    return False\n"
+
+def test_apply_diff_patch_near_match(editor_test_files):
+    """Test that a clear near match is applied and a distant one is reported with its location"""
+    test_file = editor_test_files / "long.py"
+    body = "".join(f"    value_{i} = compute_something({i})\n" for i in range(30))
+    test_file.write_text("def build():\n" + body + "    return value_29\n", encoding="utf-8")
+
+    # One character off in a long block: applied
+    search = "".join(f"    value_{i} = compute_something({i})\n" for i in range(10, 16)).replace("(12)", "(12 )")
+    result = apply_diff_patch.invoke({"path": "long.py", "search_block": search, "replace_block": "    pass\n"})
+    assert "fuzzy match" in result
+    assert "value_12" not in test_file.read_text(encoding="utf-8")
+
+    # Too different: not applied, but the closest region is shown with line numbers
+    search = "    value_20 = compute_other(20)\n    value_21 = compute_other(21)\n"
+    result = apply_diff_patch.invoke({"path": "long.py", "search_block": search, "replace_block": "x"})
+    assert result.startswith("Error: Search block not found")
+    assert "Closest match" in result and "at lines 17-18" in result
+
+def test_apply_edits_tolerates_trailing_whitespace(editor_test_files):
+    """Test that batched edits use the same whitespace-tolerant matching"""
+    hunks = [{"path": "code.py", "search_block": "def hello():   \n    print('hello')", "replace_block": "def hi():\n    print('hi')"}]
+    result = apply_edits.invoke({"hunks": hunks})
+    assert "[whitespace-insensitive match]" in result
+    assert (editor_test_files / "code.py").read_text(encoding="utf-8") == "def hi():\n    print('hi')\n    return True\n"
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from src.graph import app_graph, AgentState
 
@@ -10,18 +11,18 @@ def test_graph_initialization():
     """Test that the graph compiles successfully"""
     assert app_graph is not None
 
-@patch("src.graph.get_llm")
-def test_coder_generates_tool_call(mock_get_llm):
+@patch("src.graph.ModelRegistry.get_bound")
+def test_coder_generates_tool_call(mock_get_bound):
     """Test Coder node generating a tool call"""
     # Mock LLM response for Coder
-    mock_llm = MagicMock()
     mock_response = AIMessage(content="", tool_calls=[
         {"name": "list_directory", "args": {"path": "."}, "id": "call_1"}
     ])
-    # IMPORTANT: coder_node calls llm.bind_tools(...).invoke(...)
-    # So we must mock the return value of bind_tools().invoke()
-    mock_llm.bind_tools.return_value.invoke.return_value = mock_response
-    mock_get_llm.return_value = mock_llm
+    # IMPORTANT: coder_node calls ModelRegistry.get_bound(...).ainvoke(...)
+    # So we must mock the return value of get_bound().ainvoke()
+    mock_coder_llm = MagicMock()
+    mock_coder_llm.ainvoke = AsyncMock(return_value=mock_response)
+    mock_get_bound.return_value = mock_coder_llm
 
     # We can't easily run the graph node-by-node without using the compiled app
     # app_graph.invoke() runs the whole flow.
@@ -29,7 +30,7 @@ def test_coder_generates_tool_call(mock_get_llm):
     from src.graph import coder_node
 
     state = {"messages": [HumanMessage(content="List files")], "sender": "user"}
-    result = coder_node(state)
+    result = asyncio.run(coder_node(state))
 
     assert result["sender"] == "coder"
     assert len(result["messages"]) == 1
@@ -2,6 +2,7 @@ from unittest.mock import patch, Mock
 import pytest
 from src.llm import get_llm
 from langchain_openai import AzureChatOpenAI
+from langchain_core.tools import StructuredTool
 
 def test_get_llm_configuration():
     """Test that the LLM is initialized with the correct parameters from settings"""
@@ -23,3 +24,47 @@ def test_get_llm_configuration():
         assert llm.deployment_name == "mock-deployment"
         assert llm.openai_api_version == "2023-05-15"
         assert llm.temperature == 0
+
+def test_model_registry_reuses_client_and_binding():
+    """Test that the registry builds one client and re-binds only when the tool set changes"""
+    from src.llm import ModelRegistry
+
+    settings = Mock()
+    settings.llm_provider = "azure"
+    settings.azure_openai_endpoint = "https://mock.openai.azure.com"
+    settings.azure_openai_deployment_name = "mock-deployment"
+    settings.azure_openai_api_version = "2023-05-15"
+
+    def a(x: int) -> int:
+        """Tool a."""
+        return x
+    tool_a = StructuredTool.from_function(a)
+    tool_b = StructuredTool.from_function(lambda x: x, name="b", description="Tool b.")
+
+    ModelRegistry.reset()
+    try:
+        with patch("src.llm.get_llm") as mock_get_llm:
+            first = ModelRegistry.get_bound([tool_a], settings)
+            second = ModelRegistry.get_bound([tool_a], settings)
+            assert first is second
+            mock_get_llm.assert_called_once()
+            mock_get_llm.return_value.bind_tools.assert_called_once()
+
+            # A new tool set (e.g. MCP reload) triggers a re-bind but keeps the client
+            ModelRegistry.get_bound([tool_a, tool_b], settings)
+            mock_get_llm.assert_called_once()
+            assert mock_get_llm.return_value.bind_tools.call_count == 2
+
+            # Alternating tool sets (coder vs. sub-agents) keep their own bindings
+            ModelRegistry.get_bound([tool_a], settings)
+            ModelRegistry.get_bound([tool_a, tool_b], settings)
+            assert mock_get_llm.return_value.bind_tools.call_count == 2
+
+            # Rebuilt tools (MCP reload) with the same schema keep the binding; a changed schema re-binds
+            ModelRegistry.get_bound([StructuredTool.from_function(a)], settings)
+            assert mock_get_llm.return_value.bind_tools.call_count == 2
+            changed = StructuredTool.from_function(a, description="Tool a, now with more options.")
+            ModelRegistry.get_bound([changed], settings)
+            assert mock_get_llm.return_value.bind_tools.call_count == 3
+    finally:
+        ModelRegistry.reset()
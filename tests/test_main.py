@@ -47,3 +47,30 @@ def test_chat_command_exit():
         result = runner.invoke(app, ["chat"])
         assert result.exit_code == 0
         assert "Goodbye!" in result.output
+
+def test_run_interaction_streams_coder_tokens():
+    """Test that coder tokens are consumed from the message stream and the final message is rendered"""
+    import asyncio
+    from io import StringIO
+    from rich.console import Console
+    from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+    from src.main import _run_interaction
+
+    async def fake_astream(inputs, config=None, stream_mode=None):
+        assert "messages" in stream_mode
+        for token in ["Hel", "lo ", "there"]:
+            yield ("messages", (AIMessageChunk(content=token), {"langgraph_node": "coder"}))
+        # Tokens from other nodes (e.g. a sub-agent inside 'tools') are not shown live
+        yield ("messages", (AIMessageChunk(content="ignored"), {"langgraph_node": "tools"}))
+        yield ("updates", {"coder": {"messages": [AIMessage(content="Hello there")], "sender": "coder"}})
+
+    fake_graph = Mock()
+    fake_graph.astream = fake_astream
+    fake_graph.get_state.return_value = Mock(next=())
+    output = StringIO()
+
+    with patch("src.main.app_graph", fake_graph), patch("src.main.console", Console(file=output, width=80)):
+        asyncio.run(_run_interaction({"messages": [HumanMessage(content="hi")]}, {"configurable": {"thread_id": "t"}}))
+
+    assert "[Coder] Hello there" in output.getvalue()
+    assert "ignored" not in output.getvalue()
@@ -41,3 +41,144 @@ def test_load_mcp_no_config(tmp_path, monkeypatch):
 
     tools = load_mcp_tools()
     assert tools == []
+
+FAKE_SERVER = '''
+import os
+import time
+from mcp.server.fastmcp import FastMCP
+
+time.sleep(float(os.environ.get("FAKE_DELAY", "0")))  # simulate a slow-starting driver
+mcp = FastMCP("fake")
+
+@mcp.tool()
+def add(a: int, b: int) -> str:
+    """Add two numbers."""
+    return str(a + b)
+
+@mcp.tool()
+def crash() -> str:
+    """Kill the server process."""
+    os._exit(1)
+
+mcp.run()
+'''
+
+def _write_servers(tmp_path, names, lazy=False, delay=0):
+    import sys
+    script = tmp_path / "fake_server.py"
+    script.write_text(FAKE_SERVER, encoding="utf-8")
+    servers = {
+        name: {"command": sys.executable, "args": [str(script)], "lazy": lazy, "env": {"FAKE_DELAY": str(delay)}}
+        for name in names
+    }
+    (tmp_path / "sf_mcp_config.json").write_text(json.dumps({"mcpServers": servers}), encoding="utf-8")
+
+def test_servers_start_concurrently(tmp_path, monkeypatch):
+    """Test that startup is bounded by the slowest server and tools are callable"""
+    import asyncio
+    import time
+    from src.mcp_loader import MCPManager
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    _write_servers(tmp_path, ["one", "two", "three"], delay=2)
+
+    async def run():
+        start = time.perf_counter()
+        tools = await MCPManager.initialize()
+        elapsed = time.perf_counter() - start
+        try:
+            result = await tools[0].ainvoke({"a": 2, "b": 3})
+        finally:
+            await MCPManager.cleanup()
+        return tools, elapsed, result
+
+    tools, elapsed, result = asyncio.run(run())
+    assert [t.name for t in tools] == ["add", "crash"] * 3
+    assert result == "5"
+    assert elapsed < 3 * 2  # the three 2s startups overlap
+
+def test_lazy_server_uses_schema_cache(tmp_path, monkeypatch):
+    """Test that a lazy server with a warm cache is only spawned on first tool call"""
+    import asyncio
+    from src.mcp_loader import MCPManager
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    _write_servers(tmp_path, ["vision"], lazy=True)
+
+    async def run():
+        # Cold cache: the server is started once to list its tools
+        await MCPManager.initialize()
+        await MCPManager.cleanup()
+
+        # Warm cache: nothing is spawned until the tool is used
+        tools = await MCPManager.initialize()
+        spawned_at_startup = MCPManager._servers["vision"].is_running
+        try:
+            result = await tools[0].ainvoke({"a": 1, "b": 1})
+            spawned_after_call = MCPManager._servers["vision"].is_running
+        finally:
+            await MCPManager.cleanup()
+        return spawned_at_startup, result, spawned_after_call
+
+    spawned_at_startup, result, spawned_after_call = asyncio.run(run())
+    assert not spawned_at_startup
+    assert result == "2"
+    assert spawned_after_call
+
+def test_lazy_server_refreshes_stale_schema_cache(tmp_path, monkeypatch):
+    """Test that the first real start of a lazy server re-saves its schemas and re-binds changed tools"""
+    import asyncio
+    from src.mcp_loader import MCPManager
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    _write_servers(tmp_path, ["vision"], lazy=True)
+
+    async def run():
+        await MCPManager.initialize()
+        await MCPManager.cleanup()
+
+        # Simulate a cache written by an older version of the server
+        cache_file = next((tmp_path / ".sf" / "cache" / "mcp").glob("*.json"))
+        stale = [spec for spec in json.loads(cache_file.read_text(encoding="utf-8")) if spec["name"] == "add"]
+        stale.append({"name": "removed_tool", "description": "", "inputSchema": {"type": "object", "properties": {}}, "annotations": {}})
+        cache_file.write_text(json.dumps(stale), encoding="utf-8")
+
+        tools = await MCPManager.initialize()
+        cached_names = [t.name for t in tools]
+        try:
+            await tools[0].ainvoke({"a": 1, "b": 1})
+            current_names = [t.name for t in MCPManager.get_tools()]
+        finally:
+            await MCPManager.cleanup()
+        saved_names = [spec["name"] for spec in json.loads(cache_file.read_text(encoding="utf-8"))]
+        return cached_names, current_names, saved_names
+
+    cached_names, current_names, saved_names = asyncio.run(run())
+    assert cached_names == ["add", "removed_tool"]
+    assert current_names == ["add", "crash"]
+    assert saved_names == ["add", "crash"]
+
+def test_crashed_server_is_reconnected(tmp_path, monkeypatch):
+    """Test that a server that dies is restarted transparently and its stats are tracked"""
+    import asyncio
+    from src.mcp_loader import MCPManager
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    _write_servers(tmp_path, ["flaky"])
+
+    async def run():
+        tools = {t.name: t for t in await MCPManager.initialize()}
+        try:
+            crashed = await tools["crash"].ainvoke({})
+            # The supervisor would notice within SF_MCP_HEALTH_INTERVAL; drive a check directly
+            server = MCPManager._servers["flaky"]
+            await server.check_health()
+            result = await tools["add"].ainvoke({"a": 2, "b": 2})
+            stats = MCPManager.get_stats()["flaky"]
+        finally:
+            await MCPManager.cleanup()
+        return crashed, result, stats
+
+    crashed, result, stats = asyncio.run(run())
+    assert crashed.startswith("Error")
+    assert result == "4"
+    assert stats["status"] == "up"
+    assert stats["restarts"] >= 1
+    assert stats["calls"] == 2
+    assert stats["errors"] == 1
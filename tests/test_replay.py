@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_openai import AzureChatOpenAI
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.llm import ModelRegistry, get_llm
+from src.replay import Latency, ReplayChatModel, ReplayScript, script_from_messages
+from src.replay_server import ReplayServer
+
+SCRIPT = {
+    "responses": [
+        {"content": "Reading it.", "tool_calls": [{"name": "read_file", "args": {"path": "a.py"}}]},
+        {"when": "Research Sub-Agent", "content": "Findings.", "repeat": True},
+        {"content": "a.py defines entry()."},
+    ]
+}
+
+@pytest.fixture
+def script_file(tmp_path):
+    path = tmp_path / "replay.json"
+    path.write_text(json.dumps(SCRIPT), encoding="utf-8")
+    return path
+
+def _replay_settings(script_file, latency="none"):
+    settings = Mock()
+    settings.llm_provider = "replay"
+    settings.llm_replay_script = str(script_file)
+    settings.llm_replay_latency = latency
+    return settings
+
+def test_get_llm_replay(script_file):
+    """Test that LLM_PROVIDER=replay builds the scripted model with the chosen latency profile"""
+    llm = get_llm(_replay_settings(script_file, "fast"))
+    assert isinstance(llm, ReplayChatModel)
+    assert llm.latency.first_token == 0.05
+    with pytest.raises(ValueError, match="Unknown replay latency profile"):
+        get_llm(_replay_settings(script_file, "warp"))
+
+def test_script_order_when_and_repeat():
+    """Test that responses are served once in order, `when` ones only to matching prompts"""
+    script = ReplayScript(SCRIPT["responses"])
+    first = script.next_response("system", "hi")
+    assert first["tool_calls"] == [{"name": "read_file", "args": {"path": "a.py"}, "id": "call_replay_1"}]
+    for _ in range(2):
+        assert script.next_response("You are a Research Sub-Agent.", "q")["content"] == "Findings."
+    assert script.next_response("system", "next")["content"] == "a.py defines entry()."
+    assert script.next_response("system", "more")["content"] == "Done."
+
+def test_streaming_chunks_and_tool_calls():
+    """Test that streamed chunks add up to the scripted message, tool calls and usage included"""
+    model = ReplayChatModel(script=ReplayScript(SCRIPT["responses"][:1] + [{"content": "x" * 40}]),
+                            latency=Latency(0.0, 0.0, chunk_chars=4))
+
+    async def collect():
+        return [chunk async for chunk in model.astream([HumanMessage("hi")])]
+
+    chunks = asyncio.run(collect())
+    assert len([c for c in chunks if c.content]) == 3  # "Read", "ing ", "it."
+    message = chunks[0]
+    for chunk in chunks[1:]:
+        message = message + chunk
+    assert message.content == "Reading it."
+    assert message.tool_calls[0]["name"] == "read_file"
+    assert message.tool_calls[0]["args"] == {"path": "a.py"}
+    assert message.usage_metadata["input_tokens"] > 0
+
+    # Latency is per completion: first token plus one gap per further chunk
+    model.latency = Latency(0.05, 0.01, chunk_chars=4)
+    start = time.perf_counter()
+    assert model.invoke([HumanMessage("again")]).content == "x" * 40
+    assert time.perf_counter() - start >= 0.05 + 9 * 0.01
+
+def test_graph_runs_on_replay(script_file, tmp_path, monkeypatch):
+    """Test that a whole coder turn (tool call, tool result, answer) runs offline"""
+    from src.graph import create_graph
+
+    (tmp_path / "a.py").write_text("def entry():\n    pass\n", encoding="utf-8")
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    ModelRegistry.reset()
+    with patch("src.llm.get_cached_settings", return_value=_replay_settings(script_file)):
+        graph = create_graph(MemorySaver())
+        config = {"configurable": {"thread_id": "replay"}}
+
+        async def run():
+            await graph.ainvoke({"messages": [HumanMessage("What is in a.py?")]}, config)
+            # Approve the tool calls, as the CLI does after the interrupt
+            while graph.get_state(config).next:
+                await graph.ainvoke(None, config)
+
+        asyncio.run(run())
+    ModelRegistry.reset()
+
+    messages = graph.get_state(config).values["messages"]
+    tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+    assert len(tool_results) == 1 and "def entry" in tool_results[0].content
+    assert messages[-1].content == "a.py defines entry()."
+
+    # ... and the session can be recorded back into a script
+    recorded = script_from_messages(messages)["responses"]
+    assert recorded[0] == {"content": "Reading it.", "tool_calls": [{"name": "read_file", "args": {"path": "a.py"}}]}
+    assert recorded[-1] == {"content": "a.py defines entry()."}
+
+@pytest.fixture
+def server():
+    server = ReplayServer(("127.0.0.1", 0), ReplayScript(SCRIPT["responses"]), Latency(0.0, 0.0, chunk_chars=4))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _azure_client(server):
+    return AzureChatOpenAI(azure_endpoint=server.url, api_key="replay", azure_deployment="gpt-replay",
+                           api_version="2024-02-01", max_retries=0)
+
+def test_server_speaks_openai_protocol(server):
+    """Test that an unmodified Azure client gets scripted tool calls and answers from the server"""
+    llm = _azure_client(server).bind_tools([{"type": "function", "function": {
+        "name": "read_file", "parameters": {"type": "object", "properties": {"path": {"type": "string"}}}}}])
+
+    first = llm.invoke([HumanMessage("What is in a.py?")])
+    assert first.content == "Reading it."
+    assert first.tool_calls[0]["name"] == "read_file" and first.tool_calls[0]["args"] == {"path": "a.py"}
+
+    chunks = list(llm.stream([HumanMessage("What is in a.py?"), first,
+                              ToolMessage("def entry(): pass", tool_call_id=first.tool_calls[0]["id"])]))
+    assert len(chunks) > 2
+    message = chunks[0]
+    for chunk in chunks[1:]:
+        message = message + chunk
+    assert message.content == "a.py defines entry()."
+    assert server.script.served == 2
@@ -0,0 +1,87 @@
+import pytest
+from src.tools.retrieval import RetrievalIndex, chunk_source, retrieve_code, tokenize
+import src.tools.retrieval as retrieval
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    Setup a small project for the retrieval index.
+    """
+    (tmp_path / "net").mkdir()
+    (tmp_path / "net" / "client.py").write_text(
+        "import time\n\n"
+        "class HttpClient:\n"
+        "    def send_request(self, url):\n"
+        "        return self.retry_with_backoff(lambda: fetch(url))\n\n"
+        "    def retry_with_backoff(self, call, attempts=5):\n"
+        "        delay = 1\n"
+        "        for _ in range(attempts):\n"
+        "            time.sleep(delay)\n"
+        "            delay *= 2\n",
+        encoding="utf-8"
+    )
+    (tmp_path / "net" / "parser.py").write_text(
+        "def parseHeaderLine(line):\n"
+        "    name, _, value = line.partition(':')\n"
+        "    return name.strip(), value.strip()\n",
+        encoding="utf-8"
+    )
+    (tmp_path / "README.txt").write_text("Nothing about networking here.\n", encoding="utf-8")
+
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(retrieval, "REFRESH_INTERVAL", 0)
+    yield tmp_path
+    retrieval._indexes.clear()
+
+def test_tokenize_splits_identifiers():
+    """Test that camelCase and snake_case identifiers are indexed whole and by part"""
+    assert tokenize("parseHTTPHeader(max_retry_count)") == [
+        "parsehttpheader", "parse", "http", "header", "max_retry_count", "max", "retry", "count"
+    ]
+
+def test_chunks_follow_functions(project):
+    """Test that files are chunked at function and method boundaries"""
+    source = (project / "net" / "client.py").read_bytes()
+    chunks = chunk_source("net/client.py", source)
+    assert [(c.start_line, c.end_line, c.title) for c in chunks] == [
+        (1, 3, ""),
+        (4, 5, "HttpClient.send_request"),
+        (6, 6, ""),
+        (7, 11, "HttpClient.retry_with_backoff"),
+    ]
+
+def test_retrieve_code_ranks_relevant_chunks(project):
+    """Test that a natural-language question finds the matching method with its line range"""
+    result = retrieve_code.invoke({"query": "how are requests retried with exponential backoff?", "top_k": 1})
+    assert result.startswith("[1] net/client.py:7-11  HttpClient.retry_with_backoff")
+    assert "    9|         for _ in range(attempts):" in result
+
+    result = retrieve_code.invoke({"query": "parse header line"})
+    assert result.startswith("[1] net/parser.py:1-3  parseHeaderLine")
+
+    assert "No code found" in retrieve_code.invoke({"query": "backoff", "path": "docs"})
+
+def test_path_filter_keeps_dot_directories(project):
+    """Test that a path filter on a dot-directory (.github) is not stripped of its dot"""
+    (project / ".github").mkdir()
+    (project / ".github" / "release.py").write_text("def publish_release_notes():\n    pass\n", encoding="utf-8")
+
+    result = retrieve_code.invoke({"query": "publish release notes", "path": ".github"})
+    assert result.startswith("[1] .github/release.py:1-2  publish_release_notes")
+    assert retrieve_code.invoke({"query": "publish release notes", "path": "."}).startswith("[1] .github/release.py")
+
+def test_index_is_persisted_and_updated_incrementally(project):
+    """Test that only changed files are re-indexed, across index instances"""
+    store = project / ".sf" / "cache" / "retrieval.npz"
+    index = RetrievalIndex(project, store)
+    assert index.refresh(force=True) == {"indexed": 3, "removed": 0}
+    assert store.exists()
+
+    (project / "net" / "parser.py").write_text("def parse_cookie(text):\n    return text.split(';')\n", encoding="utf-8")
+    (project / "README.txt").unlink()
+
+    reopened = RetrievalIndex(project, store)
+    assert reopened.refresh(force=True) == {"indexed": 1, "removed": 1}
+    assert reopened.search("cookie")[0][1:4] == ("net/parser.py", 1, 2)
+    assert reopened.search("header line") == []
+    assert reopened.search("backoff")[0][1] == "net/client.py"
@@ -0,0 +1,97 @@
+import pytest
+from src.tools.search import search_code, ContentCache
+from src.tools.filesystem import list_directory
+from src.tools.walker import parse_gitignore, is_ignored
+import src.tools.search as search
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    Setup a small project with ignore rules.
+    """
+    (tmp_path / ".gitignore").write_text("*.log\nbuild/\n!keep.log\n", encoding="utf-8")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("import os\n\ndef main():\n    print('TODO: wire up')\n    return 0\n", encoding="utf-8")
+    (tmp_path / "src" / "util.py").write_text("def helper():\n    # todo later\n    pass\n", encoding="utf-8")
+    (tmp_path / "src" / ".gitignore").write_text("generated_*.py\n", encoding="utf-8")
+    (tmp_path / "src" / "generated_api.py").write_text("TODO = 1\n", encoding="utf-8")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.py").write_text("TODO = 2\n", encoding="utf-8")
+    (tmp_path / "debug.log").write_text("TODO in a log\n", encoding="utf-8")
+    (tmp_path / "keep.log").write_text("TODO kept\n", encoding="utf-8")
+    (tmp_path / "image.bin").write_bytes(b"\0\0TODO\0")
+
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(search, "_content_cache", ContentCache())
+    return tmp_path
+
+def test_gitignore_rules():
+    """Test glob, anchoring, directory-only and negated patterns"""
+    chain = (("", tuple(parse_gitignore("*.pyc\n/dist\ndocs/**/*.tmp\ncache/\n!important.pyc\n"))),)
+    assert is_ignored("a/b/c.pyc", False, chain)
+    assert not is_ignored("a/important.pyc", False, chain)
+    assert is_ignored("dist", True, chain)
+    assert not is_ignored("src/dist", True, chain)
+    assert is_ignored("docs/x/y/z.tmp", False, chain)
+    assert is_ignored("lib/cache", True, chain)
+    assert not is_ignored("lib/cache", False, chain)
+
+def test_search_code_respects_gitignore(repo):
+    """Test literal search across the tree, skipping ignored and binary files"""
+    result = search_code.invoke({"pattern": "TODO"})
+    assert result.splitlines() == [
+        "keep.log:1: TODO kept",
+        "src/app.py:4:     print('TODO: wire up')",
+        "[2 matches in 2 files]",
+    ]
+
+def test_search_code_regex_context_and_cap(repo):
+    """Test regex, case-insensitive matching, context lines and the result cap"""
+    result = search_code.invoke({"pattern": r"^def \w+", "regex": True, "glob": "*.py", "context_lines": 1})
+    assert "src/app.py-2- " in result
+    assert "src/app.py:3: def main():" in result
+    assert "src/util.py:1: def helper():" in result
+
+    capped = search_code.invoke({"pattern": "todo", "ignore_case": True, "max_results": 1})
+    assert capped.splitlines()[-1] == "[1 matches in 1 files; stopped at max_results=1]"
+
+def test_search_code_uses_content_cache(repo):
+    """Test that a repeated search is served from memory, and edits are picked up"""
+    search_code.invoke({"pattern": "helper"})
+    cache = search.get_content_cache()
+    misses = cache.stats["misses"]
+    search_code.invoke({"pattern": "helper"})
+    assert cache.stats["misses"] == misses
+
+    (repo / "src" / "util.py").write_text("def renamed_helper():\n    pass\n", encoding="utf-8")
+    assert "renamed_helper" in search_code.invoke({"pattern": "helper"})
+
+def test_list_directory_recursive(repo):
+    """Test depth-limited recursive listing with ignore-rule pruning"""
+    assert list_directory.invoke({"path": "."}).splitlines() == [
+        "[DIR]  src",
+        "[FILE] .gitignore",
+        "[FILE] image.bin",
+        "[FILE] keep.log",
+    ]
+    result = list_directory.invoke({"path": ".", "depth": 2})
+    assert "[FILE] src/app.py" in result
+    assert "generated_api.py" not in result and "build" not in result
+    assert list_directory.invoke({"path": "src", "depth": 3}).splitlines() == [
+        "[FILE] .gitignore",
+        "[FILE] app.py",
+        "[FILE] util.py",
+    ]
+
+def test_build_directory_names_are_only_pruned_in_listings(repo):
+    """Test that bin/ sources are searched, while listings mark it instead of expanding it"""
+    (repo / "src" / "bin").mkdir()
+    (repo / "src" / "bin" / "cli.rs").write_text("// TODO: parse args\n", encoding="utf-8")
+    (repo / "node_modules").mkdir()
+
+    assert "src/bin/cli.rs:1" in search_code.invoke({"pattern": "parse args"})
+    result = list_directory.invoke({"path": ".", "depth": 3}).splitlines()
+    assert "[DIR]  src/bin (not expanded; list it directly)" in result
+    assert "[DIR]  node_modules (not expanded; list it directly)" in result
+    assert "[FILE] src/bin/cli.rs" not in result
+    assert list_directory.invoke({"path": "src/bin"}).splitlines() == ["[FILE] cli.rs"]
@@ -0,0 +1,103 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from langchain_core.messages import AIMessage, HumanMessage
+from src.tools.subagent import delegate_research, FileReadCache
+from src.tool_executor import execute_tool_calls
+import src.tools.subagent as subagent
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    (tmp_path / "a.py").write_text("def entry():\n    pass\n", encoding="utf-8")
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(subagent, "read_cache", FileReadCache())
+    return tmp_path
+
+def _fake_llm(delay=0.5):
+    """Each sub-agent reads a.py on its first turn, then answers."""
+    async def respond(messages):
+        await asyncio.sleep(delay)
+        if isinstance(messages[-1], HumanMessage):
+            return AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.py"}, "id": f"call_{id(messages)}"}])
+        return AIMessage(content=f"entry() found: {'def entry' in messages[-1].content}")
+    llm = MagicMock()
+    llm.ainvoke = respond
+    return llm
+
+def test_research_tasks_run_concurrently(project):
+    """Test that two delegate_research calls in one turn overlap instead of running back to back"""
+    calls = [
+        {"name": "delegate_research", "args": {"task_description": f"question {i}"}, "id": f"call_{i}"}
+        for i in range(2)
+    ]
+    with patch("src.tools.subagent.ModelRegistry.get_bound", return_value=_fake_llm()):
+        start = time.perf_counter()
+        results = asyncio.run(execute_tool_calls(calls, {"delegate_research": delegate_research}))
+        elapsed = time.perf_counter() - start
+
+    for result in results:
+        assert result.content.startswith("Research Findings:\nentry() found: True\n")
+        assert "status=completed, turns=2, tool_calls=1" in result.content
+    assert elapsed < 1.8  # two sequential runs would take 2 x (2 turns x 0.5s)
+
+def test_file_reads_are_shared_between_sub_agents(project):
+    """Test that a file read by one sub-agent is served from the session cache to the next"""
+    with patch("src.tools.subagent.ModelRegistry.get_bound", return_value=_fake_llm(delay=0)):
+        delegate_research.invoke({"task_description": "first"})
+        delegate_research.invoke({"task_description": "second"})
+    assert subagent.read_cache.stats == {"hits": 1, "misses": 1}
+
+    # A modified file is read again
+    (project / "a.py").write_text("def entry():\n    return 1\n", encoding="utf-8")
+    with patch("src.tools.subagent.ModelRegistry.get_bound", return_value=_fake_llm(delay=0)):
+        delegate_research.invoke({"task_description": "third"})
+    assert subagent.read_cache.stats["misses"] == 2
+
+def _looping_llm(delay=0.0):
+    """A sub-agent that never stops searching."""
+    async def respond(messages):
+        await asyncio.sleep(delay)
+        return AIMessage(content="still looking", tool_calls=[
+            {"name": "read_file", "args": {"path": "a.py"}, "id": f"call_{len(messages)}_{i}"} for i in range(3)
+        ])
+    llm = MagicMock()
+    llm.ainvoke = respond
+    return llm
+
+def test_tool_budget_forces_final_answer(project):
+    """Test that running out of tool calls refuses the excess calls and asks for a final answer"""
+    from src.tools.subagent import run_research, ResearchBudget
+    wrap_up = MagicMock()
+    wrap_up.ainvoke = MagicMock(side_effect=lambda prompt: asyncio.sleep(0, result=AIMessage(content="entry() is in a.py")))
+    budget = ResearchBudget(max_tokens=100000, timeout=30, max_tool_calls=4, max_turns=10, context_tokens=8000)
+
+    with patch("src.tools.subagent.ModelRegistry.get_bound", return_value=_looping_llm()), \
+         patch("src.tools.subagent.ModelRegistry.get_client", return_value=wrap_up):
+        result = asyncio.run(run_research("where is entry?", budget))
+
+    assert result.status == "tool_budget"
+    assert result.tool_calls == 4
+    assert result.turns == 3  # two tool turns + the wrap-up
+    assert result.findings == "entry() is in a.py"
+    prompt = wrap_up.ainvoke.call_args[0][0]
+    assert "budget is used up" in prompt[-1].content
+    assert sum("Tool-call budget exhausted" in str(m.content) for m in prompt) == 2
+
+def test_time_budget_returns_partial_findings(project):
+    """Test that the wall-clock budget stops a slow sub-agent with what it has so far"""
+    from src.tools.subagent import run_research, ResearchBudget
+    budget = ResearchBudget(max_tokens=100000, timeout=0.5, max_tool_calls=100, max_turns=100, context_tokens=8000)
+
+    with patch("src.tools.subagent.ModelRegistry.get_bound", return_value=_looping_llm(delay=0.2)):
+        result = asyncio.run(run_research("where is entry?", budget))
+
+    assert result.status == "time_budget"
+    assert result.elapsed < 1.5
+    assert "still looking" in result.findings
+
+def test_subagent_tools_are_all_read_only():
+    """Test that sub-agents only get read-only tools, since delegate_research is scheduled as read-only"""
+    assert delegate_research.metadata["read_only"]
+    for tool in subagent.SUBAGENT_TOOLS:
+        assert (tool.metadata or {}).get("read_only"), tool.name
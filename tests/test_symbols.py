@@ -0,0 +1,98 @@
+import pytest
+from src.tools.symbols import SymbolIndex, find_definition, find_references, search_symbols
+import src.tools.symbols as symbols
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    Setup a small project for the symbol index.
+    """
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "models.py").write_text(
+        "LIMIT = 10\n\nclass Base:\n    pass\n\nclass User(Base):\n    def save(self):\n        return validate(self)\n",
+        encoding="utf-8"
+    )
+    (tmp_path / "pkg" / "utils.py").write_text(
+        "from pkg.models import User\n\ndef validate(obj):\n    return True\n\ndef make_user():\n    return User()\n",
+        encoding="utf-8"
+    )
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "vendored.py").write_text("def validate():\n    pass\n", encoding="utf-8")
+
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(symbols, "REFRESH_INTERVAL", 0)
+    yield tmp_path
+    for index in symbols._indexes.values():
+        index.close()
+    symbols._indexes.clear()
+
+def test_find_definition(project):
+    """Test locating definitions, qualified by class, while skipping ignored directories"""
+    assert find_definition.invoke({"name": "validate"}) == "pkg/utils.py:3  function validate"
+    assert find_definition.invoke({"name": "User.save"}) == "pkg/models.py:7  function save (in User)"
+    assert "No definition found" in find_definition.invoke({"name": "missing"})
+
+def test_find_references(project):
+    """Test that calls, imports and base classes are reported with their source line"""
+    result = find_references.invoke({"name": "User"})
+    assert "pkg/utils.py:1: from pkg.models import User" in result
+    assert "pkg/utils.py:7: return User()" in result
+
+    assert find_references.invoke({"name": "Base"}) == "pkg/models.py:6: class User(Base):"
+
+def test_search_symbols_ranks_exact_matches_first(project):
+    """Test partial matching and kind filtering"""
+    result = search_symbols.invoke({"query": "user"}).splitlines()
+    assert result[0] == "pkg/models.py:6  class User"
+    assert "function make_user" in result[1]
+    assert search_symbols.invoke({"query": "LIM", "kind": "variable"}) == "pkg/models.py:1  variable LIMIT"
+
+def test_index_updates_incrementally(project):
+    """Test that only changed files are re-indexed and deleted files disappear"""
+    index = SymbolIndex(project, project / ".sf" / "cache" / "symbols.sqlite")
+    assert index.refresh(force=True) == {"indexed": 2, "removed": 0}
+    assert index.refresh(force=True) == {"indexed": 0, "removed": 0}
+
+    (project / "pkg" / "utils.py").write_text("def validate_all(items):\n    pass\n", encoding="utf-8")
+    (project / "pkg" / "models.py").unlink()
+    assert index.refresh(force=True) == {"indexed": 1, "removed": 1}
+    assert [row[0] for row in index.search("validate")] == ["validate_all"]
+    assert index.references("User") == []
+    index.close()
+
+def test_other_languages_are_indexed(project):
+    """Test that C#, TypeScript and C++ definitions and references are found, not just Python"""
+    (project / "src").mkdir()
+    (project / "src" / "Orders.cs").write_text(
+        "namespace Shop {\n  class OrderService : ServiceBase {\n    public void Submit() { Validate(); }\n  }\n}\n",
+        encoding="utf-8"
+    )
+    (project / "src" / "cart.ts").write_text(
+        "import { Submit } from './api';\nexport class Cart {\n  checkout() { return Submit(); }\n}\n",
+        encoding="utf-8"
+    )
+    (project / "src" / "engine.cpp").write_text(
+        "class Engine {\n  void start() { ignite(); }\n};\nvoid ignite() {}\n",
+        encoding="utf-8"
+    )
+
+    assert find_definition.invoke({"name": "OrderService.Submit"}) == "src/Orders.cs:3  function Submit (in Shop.OrderService)"
+    assert find_definition.invoke({"name": "Cart.checkout"}) == "src/cart.ts:3  function checkout (in Cart)"
+    assert find_definition.invoke({"name": "ignite"}) == "src/engine.cpp:4  function ignite"
+    assert find_definition.invoke({"name": "Engine.start"}) == "src/engine.cpp:2  function start (in Engine)"
+
+    references = find_references.invoke({"name": "Submit"})
+    assert "src/cart.ts:1: import { Submit } from './api';" in references
+    assert "src/cart.ts:3: checkout() { return Submit(); }" in references
+    assert find_references.invoke({"name": "ServiceBase"}) == "src/Orders.cs:2: class OrderService : ServiceBase {"
+    assert find_references.invoke({"name": "ignite"}) == "src/engine.cpp:2: void start() { ignite(); }"
+
+    # Files of languages without a symbol query are skipped, and the miss says so
+    (project / "src" / "tasks.rb").write_text("def checkout_all\nend\n", encoding="utf-8")
+    assert "use search_code for other languages" in find_definition.invoke({"name": "checkout_all"})
+
+def test_tools_report_missing_query_api(project, monkeypatch):
+    """Test that an older tree-sitter without QueryCursor makes the tools say so instead of failing to import"""
+    monkeypatch.setattr(symbols, "QueryCursor", None)
+    assert "symbol index unavailable" in find_definition.invoke({"name": "validate"})
+    assert "symbol index unavailable" in search_symbols.invoke({"query": "user"})
@@ -0,0 +1,105 @@
+import json
+import pytest
+import src.task_manager as task_manager
+from src.task_manager import task_create, task_complete, task_add_dependencies, task_list, task_next, get_task_store, plan_tasks
+
+@pytest.fixture
+def task_file(tmp_path, monkeypatch):
+    path = tmp_path / ".sf" / "tasks.json"
+    monkeypatch.setattr(task_manager, "TASK_FILE", path)
+    monkeypatch.setattr(task_manager, "_stores", {})
+    return path
+
+def _ids(output):
+    return output.split(": ", 1)[1].split(" - ")[0]
+
+def test_completing_unblocks_dependents(task_file):
+    """Test that a task becomes pending once all of its dependencies are done"""
+    a = _ids(task_create.invoke({"title": "schema"}))
+    b = _ids(task_create.invoke({"title": "api"}))
+    c = _ids(task_create.invoke({"title": "ui", "dependencies": [a, b]}))
+
+    assert "Unblocked" not in task_complete.invoke({"task_id": a})
+    assert f"Unblocked tasks: ['{c}']" in task_complete.invoke({"task_id": b})
+    assert f"[ ] [{c}] ui - PENDING" in task_list.invoke({})
+
+def test_invalid_dependency_is_rejected(task_file):
+    """Test that unknown dependency ids are rejected and nothing is written"""
+    assert "Dependency task IDs not found" in task_create.invoke({"title": "x", "dependencies": ["nope"]})
+    assert task_list.invoke({}) == "No tasks found."
+
+def test_store_is_written_atomically_and_reloaded_on_change(task_file):
+    """Test that the file stays valid JSON and external changes are picked up"""
+    a = _ids(task_create.invoke({"title": "first"}))
+    data = json.loads(task_file.read_text(encoding="utf-8"))
+    assert [t["id"] for t in data["tasks"]] == [a]
+    assert not list(task_file.parent.glob("*.tmp"))
+
+    # Another CLI instance adds a task behind our back
+    data["tasks"].append({"id": "ext00001", "title": "external", "status": "pending", "dependencies": [], "notes": None})
+    task_file.write_text(json.dumps(data), encoding="utf-8")
+    assert "external" in task_list.invoke({})
+
+    # Our in-memory index is not re-parsed when nothing changed
+    store = get_task_store()
+    tasks_before = store.tasks
+    task_list.invoke({})
+    assert store.tasks is tasks_before
+
+def test_dependency_cycles_are_rejected(task_file):
+    """Test that a dependency closing a cycle is refused and leaves the store unchanged"""
+    a = _ids(task_create.invoke({"title": "a"}))
+    b = _ids(task_create.invoke({"title": "b", "dependencies": [a]}))
+    c = _ids(task_create.invoke({"title": "c", "dependencies": [b]}))
+
+    with pytest.raises(ValueError, match=f"cycle: {a} -> {c} -> {b} -> {a}"):
+        with get_task_store().transaction() as store:
+            store.add_dependencies(a, [c])
+    assert get_task_store().tasks[a].dependencies == []
+
+    with get_task_store().transaction() as store:
+        store.add_dependencies(c, [a])
+    assert get_task_store().tasks[c].dependencies == [b, a]
+
+def test_dependencies_can_be_added_through_the_tool(task_file):
+    """Test that an existing task can be made to wait for another, but not into a cycle"""
+    a = _ids(task_create.invoke({"title": "a"}))
+    b = _ids(task_create.invoke({"title": "b"}))
+
+    assert task_add_dependencies.invoke({"task_id": b, "dependencies": [a]}) == f"Task {b} now depends on ['{a}'] (BLOCKED)."
+    assert "Dependency would create a cycle" in task_add_dependencies.invoke({"task_id": a, "dependencies": [b]})
+    assert "not found" in task_add_dependencies.invoke({"task_id": "nope", "dependencies": [a]})
+    assert f"Unblocked tasks: ['{b}']" in task_complete.invoke({"task_id": a})
+
+def test_task_next_reports_ready_set_waves_and_critical_path(task_file):
+    """Test that independent tasks are offered together and the longest chain is reported"""
+    schema = _ids(task_create.invoke({"title": "schema"}))
+    docs = _ids(task_create.invoke({"title": "docs"}))
+    api = _ids(task_create.invoke({"title": "api", "dependencies": [schema]}))
+    ui = _ids(task_create.invoke({"title": "ui", "dependencies": [api, docs]}))
+
+    output = task_next.invoke({})
+    assert "Runnable now (2):" in output
+    assert f"[ ] [{schema}] schema" in output and f"[ ] [{docs}] docs" in output
+    assert "4 tasks in 3 waves" in output
+    assert f"wave 2: {api}" in output and f"wave 3: {ui}" in output
+    assert f"Critical path: [{schema}] schema -> [{api}] api -> [{ui}] ui" in output
+
+    task_complete.invoke({"task_id": schema})
+    plan = plan_tasks(get_task_store().snapshot())
+    assert sorted(t.id for t in plan.ready) == sorted([api, docs])
+    assert len(plan.critical_path) == 2 and plan.critical_path[-1].id == ui
+
+def test_plan_reports_tasks_stuck_in_hand_edited_cycles(task_file):
+    """Test that a cycle written to the file directly does not hang planning"""
+    tasks = [
+        {"id": "x", "title": "x", "status": "blocked", "dependencies": ["y"], "notes": None},
+        {"id": "y", "title": "y", "status": "blocked", "dependencies": ["x"], "notes": None},
+        {"id": "z", "title": "z", "status": "pending", "dependencies": [], "notes": None},
+    ]
+    task_file.parent.mkdir(parents=True)
+    task_file.write_text(json.dumps({"tasks": tasks}), encoding="utf-8")
+
+    output = task_next.invoke({})
+    assert "[ ] [z] z" in output
+    assert "dependency cycle or missing task: x, y" in output
@@ -0,0 +1,198 @@
+import asyncio
+import time
+import pytest
+from langchain_core.tools import StructuredTool
+import src.tools.base as base
+from src.tool_executor import execute_tool_calls
+
+def _make_tool(name, log, delay=0.05, read_only=False, path_arg=None):
+    """Build an async tool that records start/end events in `log`."""
+    async def _run(path: str = "") -> str:
+        log.append(("start", name, path))
+        await asyncio.sleep(delay)
+        log.append(("end", name, path))
+        return f"{name}:{path}"
+
+    t = StructuredTool.from_function(coroutine=_run, name=name, description=name)
+    if read_only or path_arg:
+        t = base.tool_access(read_only=read_only, path_arg=path_arg)(t)
+    return t
+
+@pytest.fixture
+def project_root(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.tools.base.PROJECT_ROOT", tmp_path)
+    return tmp_path
+
+def test_read_only_calls_run_concurrently(project_root):
+    """Test that read-only calls overlap and results keep the call order"""
+    log = []
+    reader = _make_tool("read", log, delay=0.1, read_only=True, path_arg="path")
+    calls = [{"name": "read", "args": {"path": f"f{i}.py"}, "id": f"call_{i}"} for i in range(5)]
+
+    start = time.perf_counter()
+    results = asyncio.run(execute_tool_calls(calls, {"read": reader}, max_concurrency=5))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.3  # ~0.1s when parallel, ~0.5s when serial
+    assert [r.tool_call_id for r in results] == [c["id"] for c in calls]
+    assert results[3].content == "read:f3.py"
+
+def test_writers_on_same_path_are_serialized(project_root):
+    """Test that two patches of the same file never overlap"""
+    log = []
+    writer = _make_tool("patch", log, path_arg="path")
+    calls = [
+        {"name": "patch", "args": {"path": "a.py"}, "id": "call_1"},
+        {"name": "patch", "args": {"path": "./a.py"}, "id": "call_2"},
+    ]
+
+    asyncio.run(execute_tool_calls(calls, {"patch": writer}))
+
+    assert [event for event, _, _ in log] == ["start", "end", "start", "end"]
+
+def test_undeclared_tool_is_a_barrier(project_root):
+    """Test that an undeclared (exclusive) tool runs alone, in order"""
+    log = []
+    reader = _make_tool("read", log, read_only=True, path_arg="path")
+    shell = _make_tool("shell", log)
+    calls = [
+        {"name": "read", "args": {"path": "a.py"}, "id": "call_1"},
+        {"name": "shell", "args": {}, "id": "call_2"},
+        {"name": "read", "args": {"path": "b.py"}, "id": "call_3"},
+    ]
+
+    asyncio.run(execute_tool_calls(calls, {"read": reader, "shell": shell}))
+
+    shell_start = log.index(("start", "shell", ""))
+    shell_end = log.index(("end", "shell", ""))
+    assert log.index(("end", "read", "a.py")) < shell_start
+    assert log.index(("start", "read", "b.py")) > shell_end
+
+def test_unresolvable_path_is_a_barrier(project_root):
+    """Test that a path that cannot be resolved (NUL byte) runs exclusively instead of raising"""
+    log = []
+    reader = _make_tool("read", log, read_only=True, path_arg="path")
+    calls = [
+        {"name": "read", "args": {"path": "a.py"}, "id": "call_1"},
+        {"name": "read", "args": {"path": "b\x00.py"}, "id": "call_2"},
+        {"name": "read", "args": {"path": "c.py"}, "id": "call_3"},
+    ]
+
+    results = asyncio.run(execute_tool_calls(calls, {"read": reader}))
+
+    assert [r.tool_call_id for r in results] == ["call_1", "call_2", "call_3"]
+    assert log.index(("end", "read", "a.py")) < log.index(("start", "read", "b\x00.py"))
+    assert log.index(("start", "read", "c.py")) > log.index(("end", "read", "b\x00.py"))
+
+def _like(real_tool, log, delay=0.05):
+    """An instrumented tool with the same access declaration as `real_tool`."""
+    metadata = real_tool.metadata or {}
+    return _make_tool(real_tool.name, log, delay, read_only=metadata.get("read_only", False), path_arg=metadata.get("path_arg"))
+
+def test_directory_search_is_ordered_against_patch_below_it(project_root):
+    """Test that search_code(".") sees a patch emitted before it, and a later patch waits for it"""
+    from src.tools.editor import apply_diff_patch
+    from src.tools.search import search_code
+    log = []
+    tools = {"apply_diff_patch": _like(apply_diff_patch, log), "search_code": _like(search_code, log)}
+    calls = [
+        {"name": "apply_diff_patch", "args": {"path": "pkg/a.py"}, "id": "call_1"},
+        {"name": "search_code", "args": {"path": "."}, "id": "call_2"},
+        {"name": "apply_diff_patch", "args": {"path": "pkg/b.py"}, "id": "call_3"},
+        {"name": "search_code", "args": {"path": "docs"}, "id": "call_4"},
+    ]
+
+    asyncio.run(execute_tool_calls(calls, tools))
+
+    assert log.index(("end", "apply_diff_patch", "pkg/a.py")) < log.index(("start", "search_code", "."))
+    assert log.index(("end", "search_code", ".")) < log.index(("start", "apply_diff_patch", "pkg/b.py"))
+    # An unrelated directory does not wait for either patch
+    assert log.index(("start", "search_code", "docs")) < log.index(("end", "apply_diff_patch", "pkg/a.py"))
+
+def test_pathless_reader_is_ordered_against_patches(project_root):
+    """Test that delegate_research (no path) runs after earlier patches and before later ones"""
+    from src.tools.editor import apply_diff_patch
+    from src.tools.subagent import delegate_research
+    log = []
+    tools = {"apply_diff_patch": _like(apply_diff_patch, log), "delegate_research": _like(delegate_research, log)}
+    calls = [
+        {"name": "apply_diff_patch", "args": {"path": "a.py"}, "id": "call_1"},
+        {"name": "delegate_research", "args": {}, "id": "call_2"},
+        {"name": "delegate_research", "args": {}, "id": "call_3"},
+        {"name": "apply_diff_patch", "args": {"path": "b.py"}, "id": "call_4"},
+    ]
+
+    asyncio.run(execute_tool_calls(calls, tools))
+
+    research = [i for i, entry in enumerate(log) if entry[1] == "delegate_research"]
+    assert log.index(("end", "apply_diff_patch", "a.py")) < research[0]
+    assert research[-1] < log.index(("start", "apply_diff_patch", "b.py"))
+    # The two read-only research calls still overlap each other
+    assert [log[i][0] for i in research] == ["start", "start", "end", "end"]
+
+def test_unknown_tool_and_errors(project_root):
+    """Test that missing tools and exceptions become error ToolMessages"""
+    async def _boom() -> str:
+        raise RuntimeError("boom")
+
+    failing = StructuredTool.from_function(coroutine=_boom, name="boom", description="boom")
+    calls = [
+        {"name": "missing", "args": {}, "id": "call_1"},
+        {"name": "boom", "args": {}, "id": "call_2"},
+    ]
+
+    results = asyncio.run(execute_tool_calls(calls, {"boom": failing}))
+
+    assert results[0].content == "Error: Tool missing not found."
+    assert "Tool Execution Error: boom" in results[1].content
+
+def test_memo_serves_repeats_and_refers_to_earlier_results(project_root):
+    """Test that an unchanged file is read once, repeats refer back, and a change is picked up"""
+    from langchain_core.messages import AIMessage
+    from src.tools.filesystem import read_file
+    from src.tool_memo import ToolMemo
+
+    (project_root / "a.py").write_text("x = 1\n", encoding="utf-8")
+    memo = ToolMemo()
+    tool_map = {"read_file": read_file}
+
+    def call(call_id, history, path="a.py"):
+        calls = [{"name": "read_file", "args": {"path": path}, "id": call_id}]
+        history.append(AIMessage(content="", tool_calls=calls))
+        result = asyncio.run(execute_tool_calls(calls, tool_map, memo=memo, history=history))[0]
+        history.append(result)
+        return result.content
+
+    history = []
+    assert call("call_1", history) == "x = 1\n"
+    assert call("call_2", history, path="./a.py") == (
+        "[Unchanged since tool_call call_1: the result is identical to that earlier read_file call, see its output above.]"
+    )
+    # Asked again right after a reference: the full content, in case the model lost it
+    assert call("call_3", history) == "x = 1\n"
+    assert memo.stats == {"hits": 2, "misses": 1, "references": 1}
+
+    # Without the earlier message in the history there is nothing to refer to
+    assert call("call_4", []) == "x = 1\n"
+
+    (project_root / "a.py").write_text("x = 22\n", encoding="utf-8")
+    assert call("call_5", history) == "x = 22\n"
+    assert memo.stats["misses"] == 2
+
+def test_memo_skips_arguments_it_cannot_key(project_root):
+    """Test that odd arguments (string depth, NUL in path) run the tool instead of crashing the turn"""
+    from src.tools.filesystem import list_directory, read_file
+    from src.tool_memo import ToolMemo
+
+    (project_root / "sub").mkdir()
+    (project_root / "sub" / "a.py").write_text("x = 1\n", encoding="utf-8")
+    calls = [
+        {"name": "list_directory", "args": {"path": ".", "depth": "2"}, "id": "call_1"},
+        {"name": "read_file", "args": {"path": "a\x00.py"}, "id": "call_2"},
+    ]
+
+    results = asyncio.run(execute_tool_calls(
+        calls, {"list_directory": list_directory, "read_file": read_file}, memo=ToolMemo(), history=[]))
+
+    assert "a.py" in results[0].content
+    assert "Error" in results[1].content
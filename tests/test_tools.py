@@ -58,3 +58,100 @@ def test_sensitive_path_blocked(test_files):
     """Test blocking access to sensitive paths"""
     output = run_shell_command.invoke({"command": "cat /etc/passwd"})
     assert "Error: Access to sensitive paths" in output
+
+def test_run_shell_command_timeout(test_files, monkeypatch):
+    """Test that a hanging command is killed after the timeout"""
+    monkeypatch.setattr("src.tools.terminal.stream_handler", None)
+    output = run_shell_command.invoke({"command": "echo started && echo waiting for lock >&2 && sleep 5", "timeout": 1})
+    assert "Error: Command timed out after 1 seconds." in output
+    assert "Stdout (partial):\nstarted" in output
+    assert "Stderr (partial):\nwaiting for lock" in output
+
+def test_run_shell_command_timeout_is_validated_and_capped(test_files, monkeypatch):
+    """Test that a non-positive timeout is rejected and a huge one is capped at the configured maximum"""
+    from src.config import get_cached_settings
+    monkeypatch.setattr("src.tools.terminal.stream_handler", None)
+    monkeypatch.setattr(get_cached_settings(), "shell_max_timeout", 1)
+
+    assert "timeout must be a positive number" in run_shell_command.invoke({"command": "echo hi", "timeout": 0})
+    assert "timeout must be a positive number" in run_shell_command.invoke({"command": "echo hi", "timeout": -5})
+    assert "timed out after 1 seconds" in run_shell_command.invoke({"command": "sleep 5", "timeout": 100000})
+
+def test_run_shell_command_async_does_not_block(test_files, monkeypatch):
+    """Test that concurrent async invocations overlap instead of running back to back"""
+    import asyncio
+    import time
+    monkeypatch.setattr("src.tools.terminal.stream_handler", None)
+
+    async def run_three():
+        return await asyncio.gather(*[
+            run_shell_command.ainvoke({"command": "sleep 0.5 && echo done"}) for _ in range(3)
+        ])
+
+    start = time.perf_counter()
+    outputs = asyncio.run(run_three())
+    assert time.perf_counter() - start < 1.4
+    assert outputs == ["done", "done", "done"]
+
+def test_output_buffer_keeps_head_and_tail():
+    """Test that the shell output buffer is bounded and reports what it dropped"""
+    from src.tools.terminal import OutputBuffer
+    buffer = OutputBuffer(max_bytes=20)
+    buffer.write(b"HEAD" + b"x" * 1000)
+    buffer.write(b"TAIL")
+
+    value = buffer.getvalue()
+    assert value.startswith("HEAD")
+    assert value.endswith("TAIL")
+    assert "bytes of output omitted" in value
+    assert len(buffer.head) + buffer.tail_size == 20
+
+@pytest.fixture
+def big_file(test_files, monkeypatch):
+    """A 2000-line Python file, above a lowered read limit"""
+    from src.config import get_cached_settings
+    monkeypatch.setattr(get_cached_settings(), "read_max_bytes", 4096)
+    lines = ["class Big:"] + [f"    def method_{i}(self): return {i}" for i in range(1999)]
+    (test_files / "big.py").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return test_files / "big.py"
+
+def test_read_file_line_range(big_file):
+    """Test reading a line range of a large file"""
+    output = read_file.invoke({"path": "big.py", "start_line": 1001, "end_line": 1003})
+    assert output.splitlines() == [
+        "[Lines 1001-1003 of 2000 in big.py]",
+        "    def method_999(self): return 999",
+        "    def method_1000(self): return 1000",
+        "    def method_1001(self): return 1001",
+    ]
+
+def test_read_file_byte_range(big_file):
+    """Test reading by byte offset"""
+    output = read_file.invoke({"path": "big.py", "offset": 0, "length": 10})
+    assert output == "[Bytes 0-10 of %d in big.py]\nclass Big:" % big_file.stat().st_size
+
+def test_read_file_too_large(big_file):
+    """Test that a large file returns outline, head, tail and line count instead of its content"""
+    output = read_file.invoke({"path": "big.py"})
+    assert output.startswith("[File too large to return whole: big.py")
+    assert "2000 lines" in output
+    assert "Outline:" in output and "class Big:" in output
+    assert "Lines 1961-2000:" in output
+    assert "method_1000" not in output
+
+def test_read_file_range_is_capped(big_file):
+    """Test that ranged reads stop at the byte limit on a line boundary"""
+    output = read_file.invoke({"path": "big.py", "start_line": 1})
+    header, _, body = output.partition("\n")
+    assert "continue with start_line=" in header
+    assert len(body.encode("utf-8")) <= 4096
+    assert body.endswith("\n")
+
+def test_read_file_cuts_long_line_at_character_boundary(big_file):
+    """Test that a byte cut inside a multi-byte character is not reported as a binary file"""
+    # 1 + 2 * 5000 bytes on one line: byte 4096 falls inside an "é"
+    (big_file.parent / "wide.txt").write_text("a" + "é" * 5000, encoding="utf-8")
+    output = read_file.invoke({"path": "wide.txt", "start_line": 1})
+    header, _, body = output.partition("\n")
+    assert header == "[Lines 1-1 of 1 in wide.txt (line 1 cut at 4095 bytes; continue with offset=4095)]"
+    assert body == "a" + "é" * 2047